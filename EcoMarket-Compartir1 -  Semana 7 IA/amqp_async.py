@@ -0,0 +1,428 @@
+"""
+Publicador AMQP nativo de asyncio (pika AsyncioConnection)
+BlockingConnection, aun con pool, bloquea el event loop en cada publish.
+Este publicador corre sobre el mismo loop que FastAPI:
+
+1. Una conexión y un canal en modo confirm, abiertos por el lifespan
+2. `await publicar(...)` se resuelve cuando el broker confirma (ack) el
+   mensaje; un nack lanza NackError. Mientras tanto el loop atiende otras peticiones
+3. Confirmaciones por delivery tag (incluye acks "multiple" del broker)
+4. Declaraciones de colas/exchanges cacheadas por canal (las publicaciones
+   concurrentes esperan la misma declaración en curso)
+5. Reconexión en segundo plano; mientras se reconecta, publicar falla de
+   inmediato (el circuit breaker decide qué hacer)
+6. AsyncAMQPBatchPublisher: junta los mensajes de unos milisegundos (o N
+   mensajes) y los publica seguidos; las confirmaciones llegan en pipeline
+
+Lo usan main.py (compras), app.py/events.py (UsuarioCreado) y send_sale.py.
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+from pika.exceptions import AMQPConnectionError, NackError
+
+
+def _percentiles(valores) -> Dict[str, float]:
+    ordenados = sorted(valores)
+
+    def percentil(p):
+        return round(ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))], 3) if ordenados else 0.0
+
+    return {"p50": percentil(0.50), "p99": percentil(0.99), "max": percentil(1.0)}
+
+
+class ConfirmacionesPendientes:
+    """Futures de los mensajes publicados, indexados por delivery tag del canal"""
+
+    def __init__(self):
+        self._futuros: Dict[int, asyncio.Future] = {}
+        self._siguiente = 1
+
+    def __len__(self) -> int:
+        return len(self._futuros)
+
+    def registrar(self, futuro: asyncio.Future) -> int:
+        """Asigna el delivery tag que el broker usará para el próximo basic_publish"""
+        tag = self._siguiente
+        self._siguiente += 1
+        self._futuros[tag] = futuro
+        return tag
+
+    def confirmar(self, tag: int, multiple: bool, ack: bool) -> int:
+        """Resuelve el tag (o todos los <= tag si `multiple`); retorna cuántos resolvió"""
+        if multiple:
+            tags = []
+            for pendiente in self._futuros:  # Orden de inserción = orden de tags
+                if pendiente > tag:
+                    break
+                tags.append(pendiente)
+        else:
+            tags = [tag] if tag in self._futuros else []
+
+        for pendiente in tags:
+            futuro = self._futuros.pop(pendiente)
+            if futuro.done():
+                continue  # El publicador ya dejó de esperar (timeout)
+            if ack:
+                futuro.set_result(pendiente)
+            else:
+                futuro.set_exception(NackError([]))
+        return len(tags)
+
+    def fallar_todos(self, error: Exception):
+        """El canal se cerró: ningún mensaje pendiente será confirmado"""
+        for futuro in self._futuros.values():
+            if not futuro.done():
+                futuro.set_exception(error)
+        self._futuros.clear()
+        self._siguiente = 1
+
+
+class AsyncAMQPPublisher:
+    """
+    Publicador con confirmaciones sobre el event loop de la app
+
+    Args:
+        parametros: pika.ConnectionParameters
+        timeout_confirmacion: segundos máximos esperando el ack del broker
+        espera_reconexion: segundos entre intentos de reconexión en segundo plano
+        fabrica_conexion: crea la conexión con los callbacks de pika (inyectable para pruebas)
+    """
+
+    def __init__(self, parametros: Optional[pika.ConnectionParameters] = None, timeout_confirmacion: float = 5.0,
+                 espera_reconexion: float = 2.0, fabrica_conexion: Optional[Callable[..., Any]] = None):
+        self.parametros = parametros
+        self._fabrica = fabrica_conexion or AsyncioConnection
+        self.timeout_confirmacion = timeout_confirmacion
+        self.espera_reconexion = espera_reconexion
+        self._conexion: Optional[AsyncioConnection] = None
+        self._canal = None
+        self._pendientes = ConfirmacionesPendientes()
+        self._declaraciones: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._lock = asyncio.Lock()
+        self._cerrando = False
+        self._cerrada: Optional[asyncio.Future] = None
+        self._tarea_reconexion: Optional[asyncio.Task] = None
+        self.conexiones = 0
+        self.publicados = 0
+        self.confirmados = 0
+        self.rechazados = 0
+        self.errores = 0
+        self._latencias_ms = deque(maxlen=1000)
+
+    @property
+    def conectado(self) -> bool:
+        return self._canal is not None and self._canal.is_open
+
+    # ----- Ciclo de vida
+
+    async def __aenter__(self) -> "AsyncAMQPPublisher":
+        await self.iniciar()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.cerrar()
+
+    async def iniciar(self):
+        """Conecta al arrancar la app; si el broker no está, reintenta en segundo plano"""
+        try:
+            await self._conectar()
+            print("🐰 Publicador AMQP asíncrono conectado")
+        except AMQPConnectionError as e:
+            print(f"⚠️ Publicador AMQP: RabbitMQ no disponible al arrancar ({e}); reintentando en segundo plano")
+            self._programar_reconexion()
+
+    async def cerrar(self):
+        """Espera las confirmaciones pendientes y cierra la conexión"""
+        self._cerrando = True
+        if self._tarea_reconexion is not None:
+            self._tarea_reconexion.cancel()
+        espera = asyncio.get_running_loop().time() + self.timeout_confirmacion
+        while len(self._pendientes) and asyncio.get_running_loop().time() < espera:
+            await asyncio.sleep(0.01)
+        if self._conexion is not None and self._conexion.is_open:
+            self._conexion.close()
+            await asyncio.wait_for(asyncio.shield(self._cerrada), self.timeout_confirmacion)
+
+    async def _conectar(self):
+        async with self._lock:
+            if self.conectado:
+                return
+            loop = asyncio.get_running_loop()
+            abierta = loop.create_future()
+            self._cerrada = loop.create_future()
+
+            def al_abrir_conexion(conexion):
+                conexion.channel(on_open_callback=al_abrir_canal)
+
+            def al_abrir_canal(canal):
+                canal.add_on_close_callback(self._al_cerrar_canal)
+                canal.confirm_delivery(
+                    ack_nack_callback=self._al_confirmar,
+                    callback=lambda _frame: abierta.done() or abierta.set_result(canal),
+                )
+
+            def al_fallar_conexion(_conexion, error):
+                # Conserva el tipo (p. ej. ProbableAuthenticationError) para las políticas de reintento
+                if not abierta.done():
+                    abierta.set_exception(error if isinstance(error, AMQPConnectionError)
+                                          else AMQPConnectionError(str(error)))
+
+            def al_cerrar_conexion(_conexion, motivo):
+                if not self._cerrada.done():
+                    self._cerrada.set_result(motivo)
+                if not abierta.done():
+                    abierta.set_exception(AMQPConnectionError(str(motivo)))
+                self._al_perder_conexion(motivo)
+
+            self._conexion = self._fabrica(
+                self.parametros,
+                on_open_callback=al_abrir_conexion,
+                on_open_error_callback=al_fallar_conexion,
+                on_close_callback=al_cerrar_conexion,
+                custom_ioloop=loop,
+            )
+            try:
+                canal = await abierta
+            except AMQPConnectionError:
+                self._conexion = None
+                raise
+            # Los delivery tags y las declaraciones son por canal
+            self._pendientes = ConfirmacionesPendientes()
+            self._declaraciones = {}
+            self._canal = canal
+            self.conexiones += 1
+
+    def _al_perder_conexion(self, motivo):
+        self._canal = None
+        self._conexion = None
+        self._pendientes.fallar_todos(AMQPConnectionError(f"Conexión con RabbitMQ cerrada: {motivo}"))
+        if not self._cerrando:
+            self._programar_reconexion()
+
+    def _al_cerrar_canal(self, canal, motivo):
+        if canal is not self._canal:
+            return
+        self._canal = None
+        self._pendientes.fallar_todos(AMQPConnectionError(f"Canal cerrado: {motivo}"))
+        # Un canal cerrado por el broker (p. ej. declaración incompatible) no se reutiliza:
+        # cerrar la conexión dispara la reconexión completa
+        if self._conexion is not None and self._conexion.is_open and not self._cerrando:
+            self._conexion.close()
+
+    def _programar_reconexion(self):
+        if self._tarea_reconexion is None or self._tarea_reconexion.done():
+            self._tarea_reconexion = asyncio.get_running_loop().create_task(self._reconectar())
+
+    async def _reconectar(self):
+        while not self._cerrando and not self.conectado:
+            await asyncio.sleep(self.espera_reconexion)
+            try:
+                await self._conectar()
+                print("🐰 Publicador AMQP reconectado")
+            except AMQPConnectionError:
+                continue
+
+    # ----- Publicación
+
+    def _al_confirmar(self, frame):
+        metodo = frame.method
+        ack = isinstance(metodo, pika.spec.Basic.Ack)
+        resueltos = self._pendientes.confirmar(metodo.delivery_tag, metodo.multiple, ack)
+        if ack:
+            self.confirmados += resueltos
+        else:
+            self.rechazados += resueltos
+
+    async def _rpc(self, funcion: Callable[..., Any], **kwargs):
+        """Convierte una operación de canal con callback en un await"""
+        futuro = asyncio.get_running_loop().create_future()
+        funcion(callback=lambda frame: futuro.done() or futuro.set_result(frame), **kwargs)
+        return await asyncio.wait_for(futuro, self.timeout_confirmacion)
+
+    async def _declarar(self, clave: Tuple[str, str], funcion: Callable[..., Any], **kwargs):
+        """Una sola declaración por canal aunque varias publicaciones la pidan a la vez"""
+        declaracion = self._declaraciones.get(clave)
+        if declaracion is None:
+            declaracion = asyncio.ensure_future(self._rpc(funcion, **kwargs))
+            self._declaraciones[clave] = declaracion
+        try:
+            await asyncio.shield(declaracion)
+        except Exception:
+            if self._declaraciones.get(clave) is declaracion:
+                del self._declaraciones[clave]  # La próxima publicación lo vuelve a intentar
+            raise
+
+    async def _asegurar_canal(self):
+        if self.conectado:
+            return
+        if self._lock.locked():
+            # Otra corrutina (o la reconexión en segundo plano) ya está conectando: fallar rápido
+            raise AMQPConnectionError("Reconectando con RabbitMQ")
+        await self._conectar()
+
+    async def _preparar(self, colas: Iterable[str] = (), declarar_exchange: Optional[Tuple[str, str]] = None):
+        """Asegura el canal y las declaraciones antes de publicar"""
+        await self._asegurar_canal()
+        for cola in colas:
+            await self._declarar(("cola", cola), self._canal.queue_declare, queue=cola, durable=True)
+        if declarar_exchange:
+            nombre, tipo = declarar_exchange
+            await self._declarar(("exchange", nombre), self._canal.exchange_declare,
+                                 exchange=nombre, exchange_type=tipo, durable=True)
+        if not self.conectado:
+            raise AMQPConnectionError("Conexión con RabbitMQ perdida durante la declaración")
+
+    def _enviar(self, exchange: str, routing_key: str, cuerpo: str,
+                propiedades: Optional[pika.BasicProperties], futuro: asyncio.Future) -> int:
+        """basic_publish sin esperar: `futuro` se resuelve con el ack/nack de su delivery tag"""
+        tag = self._pendientes.registrar(futuro)
+        self._canal.basic_publish(exchange, routing_key, cuerpo, propiedades)
+        self.publicados += 1
+        return tag
+
+    async def publicar(self, exchange: str, routing_key: str, cuerpo: str,
+                       propiedades: Optional[pika.BasicProperties] = None,
+                       declarar_cola: Optional[str] = None,
+                       declarar_exchange: Optional[Tuple[str, str]] = None) -> int:
+        """
+        Publica y espera la confirmación del broker; retorna el delivery tag
+
+        Args:
+            declarar_cola: cola durable a declarar (una vez por canal) antes de publicar
+            declarar_exchange: (nombre, tipo) de exchange durable a declarar antes de publicar
+        """
+        try:
+            await self._preparar((declarar_cola,) if declarar_cola else (), declarar_exchange)
+            loop = asyncio.get_running_loop()
+            futuro = loop.create_future()
+            inicio = loop.time()
+            tag = self._enviar(exchange, routing_key, cuerpo, propiedades, futuro)
+            await asyncio.wait_for(futuro, self.timeout_confirmacion)
+            self._latencias_ms.append((loop.time() - inicio) * 1000)
+            return tag
+        except Exception:
+            self.errores += 1
+            raise
+
+    async def publicar_en_cola(self, cola: str, cuerpo: str, propiedades: Optional[pika.BasicProperties] = None) -> int:
+        """Publica en una cola durable a través del exchange por defecto"""
+        return await self.publicar('', cola, cuerpo, propiedades, declarar_cola=cola)
+
+    async def enviar_lote(self, mensajes: Sequence[Tuple[str, str, Optional[pika.BasicProperties], asyncio.Future]]):
+        """
+        Publica (cola, cuerpo, propiedades, futuro) uno tras otro sin esperar
+        confirmaciones entre ellos; cada futuro se resuelve con su ack o nack
+        """
+        try:
+            await self._preparar(dict.fromkeys(cola for cola, *_ in mensajes))
+            for cola, cuerpo, propiedades, futuro in mensajes:
+                self._enviar('', cola, cuerpo, propiedades, futuro)
+        except Exception:
+            self.errores += len(mensajes)
+            raise
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "conectado": self.conectado,
+            "conexiones": self.conexiones,
+            "publicados": self.publicados,
+            "confirmados": self.confirmados,
+            "rechazados": self.rechazados,
+            "errores": self.errores,
+            "pendientes": len(self._pendientes),
+            "latencia_confirmacion_ms": _percentiles(self._latencias_ms),
+        }
+
+
+class AsyncAMQPBatchPublisher:
+    """
+    Agrupa compras durante `ventana_ms` o hasta `max_lote` mensajes y las
+    publica seguidas sobre el canal de un AsyncAMQPPublisher
+
+    Cada llamador espera solo la confirmación de su mensaje: los acks
+    (incluidos los "multiple") resuelven futuros individuales por delivery tag.
+
+    Args:
+        publicador: AsyncAMQPPublisher dueño de la conexión (se inicia y cierra aparte)
+        max_lote: mensajes en el buffer que disparan el envío inmediato
+        ventana_ms: espera máxima de un mensaje en el buffer antes de enviarse
+    """
+
+    def __init__(self, publicador: AsyncAMQPPublisher, max_lote: int = 50, ventana_ms: float = 2.0):
+        self.publicador = publicador
+        self.max_lote = max_lote
+        self.ventana_ms = ventana_ms
+        self._buffer: List[Tuple[str, str, Optional[pika.BasicProperties], asyncio.Future]] = []
+        self._temporizador: Optional[asyncio.TimerHandle] = None
+        self._envios: Set[asyncio.Task] = set()
+        self._cerrando = False
+        self.lotes = 0
+        self.mensajes = 0
+        self._tamanos = deque(maxlen=1000)
+        self._latencias_ms = deque(maxlen=1000)
+
+    async def publicar_en_cola(self, cola: str, cuerpo: str, propiedades: Optional[pika.BasicProperties] = None) -> int:
+        """Encola el mensaje en el lote actual y espera su confirmación; retorna el delivery tag"""
+        if self._cerrando:
+            raise AMQPConnectionError("Publicador por lotes cerrado")
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        inicio = loop.time()
+        self._buffer.append((cola, cuerpo, propiedades, futuro))
+        if len(self._buffer) >= self.max_lote:
+            self._vaciar()
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.ventana_ms / 1000, self._vaciar)
+
+        # Si vence el plazo con el mensaje aún en el buffer, el futuro cancelado hace que no se envíe
+        tag = await asyncio.wait_for(futuro, self.publicador.timeout_confirmacion)
+        self._latencias_ms.append((loop.time() - inicio) * 1000)
+        return tag
+
+    def _vaciar(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        if not self._buffer:
+            return
+        lote, self._buffer = self._buffer, []
+        tarea = asyncio.get_running_loop().create_task(self._enviar(lote))
+        self._envios.add(tarea)
+        tarea.add_done_callback(self._envios.discard)
+
+    async def _enviar(self, lote):
+        lote = [mensaje for mensaje in lote if not mensaje[3].done()]
+        if not lote:
+            return
+        self.lotes += 1
+        self.mensajes += len(lote)
+        self._tamanos.append(len(lote))
+        try:
+            await self.publicador.enviar_lote(lote)
+        except Exception as e:
+            for *_, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+
+    async def cerrar(self):
+        """Envía lo que quede en el buffer; las confirmaciones las espera `publicador.cerrar()`"""
+        self._cerrando = True
+        self._vaciar()
+        if self._envios:
+            await asyncio.gather(*self._envios, return_exceptions=True)
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "max_lote": self.max_lote,
+            "ventana_ms": self.ventana_ms,
+            "lotes": self.lotes,
+            "mensajes": self.mensajes,
+            "en_buffer": len(self._buffer),
+            "tamano_medio_lote": round(sum(self._tamanos) / len(self._tamanos), 2) if self._tamanos else 0.0,
+            "latencia_ms": _percentiles(self._latencias_ms),
+        }
@@ -1,12 +1,34 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, BackgroundTasks, HTTPException
 from pydantic import BaseModel
 import logging
 import re
 
-app = FastAPI(title="Semana4 API")
 logger = logging.getLogger("semana4")
 logging.basicConfig(level=logging.INFO)
 
+# Publicador AMQP asíncrono compartido por todas las peticiones (None si pika no está disponible)
+publicador = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global publicador
+    try:
+        from amqp_async import AsyncAMQPPublisher
+        from events import _connection_params
+    except Exception as e:
+        logger.error("No se pudo importar el publicador AMQP: %s", e)
+    else:
+        publicador = AsyncAMQPPublisher(_connection_params())
+        await publicador.iniciar()
+    yield
+    if publicador is not None:
+        await publicador.cerrar()
+
+
+app = FastAPI(title="Semana4 API", lifespan=lifespan)
+
 EMAIL_RE = re.compile(r"[^@]+@[^@]+\.[^@]+")
 
 
@@ -15,19 +37,18 @@ class UserCreate(BaseModel):
     email: str
 
 
-def _publish_wrapper(user_data: dict) -> None:
+async def _publish_wrapper(user_data: dict) -> None:
     """
-    Wrapper que importa el publisher en tiempo de ejecución y captura errores
+    Publica con el publicador asíncrono del lifespan y captura errores
     para que la API no falle si RabbitMQ/pika no están disponibles.
     """
-    try:
-        from events import publish_user_created
-    except Exception as e:
-        logger.error("No se pudo importar publish_user_created: %s", e)
+    if publicador is None:
+        logger.error("Publicador AMQP no disponible; evento descartado user_id=%s", user_data.get("user_id"))
         return
 
     try:
-        ok = publish_user_created(user_data)
+        from events import publish_user_created_async
+        ok = await publish_user_created_async(user_data, publicador)
         if not ok:
             logger.error("La publicación del evento falló para user_id=%s", user_data.get("user_id"))
         else:
@@ -51,4 +72,4 @@ async def create_user(user: UserCreate, background_tasks: BackgroundTasks):
         "email": user.email,
     }
     background_tasks.add_task(_publish_wrapper, new_user)
-    return {"user_id": new_user["user_id"]}
\ No newline at end of file
+    return {"user_id": new_user["user_id"]}
\ No newline at end of file
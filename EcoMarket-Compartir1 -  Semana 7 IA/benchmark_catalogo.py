@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark del catálogo: lista con búsqueda lineal vs CatalogStore indexado
+Mide latencia de búsqueda por id y de compra (búsqueda + descuento de stock)
+con catálogos de 5 a 1.000.000 productos.
+
+Uso:
+    python benchmark_catalogo.py
+    python benchmark_catalogo.py --tamanos 5 1000 100000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime
+
+from catalog_store import CatalogStore
+from models import Product
+
+CATEGORIAS = ["Frutas", "Verduras", "Lácteos", "Granos", "Bebidas"]
+
+
+def generar_productos(n: int):
+    """Genera n productos sin validación (model_construct) para no medir Pydantic"""
+    ahora = datetime.now()
+    return [
+        Product.model_construct(
+            id=i,
+            nombre=f"Producto {i}",
+            categoria=CATEGORIAS[i % len(CATEGORIAS)],
+            precio=1.0 + (i % 50),
+            disponible=True,
+            stock=10**9,
+            descripcion=None,
+            fecha_agregado=ahora,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def medir(funcion, ids):
+    """Retorna la latencia media por operación en microsegundos"""
+    inicio = time.perf_counter()
+    for producto_id in ids:
+        funcion(producto_id)
+    return (time.perf_counter() - inicio) / len(ids) * 1e6
+
+
+def benchmark(n: int, operaciones: int):
+    productos = generar_productos(n)
+    store = CatalogStore(productos)
+    ids = [random.randint(1, n) for _ in range(operaciones)]
+
+    # La búsqueda lineal es O(n): con catálogos grandes usamos menos muestras
+    ids_lineal = ids[:max(10, min(operaciones, 2_000_000 // n))]
+
+    def buscar_lineal(producto_id):
+        return next((p for p in productos if p.id == producto_id), None)
+
+    def comprar_lineal(producto_id):
+        producto = buscar_lineal(producto_id)
+        producto.stock -= 1
+
+    def comprar_store(producto_id):
+        store.descontar_stock(producto_id, 1)
+
+    return {
+        "n": n,
+        "lookup_lista": medir(buscar_lineal, ids_lineal),
+        "lookup_store": medir(store.obtener, ids),
+        "compra_lista": medir(comprar_lineal, ids_lineal),
+        "compra_store": medir(comprar_store, ids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[5, 1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--operaciones", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print("BENCHMARK CATÁLOGO: lista lineal vs CatalogStore (µs por operación)")
+    print("=" * 78)
+    print(f"{'Productos':>10} | {'lookup lista':>13} | {'lookup store':>13} | {'compra lista':>13} | {'compra store':>13}")
+    print("-" * 78)
+
+    for n in args.tamanos:
+        r = benchmark(n, args.operaciones)
+        print(f"{r['n']:>10,} | {r['lookup_lista']:>13.2f} | {r['lookup_store']:>13.2f} | "
+              f"{r['compra_lista']:>13.2f} | {r['compra_store']:>13.2f}")
+
+    print("-" * 78)
+    print("✅ CatalogStore: latencia constante (O(1)) sin importar el tamaño del catálogo")
+    print("❌ Lista: latencia crece linealmente con el número de productos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark de las funciones de hash del router (shard_router.HASHES)
+Mide velocidad y calidad de distribución de cada estrategia:
+
+- µs/key:      hash() de a una key y hash_many() por lotes
+- chi²:        keys secuenciales ("user_0", "user_1"...) en N buckets con
+               hash % N (SimpleHash); ~N-1 es lo esperable de un hash uniforme
+- cv buckets:  desviación estándar / media de los buckets (en %)
+- ring σ:      desviación estándar (en %) de la fracción del ring de cada
+               shard con ConsistentHash; es lo que decide el balance real
+
+md5 es la función original (la única compatible con datos ya distribuidos).
+
+Uso:
+    python benchmark_hashes.py
+    python benchmark_hashes.py --keys 1000000 --buckets 64 --shards 16 --vnodes 150
+"""
+
+import argparse
+import statistics
+import time
+from collections import Counter
+
+from shard_router import HASHES, ConsistentHashRouter, ShardConfig, np
+
+
+def medir(funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def chi_cuadrado(conteos, total, buckets):
+    esperado = total / buckets
+    return sum((conteos.get(b, 0) - esperado) ** 2 / esperado for b in range(buckets))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--muestra", type=int, default=100_000, help="keys para medir hash() de a una")
+    parser.add_argument("--buckets", type=int, default=64)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--vnodes", type=int, default=150)
+    args = parser.parse_args()
+
+    keys = [f"user_{i}" for i in range(args.keys)]
+    muestra = keys[:args.muestra]
+    shards = [ShardConfig(i, f"postgres-{i}", 5432, "ecomarket") for i in range(1, args.shards + 1)]
+
+    print("=" * 92)
+    print(f"FUNCIONES DE HASH: {args.keys} keys, {args.buckets} buckets, {args.shards} shards × "
+          f"{args.vnodes} vnodes (NumPy: {'sí' if np is not None else 'no'})")
+    print("=" * 92)
+    print(f"{'hash':>8} | {'bits':>4} | {'µs/key':>7} | {'lote µs/key':>11} | {'vs md5':>6} | "
+          f"{'chi²':>8} | {'cv buckets':>10} | {'ring σ':>7}")
+    print("-" * 92)
+    base = None
+    for nombre, estrategia in HASHES.items():
+        t_uno, _ = medir(lambda: [estrategia.hash(k) for k in muestra])
+        t_lote, hashes = medir(estrategia.hash_many, keys)
+        base = base or t_lote
+
+        conteos = Counter(h % args.buckets for h in hashes)
+        valores = [conteos.get(b, 0) for b in range(args.buckets)]
+        cv = statistics.pstdev(valores) / statistics.mean(valores) * 100
+
+        router = ConsistentHashRouter(shards, args.vnodes, hash_fn=estrategia)
+        sigma = statistics.pstdev(router.ownership().values()) * args.shards * 100
+
+        print(f"{nombre:>8} | {estrategia.bits:>4} | {t_uno / len(muestra) * 1e6:>7.2f} | "
+              f"{t_lote / len(keys) * 1e6:>11.2f} | {base / t_lote:>5.1f}x | "
+              f"{chi_cuadrado(conteos, len(keys), args.buckets):>8.1f} | {cv:>9.2f}% | {sigma:>6.1f}%")
+    print("-" * 92)
+    print(f"chi² esperado para un hash uniforme: ~{args.buckets - 1} (±{(2 * (args.buckets - 1)) ** 0.5:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark de contención: 1.000 compradores concurrentes sobre un mismo SKU
+Compara tres formas de descontar stock desde hilos y verifica la sobreventa:
+
+- sin lock:      check y descuento separados (lo que hacía realizar_compra)
+- lock global:   un único lock para todo el catálogo
+- franjas:       StripedInventory (lock por franja de producto)
+
+Con --skus > 1 cada comprador elige un producto al azar y se ve la
+diferencia entre el lock global y las franjas.
+
+Uso:
+    python benchmark_inventario.py
+    python benchmark_inventario.py --compradores 1000 --stock 500 --skus 64
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from catalog_store import CatalogStore
+from inventory import ProductoNoDisponibleError, StockInsuficienteError, StripedInventory
+from models import Product
+
+
+def crear_store(skus: int, stock: int) -> CatalogStore:
+    return CatalogStore(
+        Product(id=i, nombre=f"SKU {i}", categoria="Frutas", precio=1.0, disponible=True, stock=stock)
+        for i in range(1, skus + 1)
+    )
+
+
+def sin_lock(store):
+    def comprar(producto_id):
+        producto = store.obtener(producto_id)
+        if producto.stock < 1:
+            raise StockInsuficienteError(producto_id, producto.stock, 1)
+        time.sleep(0)  # Cede el GIL entre el check y el descuento, como haría un await o una E/S
+        producto.stock -= 1
+    return comprar
+
+
+def lock_global(store):
+    # Una sola franja = un único lock para todo el catálogo
+    inventario = StripedInventory(store, franjas=1)
+    return lambda producto_id: inventario.descontar(producto_id, 1)
+
+
+def franjas(store):
+    inventario = StripedInventory(store, franjas=64)
+    return lambda producto_id: inventario.descontar(producto_id, 1)
+
+
+def medir(nombre, fabrica, compradores, compras_por_comprador, skus, stock):
+    store = crear_store(skus, stock)
+    comprar = fabrica(store)
+    barrera = threading.Barrier(compradores)
+    vendidas = [0] * compradores
+    rechazadas = [0] * compradores
+
+    def comprador(n):
+        rnd = random.Random(n)
+        barrera.wait()
+        for _ in range(compras_por_comprador):
+            try:
+                comprar(rnd.randint(1, skus))
+                vendidas[n] += 1
+            except (StockInsuficienteError, ProductoNoDisponibleError):
+                rechazadas[n] += 1
+
+    hilos = [threading.Thread(target=comprador, args=(n,)) for n in range(compradores)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    total_vendidas = sum(vendidas)
+    return {
+        "nombre": nombre,
+        "por_segundo": compradores * compras_por_comprador / duracion,
+        "vendidas": total_vendidas,
+        "sobreventa": max(0, total_vendidas - skus * stock),
+        "stock_negativo": sum(1 for p in store if p.stock < 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compradores", type=int, default=1000)
+    parser.add_argument("--compras", type=int, default=2, help="compras por comprador")
+    parser.add_argument("--stock", type=int, default=500, help="stock inicial de cada SKU")
+    parser.add_argument("--skus", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.setswitchinterval(1e-6)  # Cambios de hilo frecuentes: más intercalado, más carreras visibles
+    estrategias = [("sin lock", sin_lock), ("lock global", lock_global), ("franjas (64)", franjas)]
+    resultados = [medir(nombre, fabrica, args.compradores, args.compras, args.skus, args.stock)
+                  for nombre, fabrica in estrategias]
+
+    print("=" * 78)
+    print(f"CONTENCIÓN: {args.compradores} compradores x {args.compras} compras, "
+          f"{args.skus} SKU(s) con stock {args.stock}")
+    print("=" * 78)
+    print(f"{'Estrategia':<14} | {'compras/s':>10} | {'vendidas':>8} | {'sobreventa':>10} | {'stock < 0':>9}")
+    print("-" * 78)
+    for r in resultados:
+        print(f"{r['nombre']:<14} | {r['por_segundo']:>10.0f} | {r['vendidas']:>8} | "
+              f"{r['sobreventa']:>10} | {r['stock_negativo']:>9}")
+    print("-" * 78)
+    seguras = [r for r in resultados[1:] if r["sobreventa"] == 0 and r["stock_negativo"] == 0]
+    print(f"✅ {len(seguras)}/2 estrategias con lock sin sobreventa")
+
+
+if __name__ == "__main__":
+    main()
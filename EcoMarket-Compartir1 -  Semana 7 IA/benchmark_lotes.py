@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark de publicación por lotes en RabbitMQ: curvas de throughput y latencia
+Lanza N compras concurrentes contra 'compras_ecomarket' con
+AsyncAMQPBatchPublisher para cada tamaño de lote y reporta compras por
+segundo y latencia (encolado -> confirmación del broker) por tamaño.
+
+- lote 1:  cada compra se publica sola (equivale a AsyncAMQPPublisher.publicar)
+- lote N:  hasta N compras por ráfaga de basic_publish, confirms en pipeline
+
+Con --modo conexion compara, en compras por segundo, el camino original
+del modo RABBITMQ con el publicador persistente que lo reemplazó:
+
+- conexión por compra: BlockingConnection + queue_declare + publish + close
+  por compra, desde `--hilos` hilos (como enviar_mensaje_compra)
+- persistente:         AsyncAMQPPublisher (una conexión y un canal con
+  confirms para toda la app), sin lotes
+
+Requiere RabbitMQ corriendo (docker-compose up rabbitmq).
+
+Uso:
+    python benchmark_lotes.py
+    python benchmark_lotes.py --mensajes 20000 --concurrencia 1000 --lotes 1,10,50,200 --ventana-ms 2
+    python benchmark_lotes.py --modo conexion --mensajes 2000 --hilos 4
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime
+
+import pika
+
+from amqp_async import AsyncAMQPBatchPublisher, AsyncAMQPPublisher
+
+COLA = 'compras_ecomarket'
+PROPIEDADES = pika.BasicProperties(delivery_mode=2, content_type='application/json')
+
+
+def mensaje_compra(i: int) -> str:
+    return json.dumps({
+        "producto_id": 1,
+        "producto_nombre": "Manzana Orgánica",
+        "cantidad": 1,
+        "precio_total": 2.5,
+        "benchmark": i,
+        "timestamp": datetime.now().isoformat(),
+    }, ensure_ascii=False)
+
+
+def publicar_conexion_nueva(parametros, cuerpo):
+    """El camino original de enviar_mensaje_compra: una conexión por compra"""
+    connection = pika.BlockingConnection(parametros)
+    channel = connection.channel()
+    channel.queue_declare(queue=COLA, durable=True)
+    channel.basic_publish(exchange='', routing_key=COLA, body=cuerpo, properties=PROPIEDADES)
+    connection.close()
+
+
+async def cronometrar(publicar, mensajes, concurrencia):
+    """Compras por segundo y latencia de `publicar(cuerpo)` con `concurrencia` compras en vuelo"""
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias = []
+    errores = 0
+
+    async def una(i):
+        nonlocal errores
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                await publicar(mensaje_compra(i))
+            except Exception:
+                errores += 1
+                return
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una(i) for i in range(mensajes)))
+    duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "por_segundo": len(latencias) / duracion,
+        "p50": statistics.median(latencias) if latencias else 0.0,
+        "p99": latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] if latencias else 0.0,
+        "errores": errores,
+    }
+
+
+async def medir(publicador, max_lote, ventana_ms, mensajes, concurrencia):
+    lotes = AsyncAMQPBatchPublisher(publicador, max_lote=max_lote, ventana_ms=ventana_ms)
+    resultado = await cronometrar(lambda cuerpo: lotes.publicar_en_cola(COLA, cuerpo, PROPIEDADES),
+                                  mensajes, concurrencia)
+    await lotes.cerrar()
+    return dict(resultado, lote=max_lote, tamano_medio=lotes.metricas()["tamano_medio_lote"])
+
+
+def barra(valor, maximo, ancho=30):
+    return "█" * max(1, round(ancho * valor / maximo)) if maximo else ""
+
+
+async def comparar_conexion(args, parametros):
+    """Modo RABBITMQ antes (conexión por compra) y después (publicador persistente)"""
+    resultados = [("conexión por compra", await cronometrar(
+        lambda cuerpo: asyncio.to_thread(publicar_conexion_nueva, parametros, cuerpo), args.mensajes, args.hilos))]
+    async with AsyncAMQPPublisher(parametros, timeout_confirmacion=30) as publicador:
+        await publicador.publicar_en_cola(COLA, mensaje_compra(-1), PROPIEDADES)  # Calentamiento y declaración
+        resultados.append(("persistente", await cronometrar(
+            lambda cuerpo: publicador.publicar_en_cola(COLA, cuerpo, PROPIEDADES), args.mensajes, args.concurrencia)))
+
+    print("=" * 74)
+    print(f"BENCHMARK CONEXIÓN: {args.mensajes} compras "
+          f"({args.hilos} hilos antes, {args.concurrencia} concurrentes después)")
+    print("=" * 74)
+    print(f"{'Estrategia':<22} | {'compras/s':>10} | {'p50 ms':>8} | {'p99 ms':>8} | {'err':>4}")
+    print("-" * 74)
+    for nombre, r in resultados:
+        print(f"{nombre:<22} | {r['por_segundo']:>10.0f} | {r['p50']:>8.2f} | {r['p99']:>8.2f} | {r['errores']:>4}")
+    print("-" * 74)
+    antes, despues = resultados[0][1]["por_segundo"], resultados[1][1]["por_segundo"]
+    if antes:
+        print(f"✅ Mejora: {despues / antes:.1f}x compras por segundo")
+
+
+async def principal(args):
+    parametros = pika.ConnectionParameters(
+        host=args.host, port=5672, credentials=pika.PlainCredentials(args.usuario, args.password), heartbeat=30
+    )
+    if args.modo == "conexion":
+        await comparar_conexion(args, parametros)
+        return
+    resultados = []
+    async with AsyncAMQPPublisher(parametros, timeout_confirmacion=30) as publicador:
+        await publicador.publicar_en_cola(COLA, mensaje_compra(-1), PROPIEDADES)  # Calentamiento y declaración
+        for max_lote in args.lotes:
+            resultados.append(await medir(publicador, max_lote, args.ventana_ms, args.mensajes, args.concurrencia))
+
+    mejor = max(r["por_segundo"] for r in resultados)
+    peor_p99 = max(r["p99"] for r in resultados)
+    print("=" * 96)
+    print(f"BENCHMARK LOTES: {args.mensajes} compras, {args.concurrencia} concurrentes, ventana {args.ventana_ms} ms")
+    print("=" * 96)
+    print(f"{'lote':>5} | {'medio':>6} | {'compras/s':>10} | {'p50 ms':>8} | {'p99 ms':>8} | {'err':>4} | throughput")
+    print("-" * 96)
+    for r in resultados:
+        print(f"{r['lote']:>5} | {r['tamano_medio']:>6.1f} | {r['por_segundo']:>10.0f} | {r['p50']:>8.2f} | "
+              f"{r['p99']:>8.2f} | {r['errores']:>4} | {barra(r['por_segundo'], mejor)}")
+    print("-" * 96)
+    print("Latencia p99 por tamaño de lote:")
+    for r in resultados:
+        print(f"{r['lote']:>5} | {barra(r['p99'], peor_p99)} {r['p99']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mensajes", type=int, default=10000)
+    parser.add_argument("--concurrencia", type=int, default=500)
+    parser.add_argument("--lotes", type=lambda v: [int(x) for x in v.split(",")], default=[1, 10, 50, 200])
+    parser.add_argument("--ventana-ms", type=float, default=2.0)
+    parser.add_argument("--modo", choices=["lotes", "conexion"], default="lotes")
+    parser.add_argument("--hilos", type=int, default=4, help="hilos del camino conexión por compra")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--usuario", default="admin")
+    parser.add_argument("--password", default="admin123")
+    asyncio.run(principal(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark de consultas por intervalo de tiempo: RangeShardRouter vs routers por hash
+Reparte la tabla orders (la de test_replication_sharding.initialize_schema)
+en N shards SQLite en memoria con cada estrategia y ejecuta consultas
+"órdenes entre dos fechas" con distintas ventanas:
+
+- range:   rangos de created_at (límites en los cuantiles); la consulta va
+           solo a los shards que cubren la ventana (scan_plan)
+- hash:    simple, consistente, jump y rendezvous rutean por order_id; una
+           consulta por fecha tiene que ir a todos los shards
+
+Columnas:
+- shards/q:   shards consultados por consulta (promedio)
+- ms/q total: tiempo sumado de todos los shards consultados (trabajo total)
+- ms/q máx:   el shard más lento de cada consulta (latencia con scatter-gather)
+- último día: fracción de las órdenes del último día que cae en un solo
+              shard (la contracara del range: las inserciones nuevas se
+              concentran en el último rango)
+
+Uso:
+    python benchmark_range_router.py
+    python benchmark_range_router.py --orders 500000 --shards 16 --ventanas 1,7,30 --consultas 300
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from shard_router import ESTRATEGIAS, RangeShardRouter, ShardConfig
+
+FORMATO = "%Y-%m-%d %H:%M:%S"
+
+
+def generar_orders(cantidad, dias, inicio):
+    """order_id SERIAL y created_at creciente, repartidos en `dias` días"""
+    paso = dias * 86400 / cantidad
+    return [(i, f"user_{i % 997}", f"product_{i % 131}", 1 + i % 5, round(10 + i % 90 * 1.5, 2),
+             (inicio + timedelta(seconds=int(i * paso))).strftime(FORMATO))
+            for i in range(1, cantidad + 1)]
+
+
+def crear_shards(shard_ids, orders, destinos):
+    conexiones = {}
+    for shard_id in shard_ids:
+        conexion = sqlite3.connect(":memory:")
+        conexion.execute("CREATE TABLE orders (order_id INTEGER PRIMARY KEY, user_id TEXT, product_id TEXT, "
+                         "quantity INTEGER, total REAL, created_at TEXT)")
+        conexion.execute("CREATE INDEX idx_orders_created_at ON orders (created_at)")
+        conexiones[shard_id] = conexion
+    for shard_id in shard_ids:
+        conexiones[shard_id].executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?)",
+                                         [o for o, d in zip(orders, destinos) if d == shard_id])
+    return conexiones
+
+
+def ejecutar_consultas(conexiones, ventanas, destinos_de):
+    """Corre cada ventana en los shards que indica destinos_de; retorna (shards, ms total, ms máx, filas)"""
+    shards = total = maximo = 0.0
+    filas = 0
+    for desde, hasta in ventanas:
+        tiempos = []
+        for shard_id in destinos_de(desde, hasta):
+            inicio = time.perf_counter()
+            cuenta, _ = conexiones[shard_id].execute(
+                "SELECT COUNT(*), SUM(total) FROM orders WHERE created_at >= ? AND created_at < ?",
+                (desde, hasta)).fetchone()
+            tiempos.append(time.perf_counter() - inicio)
+            filas += cuenta
+        shards += len(tiempos)
+        total += sum(tiempos)
+        maximo += max(tiempos)
+    n = len(ventanas)
+    return shards / n, total / n * 1000, maximo / n * 1000, filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--ventanas", default="1,7,30", help="tamaños de ventana en días")
+    parser.add_argument("--consultas", type=int, default=200, help="consultas por tamaño de ventana")
+    args = parser.parse_args()
+
+    inicio = datetime(2025, 1, 1)
+    orders = generar_orders(args.orders, args.dias, inicio)
+    shards = [ShardConfig(i, f"postgres-{i}", 5432, "ecomarket") for i in range(1, args.shards + 1)]
+    shard_ids = [shard.shard_id for shard in shards]
+    fechas = [o[5] for o in orders]
+    order_ids = [str(o[0]) for o in orders]
+    ultimo_dia = (inicio + timedelta(days=args.dias - 1)).strftime(FORMATO)
+
+    routers = {"range": RangeShardRouter(shards, RangeShardRouter.cuantiles(fechas, args.shards))}
+    for nombre, fabrica in ESTRATEGIAS.items():
+        routers[nombre] = fabrica(shards, 150, "md5")
+
+    azar = random.Random(42)
+    tamanos = [int(v) for v in args.ventanas.split(",")]
+    ventanas = {}
+    for dias in tamanos:
+        ventanas[dias] = []
+        for _ in range(args.consultas):
+            desde = inicio + timedelta(seconds=azar.randrange((args.dias - dias) * 86400))
+            ventanas[dias].append((desde.strftime(FORMATO), (desde + timedelta(days=dias)).strftime(FORMATO)))
+
+    print("=" * 86)
+    print(f"CONSULTAS POR FECHA: {args.orders} órdenes en {args.dias} días, {args.shards} shards, "
+          f"{args.consultas} consultas por ventana")
+    print("=" * 86)
+    print(f"{'router':>12} | {'ventana':>7} | {'shards/q':>8} | {'ms/q total':>10} | {'ms/q máx':>8} | "
+          f"{'último día':>10} | {'filas':>9}")
+    print("-" * 86)
+    for nombre, router in routers.items():
+        if nombre == "range":
+            destinos = router.get_shard_ids(fechas)
+            destinos_de = router.get_shard_ids_for_range
+        else:
+            destinos = router.get_shard_ids(order_ids)
+            destinos_de = lambda desde, hasta: shard_ids  # Sin la key de ruteo: todos
+        conexiones = crear_shards(shard_ids, orders, destinos)
+        recientes = Counter(d for f, d in zip(fechas, destinos) if f >= ultimo_dia)
+        concentracion = max(recientes.values()) / sum(recientes.values())
+        for dias in tamanos:
+            por_q, total, maximo, filas = ejecutar_consultas(conexiones, ventanas[dias], destinos_de)
+            print(f"{nombre:>12} | {dias:>5} d | {por_q:>8.2f} | {total:>10.3f} | {maximo:>8.3f} | "
+                  f"{concentracion:>9.0%} | {filas:>9}")
+        for conexion in conexiones.values():
+            conexion.close()
+        print("-" * 86)
+    print("Con range, cada consulta toca ~1 + ventana/(días por shard) shards en vez de todos;")
+    print("a cambio, las órdenes nuevas caen todas en el shard del último rango (split_range lo parte).")
+
+
+if __name__ == "__main__":
+    main()
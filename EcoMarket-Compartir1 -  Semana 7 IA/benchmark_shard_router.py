@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark del ConsistentHashRouter: recorrido lineal vs búsqueda binaria
+Compara el get_shard original (recorre sorted_keys hasta el primer vnode
+>= hash) con la búsqueda binaria actual y con el ruteo por lotes
+(get_shards / get_distribution).
+
+- lineal:     O(vnodes·shards) por key (el router anterior)
+- bisect:     O(log(vnodes·shards)) por key
+- lote:       hashea y rutea todas las keys juntas (searchsorted si hay NumPy)
+
+Uso:
+    python benchmark_shard_router.py
+    python benchmark_shard_router.py --keys 1000000 --shards 3,16,64 --vnodes 150
+"""
+
+import argparse
+import hashlib
+import time
+
+from shard_router import ConsistentHashRouter, ShardConfig, np
+
+
+class RouterLineal(ConsistentHashRouter):
+    """El get_shard anterior: hash MD5 vía hexadecimal y recorrido lineal del ring"""
+
+    def get_shard(self, key):
+        hash_value = int(hashlib.md5(key.encode()).hexdigest(), 16) % (2**32)
+        for ring_key in self.sorted_keys:
+            if ring_key >= hash_value:
+                return self.shards[self.ring[ring_key]]
+        return self.shards[self.ring[self.sorted_keys[0]]]
+
+
+def medir(funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1_000_000, help="keys para get_distribution")
+    parser.add_argument("--muestra-lineal", type=int, default=20_000, help="keys para el router lineal (lento)")
+    parser.add_argument("--shards", type=lambda v: [int(x) for x in v.split(",")], default=[3, 16, 64])
+    parser.add_argument("--vnodes", type=int, default=150)
+    args = parser.parse_args()
+
+    keys = [f"user_{i}" for i in range(args.keys)]
+    muestra = keys[:args.muestra_lineal]
+
+    print("=" * 88)
+    print(f"CONSISTENT HASH: {args.vnodes} vnodes/shard, {args.keys} keys "
+          f"(NumPy: {'sí' if np is not None else 'no'})")
+    print("=" * 88)
+    print(f"{'shards':>6} | {'lineal µs/key':>13} | {'bisect µs/key':>13} | {'lote µs/key':>11} | "
+          f"{'distribución (s)':>16} | {'mejora':>7}")
+    print("-" * 88)
+    for num_shards in args.shards:
+        shards = [ShardConfig(i, f"postgres-{i}", 5432, "ecomarket") for i in range(1, num_shards + 1)]
+        lineal = RouterLineal(shards, args.vnodes)
+        router = ConsistentHashRouter(shards, args.vnodes)
+
+        t_lineal, esperado = medir(lambda: [lineal.get_shard(k).shard_id for k in muestra])
+        t_bisect, obtenido = medir(lambda: [router.get_shard(k).shard_id for k in muestra])
+        t_lote, _ = medir(router.get_shard_ids, muestra)
+        t_dist, distribucion = medir(router.get_distribution, keys)
+        assert obtenido == esperado, "la búsqueda binaria debe rutear igual que el recorrido lineal"
+        assert sum(distribucion.values()) == len(keys)
+
+        por_key = lambda t: t / len(muestra) * 1e6
+        print(f"{num_shards:>6} | {por_key(t_lineal):>13.2f} | {por_key(t_bisect):>13.2f} | "
+              f"{por_key(t_lote):>11.2f} | {t_dist:>16.3f} | {t_lineal / t_bisect:>6.0f}x")
+    print("-" * 88)
+    print("✅ Mismo ruteo que el router lineal en todas las configuraciones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Catálogo indexado en memoria para EcoMarket
+Reemplaza la lista `productos_db` (búsqueda lineal en cada compra) por:
+1. Índice primario por id               -> búsqueda O(1)
+2. Índice secundario por categoría      -> O(1) + tamaño del resultado
+3. Índice secundario por disponibilidad -> O(1) + tamaño del resultado
+
+Todas las mutaciones pasan por el store para que los índices nunca queden
+desincronizados con los objetos `Product`.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from models import Product
+
+
+class CatalogStore:
+    """
+    Store de productos con índice primario y secundarios
+
+    Mantiene además contadores agregados (disponibles, suma de precios)
+    para que `/api/estadisticas` no tenga que recorrer el catálogo.
+    """
+
+    def __init__(self, productos: Iterable[Product] = ()):
+        self._por_id: Dict[int, Product] = {}
+        self._por_categoria: Dict[str, Set[int]] = {}
+        self._por_disponible: Dict[bool, Set[int]] = {True: set(), False: set()}
+        self._suma_precios = 0.0
+        self._next_id = 1
+        for producto in productos:
+            self.agregar(producto)
+
+    # ----- Consultas -----
+
+    def __len__(self) -> int:
+        return len(self._por_id)
+
+    def __contains__(self, producto_id: int) -> bool:
+        return producto_id in self._por_id
+
+    def __iter__(self) -> Iterator[Product]:
+        return iter(self._por_id.values())
+
+    @property
+    def next_id(self) -> int:
+        """Próximo ID a asignar en `crear`"""
+        return self._next_id
+
+    def obtener(self, producto_id: int) -> Optional[Product]:
+        """Busca un producto por id (índice primario)"""
+        return self._por_id.get(producto_id)
+
+    def listar(self) -> List[Product]:
+        """Todos los productos en orden de inserción"""
+        return list(self._por_id.values())
+
+    def por_categoria(self, categoria: str) -> List[Product]:
+        """Productos de una categoría (índice secundario)"""
+        ids = self._por_categoria.get(categoria, ())
+        return [self._por_id[i] for i in sorted(ids)]
+
+    def por_disponibilidad(self, disponible: bool = True) -> List[Product]:
+        """Productos disponibles / agotados (índice secundario)"""
+        return [self._por_id[i] for i in sorted(self._por_disponible[bool(disponible)])]
+
+    def contar_por_categoria(self) -> Dict[str, int]:
+        return {categoria: len(ids) for categoria, ids in self._por_categoria.items()}
+
+    def contar_disponibles(self) -> int:
+        return len(self._por_disponible[True])
+
+    def precio_promedio(self) -> float:
+        return self._suma_precios / len(self._por_id) if self._por_id else 0.0
+
+    # ----- Mutaciones -----
+
+    def agregar(self, producto: Product) -> Product:
+        """Inserta un producto que ya trae id (carga inicial / replay)"""
+        if producto.id in self._por_id:
+            raise ValueError(f"Producto {producto.id} ya existe en el catálogo")
+        self._por_id[producto.id] = producto
+        self._indexar(producto)
+        self._suma_precios += producto.precio
+        self._next_id = max(self._next_id, producto.id + 1)
+        return producto
+
+    def crear(self, datos: Dict[str, Any], fecha_agregado: Optional[datetime] = None) -> Product:
+        """Crea un producto asignándole el próximo id disponible"""
+        producto = Product(
+            id=self._next_id,
+            **datos,
+            fecha_agregado=fecha_agregado or datetime.now()
+        )
+        return self.agregar(producto)
+
+    def actualizar(self, producto_id: int, cambios: Dict[str, Any]) -> Optional[Product]:
+        """Aplica `cambios` campo a campo y reindexa. Retorna None si no existe"""
+        producto = self._por_id.get(producto_id)
+        if producto is None:
+            return None
+        self._desindexar(producto)
+        self._suma_precios -= producto.precio
+        for campo, valor in cambios.items():
+            setattr(producto, campo, valor)
+        self._suma_precios += producto.precio
+        self._indexar(producto)
+        return producto
+
+    def descontar_stock(self, producto_id: int, cantidad: int) -> Product:
+        """
+        Descuenta stock de un producto existente
+        Si se agota, lo marca como no disponible (misma regla que /api/compras)
+        """
+        producto = self._por_id[producto_id]
+        if producto.stock < cantidad:
+            raise ValueError(f"Stock insuficiente para producto {producto_id}")
+        producto.stock -= cantidad
+        if producto.stock == 0 and producto.disponible:
+            self._por_disponible[True].discard(producto_id)
+            producto.disponible = False
+            self._por_disponible[False].add(producto_id)
+        return producto
+
+    def eliminar(self, producto_id: int) -> Optional[Product]:
+        """Elimina un producto y lo retira de los índices"""
+        producto = self._por_id.pop(producto_id, None)
+        if producto is None:
+            return None
+        self._desindexar(producto)
+        self._suma_precios -= producto.precio
+        return producto
+
+    # ----- Índices -----
+
+    def _indexar(self, producto: Product):
+        self._por_categoria.setdefault(producto.categoria, set()).add(producto.id)
+        self._por_disponible[bool(producto.disponible)].add(producto.id)
+
+    def _desindexar(self, producto: Product):
+        ids = self._por_categoria.get(producto.categoria)
+        if ids is not None:
+            ids.discard(producto.id)
+            if not ids:
+                del self._por_categoria[producto.categoria]
+        self._por_disponible[bool(producto.disponible)].discard(producto.id)
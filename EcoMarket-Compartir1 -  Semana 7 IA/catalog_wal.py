@@ -0,0 +1,507 @@
+"""
+Persistencia del catálogo con Write-Ahead Log + snapshots
+Reemplaza la reescritura completa de productos_data.json en cada mutación:
+
+1. Cada mutación agrega UN registro compacto (una línea JSON) al log activo
+   - stock: {"n":12,"op":"stock","id":1,"d":-2}
+   - upd:   {"n":13,"op":"upd","id":1,"f":{"precio":3.1}}
+   - new:   {"n":14,"op":"new","p":{...producto completo...}}
+   - del:   {"n":15,"op":"del","id":1}
+2. Group commit: un hilo escritor (fuera del event loop) recibe los
+   registros por una cola, junta los que llegan dentro de una ventana corta
+   (o hasta `max_lote`), fusiona los redundantes del mismo producto y los
+   escribe con UN solo write + fsync; todo el lote se confirma a la vez
+3. Al superar `umbral_compactacion` registros, el log activo se sella
+   (productos_data.wal -> productos_data.wal.000001) y se abre uno nuevo
+4. Un hilo en segundo plano compacta: snapshot anterior + segmentos sellados
+   -> snapshot nuevo (archivo temporal + rename atómico) y borra los segmentos
+5. Al arrancar: snapshot + segmentos sellados + log activo (replay)
+
+Cada registro lleva un número de secuencia (LSN) y el snapshot guarda el
+último LSN que incluye, por lo que el replay es idempotente aunque el
+proceso muera en mitad de una compactación. Un lote a medio escribir
+(caída antes del fsync) nunca fue confirmado: se trunca al arrancar.
+"""
+
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from catalog_store import CatalogStore
+from models import Product
+
+
+def producto_a_dict(producto: Product) -> Dict[str, Any]:
+    """Serializa un producto con el mismo formato que productos_data.json"""
+    return {
+        "id": producto.id,
+        "nombre": producto.nombre,
+        "categoria": producto.categoria,
+        "precio": producto.precio,
+        "disponible": producto.disponible,
+        "stock": producto.stock,
+        "descripcion": producto.descripcion,
+        "fecha_agregado": producto.fecha_agregado.isoformat()
+    }
+
+
+def dict_a_producto(dato: Dict[str, Any]) -> Product:
+    return Product(
+        id=dato["id"],
+        nombre=dato["nombre"],
+        categoria=dato["categoria"],
+        precio=dato["precio"],
+        disponible=dato["disponible"],
+        stock=dato["stock"],
+        descripcion=dato["descripcion"],
+        fecha_agregado=datetime.fromisoformat(dato["fecha_agregado"])
+    )
+
+
+def aplicar_registro(store: CatalogStore, registro: Dict[str, Any]):
+    """Aplica un registro del log sobre el catálogo (replay)"""
+    op = registro["op"]
+    if op == "stock":
+        store.descontar_stock(registro["id"], -registro["d"])
+    elif op == "upd":
+        store.actualizar(registro["id"], registro["f"])
+    elif op == "new":
+        store.agregar(dict_a_producto(registro["p"]))
+    elif op == "del":
+        store.eliminar(registro["id"])
+    else:
+        raise ValueError(f"Operación desconocida en el log: {op}")
+
+
+def coalescer_lote(registros: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fusiona registros redundantes de un mismo producto dentro de un lote
+    - stock + stock   -> un solo delta (suma)
+    - upd + upd       -> un solo upd con los campos combinados
+    - stock/upd + del -> solo el del
+    El registro fusionado conserva el LSN mayor; el replay da el mismo resultado
+    """
+    salida: List[Optional[Dict[str, Any]]] = []
+    ultimo_por_id: Dict[int, int] = {}
+    for registro in registros:
+        op = registro["op"]
+        producto_id = _id_registro(registro)
+        indice = ultimo_por_id.get(producto_id)
+        previo = salida[indice] if indice is not None else None
+
+        if previo is not None and previo["op"] == op == "stock":
+            previo["d"] += registro["d"]
+            previo["n"] = registro["n"]
+            continue
+        if previo is not None and previo["op"] == op == "upd":
+            previo["f"] = {**previo["f"], **registro["f"]}
+            previo["n"] = registro["n"]
+            continue
+        if op == "del":
+            # Descarta los stock/upd previos del producto hasta su creación (si está en el lote)
+            for i in range(len(salida) - 1, -1, -1):
+                previo = salida[i]
+                if previo is None or _id_registro(previo) != producto_id:
+                    continue
+                if previo["op"] not in ("stock", "upd"):
+                    break
+                salida[i] = None
+
+        ultimo_por_id[producto_id] = len(salida)
+        salida.append(registro)
+    return [r for r in salida if r is not None]
+
+
+def _id_registro(registro: Dict[str, Any]) -> int:
+    return registro["p"]["id"] if registro["op"] == "new" else registro["id"]
+
+
+def _fsync_directorio(ruta: str):
+    """fsync del directorio para que un rename sobreviva a una caída (POSIX)"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(ruta)), os.O_RDONLY)
+    except OSError:
+        return  # Windows no permite abrir directorios: el rename ya es atómico
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class MetricasCommit:
+    """Latencia de commit y tamaño de lote de los últimos N lotes"""
+
+    def __init__(self, ventana: int = 1000):
+        self.commits = 0
+        self.registros = 0
+        self.coalescidos = 0
+        self.max_lote = 0
+        self._latencias_ms = deque(maxlen=ventana)
+        self._lotes = deque(maxlen=ventana)
+
+    def registrar(self, tamano_lote: int, latencia_ms: float):
+        self.commits += 1
+        self.registros += tamano_lote
+        self.max_lote = max(self.max_lote, tamano_lote)
+        self._latencias_ms.append(latencia_ms)
+        self._lotes.append(tamano_lote)
+
+    def resumen(self) -> Dict[str, Any]:
+        latencias = sorted(self._latencias_ms)
+
+        def percentil(p):
+            return round(latencias[min(len(latencias) - 1, int(p * len(latencias)))], 3) if latencias else 0.0
+
+        return {
+            "commits": self.commits,
+            "registros": self.registros,
+            "coalescidos": self.coalescidos,
+            "lote_promedio": round(sum(self._lotes) / len(self._lotes), 2) if self._lotes else 0.0,
+            "lote_maximo": self.max_lote,
+            "latencia_commit_ms": {"p50": percentil(0.50), "p99": percentil(0.99), "max": percentil(1.0)},
+        }
+
+
+class GroupCommitWriter:
+    """
+    Hilo escritor del log con group commit
+
+    Los registros se encolan con `enviar()` y se recibe un Future que se
+    resuelve cuando el registro es durable (después del fsync de su lote).
+    La serialización JSON y la fusión de registros también ocurren en este
+    hilo, así que el event loop solo paga un `queue.put`.
+
+    Args:
+        ruta: archivo de log (modo append)
+        ventana_ms: tiempo máximo que el primer registro espera compañeros de lote
+        max_lote: cantidad máxima de registros por write + fsync
+        al_confirmar: callback(registros_escritos) ejecutado en el hilo escritor tras cada commit
+        coalescer: función que fusiona registros redundantes de un lote
+    """
+
+    _CERRAR = object()
+    _FLUSH = object()
+
+    def __init__(self, ruta: str, ventana_ms: float = 2.0, max_lote: int = 256,
+                 al_confirmar: Optional[Callable[[int], None]] = None,
+                 coalescer: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None):
+        self.ruta = ruta
+        self.ventana = ventana_ms / 1000.0
+        self.max_lote = max_lote
+        self.al_confirmar = al_confirmar
+        self.coalescer = coalescer
+        self.metricas = MetricasCommit()
+        # Protege el archivo: commits, rotación y truncado no se solapan
+        self.archivo_lock = threading.Lock()
+        self._archivo = None
+        self._cola: "queue.Queue" = queue.Queue()
+        self._hilo = threading.Thread(target=self._bucle, name="wal-group-commit", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, registro: Dict[str, Any]) -> Future:
+        futuro: Future = Future()
+        self._cola.put((registro, futuro))
+        return futuro
+
+    def flush(self) -> Future:
+        """Future que se resuelve cuando todo lo encolado antes de la llamada es durable"""
+        futuro: Future = Future()
+        self._cola.put((self._FLUSH, futuro))
+        return futuro
+
+    def cerrar_archivo(self):
+        """Cierra el archivo actual (llamar con archivo_lock); se reabre en el próximo commit"""
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+    def cerrar(self):
+        self._cola.put(self._CERRAR)
+        self._hilo.join()
+        with self.archivo_lock:
+            self.cerrar_archivo()
+
+    def _bucle(self):
+        cerrar = False
+        while not cerrar:
+            item = self._cola.get()
+            if item is self._CERRAR:
+                return
+            lote, flushes = [], []
+            limite = time.monotonic() + self.ventana
+            while True:
+                if item[0] is self._FLUSH:
+                    flushes.append(item[1])
+                    break  # Un flush no espera la ventana: se confirma lo acumulado ya
+                lote.append(item)
+                if len(lote) >= self.max_lote:
+                    break
+                restante = limite - time.monotonic()
+                try:
+                    item = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._CERRAR:
+                    cerrar = True
+                    break
+            if lote:
+                try:
+                    self._commit(lote)
+                except Exception as e:  # Si el hilo muere, todo future posterior queda colgado
+                    print(f"⚠️ WAL: commit fallido ({e})")
+                    for _, futuro in lote:
+                        if not futuro.done():
+                            futuro.set_exception(e)
+            for futuro in flushes:
+                futuro.set_result(None)
+
+    def _commit(self, lote):
+        inicio = time.perf_counter()
+        registros = [registro for registro, _ in lote]
+        if self.coalescer is not None:
+            registros = self.coalescer(registros)
+        try:
+            datos = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in registros)
+            with self.archivo_lock:
+                if self._archivo is None:
+                    self._archivo = open(self.ruta, "ab")
+                self._archivo.write(datos.encode("utf-8"))
+                self._archivo.flush()
+                os.fsync(self._archivo.fileno())
+        except Exception as e:
+            for _, futuro in lote:
+                futuro.set_exception(e)
+            return
+        self.metricas.registrar(len(lote), (time.perf_counter() - inicio) * 1000)
+        self.metricas.coalescidos += len(lote) - len(registros)
+        for _, futuro in lote:
+            futuro.set_result(None)
+        if self.al_confirmar is not None:
+            try:
+                self.al_confirmar(len(registros))
+            except Exception as e:  # El lote ya es durable; el próximo commit reintenta
+                print(f"⚠️ WAL: al_confirmar falló tras el commit ({e})")
+
+
+class CatalogWAL:
+    """
+    Log de mutaciones del catálogo con compactación en segundo plano
+
+    Args:
+        snapshot_path: archivo del snapshot (ej: productos_data.json)
+        umbral_compactacion: registros en el log activo antes de sellarlo
+        ventana_ms: ventana de agrupación del group commit
+        max_lote: registros máximos por commit
+    """
+
+    def __init__(self, snapshot_path: str, umbral_compactacion: int = 1000,
+                 ventana_ms: float = 2.0, max_lote: int = 256):
+        self.snapshot_path = snapshot_path
+        base, _ = os.path.splitext(snapshot_path)
+        self.log_path = base + ".wal"
+        self.umbral_compactacion = umbral_compactacion
+
+        self._lsn = 0
+        self._registros_log = 0
+        self._escritor = GroupCommitWriter(self.log_path, ventana_ms, max_lote,
+                                           al_confirmar=self._al_confirmar, coalescer=coalescer_lote)
+        self._lock = threading.Lock()
+        self._compactacion_lock = threading.Lock()
+        self._compactador: Optional[threading.Thread] = None
+        self.compactaciones = 0
+
+    # ----- Carga (snapshot + replay) -----
+
+    def cargar(self) -> Optional[CatalogStore]:
+        """
+        Reconstruye el catálogo: snapshot + segmentos sellados + log activo
+        Retorna None si no hay snapshot ni log (primer arranque)
+        """
+        snapshot_lsn, productos = self._leer_snapshot(self.snapshot_path)
+        archivos_log = self._segmentos_sellados() + [self.log_path]
+        if productos is None and not any(os.path.exists(p) for p in archivos_log):
+            return None
+
+        store = CatalogStore(productos or [])
+        ultimo_lsn = snapshot_lsn
+        for ruta in archivos_log:
+            for registro in self._leer_registros(ruta, reparar=True):
+                if registro["n"] <= snapshot_lsn:
+                    continue
+                aplicar_registro(store, registro)
+                ultimo_lsn = max(ultimo_lsn, registro["n"])
+
+        self._lsn = ultimo_lsn
+        return store
+
+    @staticmethod
+    def _leer_snapshot(ruta: str) -> Tuple[int, Optional[List[Product]]]:
+        if not os.path.exists(ruta):
+            return 0, None
+        with open(ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        # Formato antiguo: lista plana de productos (sin LSN)
+        if isinstance(datos, list):
+            return 0, [dict_a_producto(d) for d in datos]
+        return datos["lsn"], [dict_a_producto(d) for d in datos["productos"]]
+
+    @staticmethod
+    def _leer_registros(ruta: str, reparar: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Lee registros hasta el primero incompleto (lote sin fsync al caer el proceso)
+        Con `reparar`, trunca el archivo en ese punto para que los próximos
+        appends no queden detrás de una línea corrupta
+        """
+        if not os.path.exists(ruta):
+            return
+        valido = 0
+        with open(ruta, "rb") as f:
+            for linea in f:
+                try:
+                    if not linea.endswith(b"\n"):
+                        raise ValueError("línea sin terminar")
+                    registro = json.loads(linea)
+                except ValueError:
+                    print(f"⚠️ WAL: registro incompleto descartado en {ruta}")
+                    break
+                valido += len(linea)
+                yield registro
+            else:
+                return
+        if reparar:
+            with open(ruta, "r+b") as f:
+                f.truncate(valido)
+                os.fsync(f.fileno())
+
+    # ----- Escritura de registros -----
+
+    # Cada registrar_* retorna un Future que se resuelve cuando el registro es durable
+
+    def registrar_stock(self, producto_id: int, delta: int) -> Future:
+        return self._append({"op": "stock", "id": producto_id, "d": delta})
+
+    def registrar_actualizacion(self, producto_id: int, campos: Dict[str, Any]) -> Future:
+        return self._append({"op": "upd", "id": producto_id, "f": campos})
+
+    def registrar_creacion(self, producto: Product) -> Future:
+        return self._append({"op": "new", "p": producto_a_dict(producto)})
+
+    def registrar_eliminacion(self, producto_id: int) -> Future:
+        return self._append({"op": "del", "id": producto_id})
+
+    def _append(self, registro: Dict[str, Any]) -> Future:
+        # El LSN se asigna y se encola bajo el mismo lock: orden del log == orden de LSN
+        with self._lock:
+            self._lsn += 1
+            registro["n"] = self._lsn
+            return self._escritor.enviar(registro)
+
+    def flush(self) -> Future:
+        """Future que se resuelve cuando todas las mutaciones registradas son durables"""
+        return self._escritor.flush()
+
+    def _al_confirmar(self, tamano_lote: int):
+        """Hilo escritor: tras cada commit decide si sellar el log activo"""
+        with self._escritor.archivo_lock:
+            self._registros_log += tamano_lote
+            if self._registros_log < self.umbral_compactacion:
+                return
+            self._sellar_log()
+        self._lanzar_compactacion()
+
+    def _sellar_log(self):
+        """Renombra el log activo a un segmento sellado (llamar con archivo_lock)"""
+        self._escritor.cerrar_archivo()
+        existentes = self._segmentos_sellados()
+        siguiente = int(existentes[-1].rsplit(".", 1)[1]) + 1 if existentes else 1
+        os.replace(self.log_path, f"{self.log_path}.{siguiente:06d}")
+        _fsync_directorio(self.log_path)
+        self._registros_log = 0
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "lsn": self._lsn,
+            "registros_log_activo": self._registros_log,
+            "segmentos_sellados": len(self._segmentos_sellados()),
+            "compactaciones": self.compactaciones,
+            "ventana_ms": self._escritor.ventana * 1000,
+            "max_lote": self._escritor.max_lote,
+            "group_commit": self._escritor.metricas.resumen(),
+        }
+
+    def _segmentos_sellados(self) -> List[str]:
+        return sorted(glob.glob(glob.escape(self.log_path) + ".[0-9]*"))
+
+    # ----- Snapshots y compactación -----
+
+    def escribir_snapshot(self, store: CatalogStore):
+        """
+        Escribe un snapshot completo del catálogo en memoria y descarta el log
+        Solo para el primer arranque / cierre ordenado: es O(catálogo)
+        """
+        with self._lock, self._escritor.archivo_lock, self._compactacion_lock:
+            self._escribir_snapshot_atomico(self._lsn, store)
+            self._escritor.cerrar_archivo()
+            for ruta in self._segmentos_sellados() + [self.log_path]:
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            self._registros_log = 0
+
+    def _escribir_snapshot_atomico(self, lsn: int, store: CatalogStore):
+        temporal = self.snapshot_path + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(
+                {"lsn": lsn, "productos": [producto_a_dict(p) for p in store]},
+                f, ensure_ascii=False, separators=(",", ":")
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.snapshot_path)
+        _fsync_directorio(self.snapshot_path)
+
+    def _lanzar_compactacion(self):
+        if self._compactador is not None and self._compactador.is_alive():
+            return  # El hilo activo también procesará el segmento recién sellado
+        self._compactador = threading.Thread(target=self.compactar, name="wal-compactador", daemon=True)
+        self._compactador.start()
+
+    def compactar(self):
+        """
+        Snapshot anterior + segmentos sellados -> snapshot nuevo
+        Trabaja sobre un catálogo privado: no toca el catálogo en memoria de la API
+        """
+        with self._compactacion_lock:
+            while True:
+                segmentos = self._segmentos_sellados()
+                if not segmentos:
+                    return
+                snapshot_lsn, productos = self._leer_snapshot(self.snapshot_path)
+                store = CatalogStore(productos or [])
+                ultimo_lsn = snapshot_lsn
+                for ruta in segmentos:
+                    for registro in self._leer_registros(ruta):
+                        if registro["n"] > snapshot_lsn:
+                            aplicar_registro(store, registro)
+                            # Un registro fusionado lleva el LSN mayor del lote pero queda
+                            # antes que otros del mismo lote: el último leído no es el máximo
+                            ultimo_lsn = max(ultimo_lsn, registro["n"])
+                self._escribir_snapshot_atomico(ultimo_lsn, store)
+                for ruta in segmentos:
+                    os.remove(ruta)
+                self.compactaciones += 1
+
+    def esperar_compactacion(self, timeout: Optional[float] = None):
+        if self._compactador is not None:
+            self._compactador.join(timeout)
+
+    def cerrar(self):
+        """Confirma los registros pendientes, detiene el escritor y espera la compactación"""
+        self._escritor.cerrar()
+        self.esperar_compactacion()
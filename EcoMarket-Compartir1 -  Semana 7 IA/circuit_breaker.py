@@ -0,0 +1,245 @@
+"""
+Circuit breaker por servicio externo (RabbitMQ, Redis Queue, HTTP Directo)
+Cuando un servicio falla de forma sostenida, el breaker se abre y las
+llamadas fallan de inmediato (microsegundos) en lugar de pagar timeouts y
+reintentos de conexión en cada compra.
+
+Estados:
+1. cerrado     -> las llamadas pasan; se mide la tasa de fallos y de llamadas lentas
+2. abierto     -> las llamadas fallan al instante con CircuitoAbiertoError
+3. semiabierto -> tras `espera_abierto` segundos se dejan pasar unas pocas
+                  llamadas de prueba; si salen bien se cierra, si no se reabre
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class CircuitoAbiertoError(Exception):
+    """La llamada se rechazó sin intentarla porque el circuito está abierto"""
+
+    def __init__(self, nombre: str, reintentar_en: float):
+        super().__init__(f"Circuito '{nombre}' abierto; próxima prueba en {reintentar_en:.1f}s")
+        self.nombre = nombre
+        self.reintentar_en = reintentar_en
+
+
+class CircuitBreaker:
+    """
+    Breaker con ventana deslizante de las últimas N llamadas
+
+    Args:
+        nombre: servicio protegido (aparece en métricas y errores)
+        umbral_fallos: tasa de fallos (0-1) que abre el circuito
+        umbral_lentas: tasa de llamadas lentas (0-1) que abre el circuito
+        llamada_lenta_s: duración a partir de la cual una llamada cuenta como lenta
+        ventana: número de llamadas recientes evaluadas
+        minimo_llamadas: llamadas necesarias en la ventana antes de evaluar tasas
+        espera_abierto: segundos en estado abierto antes de probar (semiabierto)
+        llamadas_prueba: llamadas permitidas en semiabierto para decidir
+        max_historial: transiciones de estado que se conservan
+        reloj: reloj monotónico (inyectable para pruebas)
+    """
+
+    def __init__(self, nombre: str, umbral_fallos: float = 0.5, umbral_lentas: float = 0.8,
+                 llamada_lenta_s: float = 1.0, ventana: int = 20, minimo_llamadas: int = 5,
+                 espera_abierto: float = 10.0, llamadas_prueba: int = 3, max_historial: int = 50,
+                 reloj: Callable[[], float] = time.monotonic):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.umbral_lentas = umbral_lentas
+        self.llamada_lenta_s = llamada_lenta_s
+        self.minimo_llamadas = minimo_llamadas
+        self.espera_abierto = espera_abierto
+        self.llamadas_prueba = llamadas_prueba
+        self._reloj = reloj
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._abierto_desde = 0.0
+        self._ventana: Deque[tuple] = deque(maxlen=ventana)  # (fallo, lenta)
+        self._pruebas_en_curso = 0
+        self._resultados_prueba: list = []
+        self._ronda = 0  # Cambia en cada transición: una reserva solo cuenta en la ronda en que se tomó
+        self.historial: Deque[Dict[str, Any]] = deque(maxlen=max_historial)
+        self.rechazadas = 0
+        self.llamadas = 0
+        self.fallos = 0
+
+    # ----- Transiciones (llamar con self._lock tomado)
+
+    def _transicionar(self, nuevo_estado: str, motivo: str):
+        self.historial.append({
+            "desde": self._estado,
+            "hacia": nuevo_estado,
+            "motivo": motivo,
+            "timestamp": datetime.now().isoformat(),
+        })
+        self._estado = nuevo_estado
+        self._ronda += 1
+        if nuevo_estado == ABIERTO:
+            self._abierto_desde = self._reloj()
+        if nuevo_estado != SEMIABIERTO:
+            self._pruebas_en_curso = 0
+            self._resultados_prueba = []
+        if nuevo_estado == CERRADO:
+            self._ventana.clear()
+
+    def _actualizar_estado(self):
+        if self._estado == ABIERTO and self._reloj() - self._abierto_desde >= self.espera_abierto:
+            self._transicionar(SEMIABIERTO, f"{self.espera_abierto}s en estado abierto")
+
+    def _tasas(self, resultados) -> tuple:
+        total = len(resultados)
+        if not total:
+            return 0.0, 0.0
+        return (sum(1 for fallo, _ in resultados if fallo) / total,
+                sum(1 for _, lenta in resultados if lenta) / total)
+
+    # ----- API
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            self._actualizar_estado()
+            return self._estado
+
+    def antes_de_llamar(self) -> int:
+        """
+        Reserva permiso para una llamada o lanza CircuitoAbiertoError sin tocar el servicio
+
+        Retorna la reserva (la ronda del estado actual) que se pasa a
+        `registrar()` o a `liberar()`
+        """
+        with self._lock:
+            self._actualizar_estado()
+            if self._estado == CERRADO:
+                return self._ronda
+            if self._estado == SEMIABIERTO and self._pruebas_en_curso < self.llamadas_prueba:
+                self._pruebas_en_curso += 1
+                return self._ronda
+            self.rechazadas += 1
+            restante = max(0.0, self.espera_abierto - (self._reloj() - self._abierto_desde))
+        raise CircuitoAbiertoError(self.nombre, restante)
+
+    def registrar(self, reserva: int, exito: bool, duracion: float):
+        """
+        Registra el resultado de una llamada permitida por `antes_de_llamar()`
+
+        Solo decide si la reserva es de la ronda actual: el resultado tardío
+        de una llamada admitida en cerrado no decide las pruebas de
+        semiabierto, ni el de una prueba cae en la ventana del estado siguiente.
+        """
+        lenta = duracion >= self.llamada_lenta_s
+        with self._lock:
+            self.llamadas += 1
+            if not exito:
+                self.fallos += 1
+            if reserva != self._ronda:
+                return
+
+            if self._estado == SEMIABIERTO:
+                self._resultados_prueba.append((not exito, lenta))
+                if len(self._resultados_prueba) < self.llamadas_prueba:
+                    return
+                tasa_fallos, tasa_lentas = self._tasas(self._resultados_prueba)
+                if tasa_fallos >= self.umbral_fallos or tasa_lentas >= self.umbral_lentas:
+                    self._transicionar(ABIERTO, f"pruebas fallidas ({tasa_fallos:.0%} fallos, {tasa_lentas:.0%} lentas)")
+                else:
+                    self._transicionar(CERRADO, f"{len(self._resultados_prueba)} pruebas exitosas")
+                return
+
+            self._ventana.append((not exito, lenta))
+            if len(self._ventana) < self.minimo_llamadas:
+                return
+            tasa_fallos, tasa_lentas = self._tasas(self._ventana)
+            if tasa_fallos >= self.umbral_fallos:
+                self._transicionar(ABIERTO, f"tasa de fallos {tasa_fallos:.0%} en {len(self._ventana)} llamadas")
+            elif tasa_lentas >= self.umbral_lentas:
+                self._transicionar(ABIERTO, f"tasa de llamadas lentas {tasa_lentas:.0%} (>= {self.llamada_lenta_s}s)")
+
+    def liberar(self, reserva: int):
+        """
+        Devuelve una reserva de `antes_de_llamar()` sin resultado (llamada cancelada)
+
+        No cuenta como éxito ni como fallo: solo libera el cupo de prueba, si
+        la reserva era de la ronda semiabierta actual.
+        """
+        with self._lock:
+            if self._estado == SEMIABIERTO and reserva == self._ronda and self._pruebas_en_curso > 0:
+                self._pruebas_en_curso -= 1
+
+    def llamar(self, funcion: Callable[..., Any], *args,
+               es_fallo: Optional[Callable[[Any], bool]] = None, **kwargs) -> Any:
+        """
+        Ejecuta `funcion` protegida por el breaker
+
+        Una excepción cuenta como fallo (y se propaga); `es_fallo(resultado)`
+        permite contar como fallo las funciones que reportan errores en su retorno.
+        """
+        reserva = self.antes_de_llamar()
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception:
+            self.registrar(reserva, False, time.perf_counter() - inicio)
+            raise
+        except BaseException:
+            self.liberar(reserva)  # KeyboardInterrupt, SystemExit: no dice nada del servicio
+            raise
+        self.registrar(reserva, not (es_fallo and es_fallo(resultado)), time.perf_counter() - inicio)
+        return resultado
+
+    async def llamar_async(self, funcion: Callable[..., Awaitable[Any]], *args,
+                           es_fallo: Optional[Callable[[Any], bool]] = None, **kwargs) -> Any:
+        """Igual que `llamar()` para corrutinas: la duración incluye la espera del await"""
+        reserva = self.antes_de_llamar()
+        inicio = time.perf_counter()
+        try:
+            resultado = await funcion(*args, **kwargs)
+        except Exception:
+            self.registrar(reserva, False, time.perf_counter() - inicio)
+            raise
+        except BaseException:
+            # Cancelada (cliente desconectado, wait_for vencido): sin liberar el cupo,
+            # el breaker quedaría semiabierto rechazando todo para siempre
+            self.liberar(reserva)
+            raise
+        self.registrar(reserva, not (es_fallo and es_fallo(resultado)), time.perf_counter() - inicio)
+        return resultado
+
+    def reiniciar(self, motivo: str = "reinicio manual"):
+        with self._lock:
+            if self._estado != CERRADO:
+                self._transicionar(CERRADO, motivo)
+            self._ventana.clear()
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            self._actualizar_estado()
+            tasa_fallos, tasa_lentas = self._tasas(self._ventana)
+            return {
+                "estado": self._estado,
+                "tasa_fallos": round(tasa_fallos, 3),
+                "tasa_lentas": round(tasa_lentas, 3),
+                "llamadas_en_ventana": len(self._ventana),
+                "llamadas": self.llamadas,
+                "fallos": self.fallos,
+                "rechazadas": self.rechazadas,
+                "configuracion": {
+                    "umbral_fallos": self.umbral_fallos,
+                    "umbral_lentas": self.umbral_lentas,
+                    "llamada_lenta_s": self.llamada_lenta_s,
+                    "ventana": self._ventana.maxlen,
+                    "minimo_llamadas": self.minimo_llamadas,
+                    "espera_abierto_s": self.espera_abierto,
+                    "llamadas_prueba": self.llamadas_prueba,
+                },
+                "historial": list(self.historial),
+            }
@@ -4,12 +4,16 @@ Demo Semana 7: PostgreSQL - Sharding y Distribución de Carga
 SIMPLICADO para demostración rápida
 """
 
+import asyncio
 import psycopg2
 import time
 import hashlib
 from datetime import datetime
 import random
 
+from scatter_gather import ConsultaDistribuida, DBAPIShard, ScatterGatherExecutor
+from shard_router import comparar_estrategias, imprimir_comparacion
+
 # Configuración de 3 servidores PostgreSQL
 SERVERS = [
     {"host": "localhost", "port": 5432, "database": "ecomarket", "user": "postgres", "password": "postgres"},
@@ -157,28 +161,34 @@ def demo_2_balanceo_carga():
     print("\n✅ BALANCEO CORRECTO: Las lecturas se distribuyeron uniformemente")
 
 def demo_3_consulta_agregada():
-    """Demo 3: Consulta agregada desde todos los shards"""
-    print_section("DEMO 3: CONSULTA AGREGADA (MAP-REDUCE)")
+    """Demo 3: Consulta agregada desde todos los shards (scatter-gather en paralelo)"""
+    print_section("DEMO 3: CONSULTA AGREGADA (SCATTER-GATHER)")
     
-    print("🔍 Consultando TODOS los usuarios desde los 3 shards...\n")
+    print("🔍 Consultando los 3 shards EN PARALELO...\n")
     
-    all_users = []
+    # Cada shard corre en su propio hilo; si uno no responde se sigue con el resto
+    fuentes = {i: DBAPIShard(lambda server=server: psycopg2.connect(**server)) for i, server in enumerate(SERVERS)}
+    ejecutor = ScatterGatherExecutor(fuentes, timeout_shard=3.0, politica="parcial")
     
-    for i, server in enumerate(SERVERS):
-        conn = connect_db(server, SERVER_NAMES[i])
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT user_id, nombre, email FROM usuarios ORDER BY user_id")
-            users = cursor.fetchall()
-            conn.close()
-            
-            print(f"  📦 {SERVER_NAMES[i]}: {len(users)} usuarios")
-            all_users.extend(users)
+    async def consultar():
+        # COUNT(*) en cada shard (no se traen los usuarios) y ORDER BY + LIMIT empujados a cada shard
+        conteo = await ejecutor.agregar("usuarios", {"total": ("COUNT", "*")})
+        primeros = await ejecutor.consultar(ConsultaDistribuida(
+            "usuarios", ("user_id", "nombre", "email"), order_by=["user_id"], limit=5))
+        return conteo, primeros
     
-    print(f"\n📊 Total de usuarios en el sistema: {len(all_users)}")
-    print("\n🔍 Primeros 5 usuarios (ordenados):")
-    for user_id, nombre, email in sorted(all_users)[:5]:
-        print(f"  → {user_id}: {nombre} ({email})")
+    conteo, primeros = asyncio.run(consultar())
+    for shard_id, parcial in conteo.parciales.items():
+        if shard_id in conteo.fallidos:
+            print(f"  ❌ {SERVER_NAMES[shard_id]}: {conteo.fallidos[shard_id]}")
+        else:
+            print(f"  📦 {SERVER_NAMES[shard_id]}: {parcial[0]['total']} usuarios")
+    
+    print(f"\n📊 Total de usuarios en el sistema: {conteo.filas[0]['total']} "
+          f"(suma de los COUNT parciales, {conteo.duracion_s * 1000:.0f} ms)")
+    print("\n🔍 Primeros 5 usuarios (LIMIT 5 por shard + merge de k vías):")
+    for fila in primeros.filas:
+        print(f"  → {fila['user_id']}: {fila['nombre']} ({fila['email']})")
     
     print("\n✅ CONSULTA AGREGADA EXITOSA: Combinamos datos de 3 shards")
 
@@ -249,6 +259,10 @@ def demo_5_hash_consistente():
     print("\n❌ PROBLEMA: Con hash simple, agregar shards requiere mover ~75% de los datos")
     print("✅ SOLUCIÓN: Hash consistente solo mueve ~25% de los datos")
     print("\n💡 Hash consistente es MEJOR para sistemas que escalan dinámicamente")
+    
+    print("\n📐 Comparando las cuatro estrategias (10.000 usuarios, de 3 a 256 shards)...\n")
+    imprimir_comparacion(comparar_estrategias((3, 16, 64, 256), num_keys=10_000))
+    print("\n💡 Jump hash: casi sin memoria; Rendezvous: con pesos; ambos mueven ~1/N al agregar un shard")
 
 def main():
     print_header()
@@ -1,15 +1,41 @@
+import asyncio
+import copy
 import json
 import uuid
-import time
 from datetime import datetime
+from typing import Optional
 import pika
 
+from amqp_async import AsyncAMQPPublisher
+from retry_engine import (
+    NO_REINTENTABLES_POR_DEFECTO,
+    PRESUPUESTO_INSTANCIA,
+    ExponentialBackoffPolicy,
+    ejecutar_con_reintentos,
+)
+
 RABBIT_HOST = "localhost"
 RABBIT_USER = "user"
 RABBIT_PASS = "pass"
 EXCHANGE = "user_events"
 EXCHANGE_TYPE = "fanout"
 
+# Reintentos: 1 s, 2 s... con jitter, máximo 15 s por evento y presupuesto compartido del proceso.
+# Credenciales o permisos inválidos no se arreglan reintentando.
+POLITICA_PUBLICACION = ExponentialBackoffPolicy(
+    max_intentos=3,
+    base=1.0,
+    maximo=4.0,
+    nombre="publicar_usuario_creado",
+    jitter="completo",
+    plazo_total=15,
+    no_reintentables=NO_REINTENTABLES_POR_DEFECTO + (
+        pika.exceptions.ProbableAuthenticationError,
+        pika.exceptions.ProbableAccessDeniedError,
+    ),
+    presupuesto=PRESUPUESTO_INSTANCIA,
+)
+
 def _connection_params():
     return pika.ConnectionParameters(
         host=RABBIT_HOST,
@@ -19,7 +45,17 @@ def _connection_params():
         blocked_connection_timeout=30,
     )
 
-def publish_user_created(user_data: dict, max_retries: int = 3) -> bool:
+def _politica(max_retries: Optional[int]):
+    if max_retries is None or max_retries == POLITICA_PUBLICACION.max_intentos:
+        return POLITICA_PUBLICACION
+    # Misma política (y mismas métricas) con otro número de intentos
+    politica = copy.copy(POLITICA_PUBLICACION)
+    politica.max_intentos = max_retries
+    return politica
+
+async def publish_user_created_async(user_data: dict, publicador: AsyncAMQPPublisher,
+                                     max_retries: Optional[int] = None) -> bool:
+    """Publica UsuarioCreado con el publicador asíncrono de la app y espera la confirmación del broker"""
     message = {
         **user_data,
         "event_type": "UsuarioCreado",
@@ -27,30 +63,31 @@ def publish_user_created(user_data: dict, max_retries: int = 3) -> bool:
         "timestamp": datetime.utcnow().isoformat() + "Z",
     }
     body = json.dumps(message)
-    for attempt in range(1, max_retries + 1):
-        conn = None
+
+    async def publicar(attempt: int):
         try:
-            conn = pika.BlockingConnection(_connection_params())
-            ch = conn.channel()
-            ch.exchange_declare(exchange=EXCHANGE, exchange_type=EXCHANGE_TYPE, durable=True)
-            ch.confirm_delivery()
-            ch.basic_publish(
-                exchange=EXCHANGE,
-                routing_key="",
-                body=body,
-                properties=pika.BasicProperties(content_type="application/json", delivery_mode=2),
-                mandatory=False,
+            await publicador.publicar(
+                EXCHANGE,
+                "",
+                body,
+                pika.BasicProperties(content_type="application/json", delivery_mode=2),
+                declarar_exchange=(EXCHANGE, EXCHANGE_TYPE),
             )
-            conn.close()
-            print(f"✅ Evento publicado: {message['event_id']}")
-            return True
         except Exception as e:
             print(f"❌ publish intento {attempt} error: {e}")
-            try:
-                if conn and not conn.is_closed:
-                    conn.close()
-            except Exception:
-                pass
-            if attempt < max_retries:
-                time.sleep(2 ** (attempt - 1))
-    return False
\ No newline at end of file
+            raise
+
+    resultado = await ejecutar_con_reintentos(publicar, _politica(max_retries))
+    if resultado.exito:
+        print(f"✅ Evento publicado: {message['event_id']}")
+        return True
+    print(f"❌ Evento {message['event_id']} no publicado ({resultado.motivo})")
+    return False
+
+def publish_user_created(user_data: dict, max_retries: Optional[int] = None) -> bool:
+    """Variante síncrona para scripts: abre un publicador asíncrono solo para este evento"""
+    async def con_publicador_propio():
+        async with AsyncAMQPPublisher(_connection_params()) as publicador:
+            return await publish_user_created_async(user_data, publicador, max_retries)
+
+    return asyncio.run(con_publicador_propio())
@@ -0,0 +1,107 @@
+"""
+Inventario con descuento de stock atómico para /api/compras
+`realizar_compra` validaba `producto.stock < cantidad` y luego descontaba
+en otro paso: con compras en hilos o executors dos compradores podían ver
+el mismo stock y vender de más. Un único lock global lo evita pero
+serializa las compras de TODOS los productos.
+
+StripedInventory usa locks en franjas:
+1. `franjas` locks fijos; el producto N usa el lock N % franjas
+   (memoria constante, sin crear un lock por producto)
+2. Verificar disponibilidad + stock y descontar ocurre bajo el mismo lock:
+   nunca se vende más de lo que hay
+3. Compras de productos en franjas distintas no se bloquean entre sí
+4. El resultado (stock restante, agotado) se captura dentro del lock, así
+   la respuesta no mezcla el stock de compras posteriores
+"""
+
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator
+
+from catalog_store import CatalogStore
+
+
+class StockInsuficienteError(ValueError):
+    """No hay unidades suficientes; no se descontó nada"""
+
+    def __init__(self, producto_id: int, disponible: int, solicitado: int):
+        super().__init__(f"Stock insuficiente para producto {producto_id}: hay {disponible}, se pidieron {solicitado}")
+        self.producto_id = producto_id
+        self.disponible = disponible
+        self.solicitado = solicitado
+
+
+class ProductoNoDisponibleError(ValueError):
+    """El producto existe pero está marcado como no disponible"""
+
+    def __init__(self, producto_id: int):
+        super().__init__(f"Producto {producto_id} no disponible")
+        self.producto_id = producto_id
+
+
+@dataclass
+class ResultadoDescuento:
+    """Estado del producto justo después de SU descuento"""
+    producto_id: int
+    cantidad: int
+    stock_restante: int
+    disponible: bool
+
+
+class StripedInventory:
+    """
+    Check-and-decrement atómico sobre un CatalogStore
+
+    Args:
+        store: catálogo donde viven los productos
+        franjas: número de locks; más franjas = menos colisiones entre productos
+    """
+
+    def __init__(self, store: CatalogStore, franjas: int = 64):
+        self.store = store
+        self.franjas = franjas
+        self._locks = [threading.Lock() for _ in range(franjas)]
+        self._contadores = threading.Lock()
+        self.descuentos = 0
+        self.rechazos = 0
+
+    def _lock(self, producto_id: int) -> threading.Lock:
+        return self._locks[hash(producto_id) % self.franjas]
+
+    @contextmanager
+    def bloquear(self, producto_id: int) -> Iterator[None]:
+        """Excluye descuentos concurrentes del producto (p. ej. mientras se edita su stock)"""
+        with self._lock(producto_id):
+            yield
+
+    def descontar(self, producto_id: int, cantidad: int) -> ResultadoDescuento:
+        """
+        Descuenta `cantidad` solo si hay stock suficiente, todo bajo el lock de su franja
+
+        Lanza KeyError si el producto no existe, ProductoNoDisponibleError si
+        está deshabilitado y StockInsuficienteError si no alcanza el stock.
+        """
+        with self._lock(producto_id):
+            producto = self.store.obtener(producto_id)
+            if producto is None:
+                raise KeyError(producto_id)
+            if not producto.disponible or producto.stock < cantidad:
+                with self._contadores:
+                    self.rechazos += 1
+                if not producto.disponible:
+                    raise ProductoNoDisponibleError(producto_id)
+                raise StockInsuficienteError(producto_id, producto.stock, cantidad)
+            self.store.descontar_stock(producto_id, cantidad)
+            resultado = ResultadoDescuento(producto_id, cantidad, producto.stock, producto.disponible)
+        with self._contadores:
+            self.descuentos += 1
+        return resultado
+
+    def metricas(self) -> Dict[str, int]:
+        return {
+            "franjas": self.franjas,
+            "descuentos": self.descuentos,
+            "rechazos": self.rechazos,
+        }
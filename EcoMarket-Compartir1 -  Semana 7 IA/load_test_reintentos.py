@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de los modos con reintentos
+Lanza cientos de compras concurrentes en BACKOFF_EXPONENCIAL (o el modo indicado)
+contra la app en proceso y, mientras tanto, mide la latencia de /health.
+Con las esperas en asyncio.sleep, /health debe seguir respondiendo en milisegundos.
+
+La app de la prueba usa un presupuesto de reintentos sin tope efectivo: con
+el de producción (20% del tráfico) la mayoría de las compras se rinde sin
+esperar y no quedan cientos en backoff a la vez. --presupuesto-compartido
+mantiene el de producción.
+
+Uso:
+    python load_test_reintentos.py
+    python load_test_reintentos.py --compras 500 --modo REINTENTOS_SIMPLES
+    python load_test_reintentos.py --presupuesto-compartido
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+async def medir_health(cliente, detener, latencias):
+    """Consulta /health cada 10 ms hasta que terminen las compras"""
+    while not detener.is_set():
+        inicio = time.perf_counter()
+        respuesta = await cliente.get("/health")
+        respuesta.raise_for_status()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def ejecutar(compras: int, modo: str):
+    import httpx
+    import main
+
+    # ASGITransport no corre el lifespan: se abre a mano para que el catálogo
+    # (y el publicador) se inicien y cierren como en uvicorn
+    transporte = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app), \
+            httpx.AsyncClient(transport=transporte, base_url="http://test", timeout=120) as cliente:
+        respuesta = await cliente.post("/api/productos", json={
+            "nombre": "Producto carga", "categoria": "Pruebas", "precio": 1.0, "stock": compras * 10
+        })
+        producto_id = respuesta.json()["id"]
+
+        latencias_health = []
+        detener = asyncio.Event()
+        monitor = asyncio.create_task(medir_health(cliente, detener, latencias_health))
+
+        async def comprar():
+            inicio = time.perf_counter()
+            r = await cliente.post("/api/compras", json={
+                "producto_id": producto_id, "cantidad": 1, "modo": modo
+            })
+            return r.status_code, time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(comprar() for _ in range(compras)))
+        duracion = time.perf_counter() - inicio
+        detener.set()
+        await monitor
+        metricas = (await cliente.get("/api/reintentos/metricas")).json()
+
+    exitosas = sum(1 for codigo, _ in resultados if codigo == 200)
+    tiempos = [t for _, t in resultados]
+
+    print("=" * 70)
+    print(f"PRUEBA DE CARGA: {compras} compras concurrentes en {modo}")
+    print("=" * 70)
+    print(f"Duración total:        {duracion:.2f} s")
+    print(f"Compras exitosas:      {exitosas}/{compras}")
+    print(f"Compra p50 / máx:      {statistics.median(tiempos):.2f} s / {max(tiempos):.2f} s")
+    print(f"/health muestras:      {len(latencias_health)}")
+    if latencias_health:
+        print(f"/health p50 / p99:     {statistics.median(latencias_health):.2f} ms / "
+              f"{percentil(latencias_health, 0.99):.2f} ms")
+    politica = metricas["politicas"].get(modo.lower(), {})
+    print(f"Intentos promedio:     {politica.get('intentos_promedio', 0)}")
+    print(f"Pico en backoff:       {politica.get('max_en_espera', 0)} compras esperando a la vez")
+    print(f"Finalización:          {politica.get('motivos', {})}")
+    print(f"Presupuesto:           {metricas['presupuesto']['reintentos_permitidos']} reintentos permitidos, "
+          f"{metricas['presupuesto']['reintentos_denegados']} denegados")
+    print("-" * 70)
+    print("✅ Las esperas de reintento no bloquean el event loop" if latencias_health
+          and percentil(latencias_health, 0.99) < 100 else "❌ /health se degradó durante la carga")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compras", type=int, default=300)
+    parser.add_argument("--modo", default="BACKOFF_EXPONENCIAL",
+                        choices=["REINTENTOS_SIMPLES", "BACKOFF_EXPONENCIAL", "REINTENTOS_SOFISTICADOS"])
+    parser.add_argument("--presupuesto-compartido", action="store_true",
+                        help="usar el presupuesto de reintentos de producción")
+    args = parser.parse_args()
+
+    # Catálogo temporal: la prueba no toca productos_data.json ni catalogo.db
+    directorio = tempfile.mkdtemp(prefix="ecomarket_carga_")
+    os.environ.setdefault("ECOMARKET_DATA_FILE", os.path.join(directorio, "productos_data.json"))
+    os.environ.setdefault("ECOMARKET_CATALOGO_DB", os.path.join(directorio, "catalogo.db"))
+    if not args.presupuesto_compartido:
+        # Finito: las métricas del presupuesto se serializan en JSON
+        os.environ.setdefault("ECOMARKET_RETRY_CAPACIDAD", "1e9")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    asyncio.run(ejecutar(args.compras, args.modo))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Modelos Pydantic de EcoMarket
+Compartidos por la API (main.py) y por el catálogo indexado (catalog_store.py)
+"""
+
+# ✅ Pydantic: Valida y estructura los datos que llegan a la API
+from pydantic import BaseModel, Field, ConfigDict
+
+# 📝 Tipos: Optional = campos opcionales
+from typing import Optional
+
+# 📅 Fechas: Para manejar fechas y horas
+from datetime import datetime
+
+# 📋 MODELOS PYDANTIC - Plantillas que definen cómo deben verse los datos
+
+# 🛍️ MODELO PRODUCT - Define la estructura COMPLETA de un producto
+class Product(BaseModel):
+    # 🆔 ID único del producto (número entero obligatorio)
+    id: int
+    
+    # 🏷️ Nombre del producto (texto obligatorio con descripción para documentación)
+    nombre: str = Field(..., description="Nombre del producto")
+    
+    # 📂 Categoría (texto obligatorio - ej: "Frutas", "Verduras")
+    categoria: str = Field(..., description="Categoría del producto")
+    
+    # 💰 Precio (número decimal, DEBE ser mayor que 0)
+    precio: float = Field(..., gt=0, description="Precio del producto (debe ser mayor que 0)")
+    
+    # ✅ Disponibilidad (verdadero/falso, por defecto = disponible)
+    disponible: bool = Field(default=True, description="Disponibilidad del producto")
+    
+    # � Stock/Inventario (número de unidades disponibles, debe ser >= 0)
+    stock: int = Field(default=0, ge=0, description="Cantidad en inventario (unidades disponibles)")
+    
+    # �📝 Descripción (texto opcional - puede ser None/vacío)
+    descripcion: Optional[str] = Field(None, description="Descripción opcional del producto")
+    
+    # 📅 Fecha de creación (se pone automáticamente la fecha actual)
+    fecha_agregado: datetime = Field(default_factory=datetime.now)
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "id": 1,
+                "nombre": "Manzana Orgánica",
+                "categoria": "Frutas",
+                "precio": 2.5,
+                "disponible": True,
+                "stock": 150,
+                "descripcion": "Manzanas orgánicas frescas",
+                "fecha_agregado": "2024-01-15T10:30:00"
+            }
+        }
+    )
+
+class ProductCreate(BaseModel):
+    nombre: str = Field(..., min_length=1, description="Nombre del producto")
+    categoria: str = Field(..., min_length=1, description="Categoría del producto")
+    precio: float = Field(..., gt=0, description="Precio del producto (debe ser mayor que 0)")
+    disponible: bool = Field(default=True, description="Disponibilidad del producto")
+    stock: int = Field(default=0, ge=0, description="Cantidad en inventario")
+    descripcion: Optional[str] = Field(None, description="Descripción opcional del producto")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "nombre": "Tomate Orgánico",
+                "categoria": "Verduras",
+                "precio": 3.0,
+                "disponible": True,
+                "stock": 200,
+                "descripcion": "Tomates frescos cultivados orgánicamente"
+            }
+        }
+    )
+
+# ✏️ MODELO PRODUCT UPDATE - Para MODIFICAR productos existentes (todos los campos opcionales)
+class ProductUpdate(BaseModel):
+    # 🏷️ Nombre opcional (si no se envía, no se cambia, min_length=1 evita nombres vacíos)
+    nombre: Optional[str] = Field(None, min_length=1, description="Nombre del producto")
+    
+    # 📂 Categoría opcional (si no se envía, no se cambia)
+    categoria: Optional[str] = Field(None, min_length=1, description="Categoría del producto")
+    
+    # 💰 Precio opcional (si se envía, debe ser mayor que 0)
+    precio: Optional[float] = Field(None, gt=0, description="Precio del producto (debe ser mayor que 0)")
+    
+    # ✅ Disponibilidad opcional (si no se envía, no se cambia)
+    disponible: Optional[bool] = Field(None, description="Disponibilidad del producto")
+    
+    # � Stock opcional (si no se envía, no se cambia)
+    stock: Optional[int] = Field(None, ge=0, description="Cantidad en inventario")
+    
+    # �📝 Descripción opcional (si no se envía, no se cambia)
+    descripcion: Optional[str] = Field(None, description="Descripción opcional del producto")
+
+# � MODELO COMPRA - Define la estructura de una compra
+class CompraRequest(BaseModel):
+    producto_id: int = Field(..., description="ID del producto a comprar")
+    cantidad: int = Field(default=1, gt=0, description="Cantidad a comprar (debe ser mayor que 0)")
+    modo: str = Field(..., description="Modo de procesamiento: HTTP_DIRECTO, REINTENTOS_SIMPLES, BACKOFF_EXPONENCIAL, REDIS_QUEUE, RABBITMQ")
+    
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "producto_id": 1,
+                "cantidad": 2,
+                "modo": "RABBITMQ"
+            }
+        }
+    )
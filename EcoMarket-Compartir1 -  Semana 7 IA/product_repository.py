@@ -0,0 +1,424 @@
+"""
+Repositorio de productos con backends intercambiables
+Con dos instancias detrás de nginx (least_conn) cada una tenía su propio
+`productos_db` y su propio productos_data.json: el mismo producto tenía dos
+stocks independientes y el sistema vendía de más por diseño.
+
+Backends (ECOMARKET_CATALOGO_BACKEND en main.py):
+1. "local"  -> InMemoryProductRepository: CatalogStore + StripedInventory +
+               CatalogWAL, propio de cada instancia (una sola instancia / desarrollo)
+2. "sqlite" -> SQLiteProductRepository: un archivo SQLite en modo WAL en un
+               volumen compartido por todas las instancias del mismo host;
+               todas ven UN inventario y el descuento de stock es un UPDATE
+               condicional atómico (WHERE stock >= ?)
+
+La API es asíncrona: el backend SQLite ejecuta cada operación en un pool
+de hilos propio (una conexión por hilo), fuera del event loop.
+
+El arranque con SQLite no lee el catálogo: no hay JSON que parsear ni un
+Product por fila; las lecturas grandes se paginan por id (listar_pagina).
+"""
+
+import asyncio
+import heapq
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+from catalog_store import CatalogStore
+from catalog_wal import CatalogWAL
+from inventory import ProductoNoDisponibleError, ResultadoDescuento, StockInsuficienteError, StripedInventory
+from models import Product
+
+
+# Productos del primer arranque: una lista o una función que los produce
+# (se invoca solo si el catálogo está vacío, ej: importar el JSON anterior)
+Semilla = Union[Sequence[Product], Callable[[], Iterable[Product]]]
+
+
+def _resolver_semilla(semilla: Semilla) -> List[Product]:
+    return list(semilla() if callable(semilla) else semilla)
+
+
+class ProductRepository:
+    """
+    Operaciones del catálogo que usa la API; cada backend las implementa todas
+
+    descontar_stock lanza KeyError si el producto no existe,
+    ProductoNoDisponibleError si está deshabilitado y StockInsuficienteError
+    si no alcanza el stock; en esos casos no descuenta nada.
+    """
+
+    backend = "base"
+
+    async def iniciar(self, productos_iniciales: Semilla = ()):
+        """Abre el almacenamiento; si es el primer arranque, carga `productos_iniciales`"""
+        raise NotImplementedError
+
+    async def cerrar(self):
+        raise NotImplementedError
+
+    async def obtener(self, producto_id: int) -> Optional[Product]:
+        raise NotImplementedError
+
+    async def listar(self) -> List[Product]:
+        raise NotImplementedError
+
+    async def listar_pagina(self, despues_de: int = 0, limite: int = 100) -> List[Product]:
+        """Hasta `limite` productos con id > `despues_de`, en orden de id (paginación por cursor)"""
+        raise NotImplementedError
+
+    async def crear(self, datos: Dict[str, Any]) -> Product:
+        raise NotImplementedError
+
+    async def actualizar(self, producto_id: int, cambios: Dict[str, Any]) -> Optional[Product]:
+        raise NotImplementedError
+
+    async def eliminar(self, producto_id: int) -> Optional[Product]:
+        raise NotImplementedError
+
+    async def descontar_stock(self, producto_id: int, cantidad: int) -> ResultadoDescuento:
+        raise NotImplementedError
+
+    async def estadisticas(self) -> Dict[str, Any]:
+        """total, disponibles, por_categoria y precio_promedio del catálogo"""
+        raise NotImplementedError
+
+    def metricas(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class InMemoryProductRepository(ProductRepository):
+    """
+    Catálogo en memoria de esta instancia, persistido con el WAL de catalog_wal.py
+
+    Args:
+        wal: log de mutaciones + snapshots
+        confirmacion: "durable" = cada mutación espera el fsync de su lote;
+                      "asincrona" = se responde al encolar (el cierre hace flush)
+        franjas: locks del inventario (ver inventory.py)
+    """
+
+    backend = "local"
+
+    def __init__(self, wal: CatalogWAL, confirmacion: str = "durable", franjas: int = 64):
+        self.wal = wal
+        self.confirmacion = confirmacion
+        self.franjas = franjas
+        self.store = CatalogStore()
+        self.inventario = StripedInventory(self.store, franjas)
+
+    async def iniciar(self, productos_iniciales: Semilla = ()):
+        try:
+            store = self.wal.cargar()
+        except Exception as e:
+            # Sin sembrar encima: el snapshot inicial borraría el log con las mutaciones confirmadas
+            print(f"Error cargando productos: {e}")
+            raise
+        if store is None:
+            # Primer arranque: productos por defecto + snapshot inicial
+            store = CatalogStore(_resolver_semilla(productos_iniciales))
+            try:
+                self.wal.escribir_snapshot(store)
+            except Exception as e:
+                print(f"Error guardando productos: {e}")
+        self.store = store
+        self.inventario = StripedInventory(store, self.franjas)
+
+    async def cerrar(self):
+        # Esperar a que toda mutación confirmada llegue a disco
+        await asyncio.wrap_future(self.wal.flush())
+        await asyncio.to_thread(self.wal.cerrar)
+
+    async def _persistir(self, confirmacion):
+        if self.confirmacion == "durable":
+            await asyncio.wrap_future(confirmacion)
+
+    async def obtener(self, producto_id: int) -> Optional[Product]:
+        return self.store.obtener(producto_id)
+
+    async def listar(self) -> List[Product]:
+        return self.store.listar()
+
+    async def listar_pagina(self, despues_de: int = 0, limite: int = 100) -> List[Product]:
+        return heapq.nsmallest(limite, (p for p in self.store if p.id > despues_de), key=lambda p: p.id)
+
+    async def crear(self, datos: Dict[str, Any]) -> Product:
+        producto = self.store.crear(datos, fecha_agregado=datetime.now())
+        await self._persistir(self.wal.registrar_creacion(producto))
+        return producto
+
+    async def actualizar(self, producto_id: int, cambios: Dict[str, Any]) -> Optional[Product]:
+        # Bajo el lock del producto para no pisar un descuento de stock en curso
+        with self.inventario.bloquear(producto_id):
+            producto = self.store.actualizar(producto_id, cambios)
+        if producto is None:
+            return None
+        await self._persistir(self.wal.registrar_actualizacion(producto_id, cambios))
+        return producto
+
+    async def eliminar(self, producto_id: int) -> Optional[Product]:
+        with self.inventario.bloquear(producto_id):
+            producto = self.store.eliminar(producto_id)
+        if producto is None:
+            return None
+        await self._persistir(self.wal.registrar_eliminacion(producto_id))
+        return producto
+
+    async def descontar_stock(self, producto_id: int, cantidad: int) -> ResultadoDescuento:
+        resultado = self.inventario.descontar(producto_id, cantidad)
+        # Delta de stock de tamaño fijo; las compras concurrentes comparten un fsync
+        await self._persistir(self.wal.registrar_stock(producto_id, -cantidad))
+        return resultado
+
+    async def estadisticas(self) -> Dict[str, Any]:
+        # Contadores mantenidos por los índices del store (sin recorrer el catálogo)
+        return {
+            "total": len(self.store),
+            "disponibles": self.store.contar_disponibles(),
+            "por_categoria": self.store.contar_por_categoria(),
+            "precio_promedio": self.store.precio_promedio(),
+        }
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "confirmacion": self.confirmacion,
+            "inventario": self.inventario.metricas(),
+            **self.wal.metricas(),
+        }
+
+
+COLUMNAS = ("id", "nombre", "categoria", "precio", "disponible", "stock", "descripcion", "fecha_agregado")
+COLUMNAS_EDITABLES = frozenset(COLUMNAS[1:-1])
+_SELECT = ", ".join(COLUMNAS)
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre         TEXT    NOT NULL,
+    categoria      TEXT    NOT NULL,
+    precio         REAL    NOT NULL CHECK (precio > 0),
+    disponible     INTEGER NOT NULL,
+    stock          INTEGER NOT NULL CHECK (stock >= 0),
+    descripcion    TEXT,
+    fecha_agregado TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_productos_categoria ON productos (categoria);
+CREATE INDEX IF NOT EXISTS idx_productos_disponible ON productos (disponible);
+CREATE TABLE IF NOT EXISTS catalogo_meta (clave TEXT PRIMARY KEY, valor TEXT NOT NULL);
+"""
+
+# Sentencias fijas a nivel de módulo: sqlite3 cachea la sentencia preparada por
+# conexión (cached_statements) y la reutiliza en cada llamada con el mismo texto
+SQL_OBTENER = f"SELECT {_SELECT} FROM productos WHERE id = ?"
+SQL_LISTAR = f"SELECT {_SELECT} FROM productos ORDER BY id"
+SQL_PAGINA = f"SELECT {_SELECT} FROM productos WHERE id > ? ORDER BY id LIMIT ?"
+SQL_ELIMINAR = f"DELETE FROM productos WHERE id = ? RETURNING {_SELECT}"
+SQL_ESTADO_STOCK = "SELECT stock, disponible FROM productos WHERE id = ?"
+SQL_TOTALES = "SELECT COUNT(*), COALESCE(SUM(disponible), 0), COALESCE(AVG(precio), 0) FROM productos"
+SQL_POR_CATEGORIA = "SELECT categoria, COUNT(*) FROM productos GROUP BY categoria"
+
+# Descuento atómico: verificar y descontar es UNA sentencia; SQLite serializa
+# a los escritores, así que dos instancias nunca venden la misma unidad
+SQL_DESCONTAR = """
+UPDATE productos
+   SET stock = stock - :cantidad,
+       disponible = CASE WHEN stock - :cantidad = 0 THEN 0 ELSE disponible END
+ WHERE id = :id AND disponible = 1 AND stock >= :cantidad
+RETURNING stock, disponible
+"""
+
+
+def _fila_a_producto(fila) -> Product:
+    # model_construct: las filas ya se validaron al escribirse, no se revalidan al leer
+    return Product.model_construct(
+        id=fila[0],
+        nombre=fila[1],
+        categoria=fila[2],
+        precio=fila[3],
+        disponible=bool(fila[4]),
+        stock=fila[5],
+        descripcion=fila[6],
+        fecha_agregado=datetime.fromisoformat(fila[7]),
+    )
+
+
+class SQLiteProductRepository(ProductRepository):
+    """
+    Catálogo compartido en un archivo SQLite (journal_mode=WAL)
+
+    WAL permite lecturas concurrentes con un escritor; los escritores de todos
+    los procesos se turnan esperando hasta `timeout_ocupado`. El archivo debe
+    estar en un volumen local del host (WAL usa memoria compartida: no NFS).
+
+    Args:
+        ruta: archivo de la base (ej: /data/catalogo.db)
+        hilos: hilos del pool (cada uno con su conexión)
+        timeout_ocupado: segundos esperando el lock de escritura de otro proceso
+        sincronizacion: PRAGMA synchronous ("FULL" = fsync por commit)
+        sentencias_cacheadas: sentencias preparadas que guarda cada conexión
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, ruta: str, hilos: int = 4, timeout_ocupado: float = 5.0, sincronizacion: str = "FULL",
+                 sentencias_cacheadas: int = 128):
+        self.ruta = ruta
+        self.timeout_ocupado = timeout_ocupado
+        self.sincronizacion = sincronizacion
+        self.sentencias_cacheadas = sentencias_cacheadas
+        self._executor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="sqlite-catalogo")
+        self._local = threading.local()
+        self._conexiones: List[sqlite3.Connection] = []
+        self._conexiones_lock = threading.Lock()
+        self.descuentos = 0
+        self.rechazos = 0
+
+    # ----- Conexiones (una por hilo del pool)
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            # isolation_level=None: cada sentencia es su propia transacción salvo BEGIN explícito
+            conexion = sqlite3.connect(self.ruta, timeout=self.timeout_ocupado, isolation_level=None,
+                                       check_same_thread=False, cached_statements=self.sentencias_cacheadas)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute(f"PRAGMA synchronous={self.sincronizacion}")
+            self._local.conexion = conexion
+            with self._conexiones_lock:
+                self._conexiones.append(conexion)
+        return conexion
+
+    async def _ejecutar(self, funcion, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, funcion, *args)
+
+    # ----- Ciclo de vida
+
+    async def iniciar(self, productos_iniciales: Semilla = ()):
+        await self._ejecutar(self._crear_esquema, productos_iniciales)
+
+    def _crear_esquema(self, productos_iniciales: Semilla):
+        conexion = self._conexion()
+        conexion.executescript(ESQUEMA)
+        # BEGIN IMMEDIATE: si dos instancias arrancan a la vez, solo una siembra el catálogo
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            if conexion.execute("SELECT 1 FROM catalogo_meta WHERE clave = 'sembrado'").fetchone() is None:
+                conexion.executemany(
+                    f"INSERT INTO productos ({_SELECT}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(p.id, p.nombre, p.categoria, p.precio, int(p.disponible), p.stock, p.descripcion,
+                      p.fecha_agregado.isoformat()) for p in _resolver_semilla(productos_iniciales)],
+                )
+                conexion.execute("INSERT INTO catalogo_meta (clave, valor) VALUES ('sembrado', ?)",
+                                 (datetime.now().isoformat(),))
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+
+    async def cerrar(self):
+        self._executor.shutdown(wait=True)
+        with self._conexiones_lock:
+            for conexion in self._conexiones:
+                conexion.close()
+            self._conexiones.clear()
+
+    # ----- Consultas
+
+    async def obtener(self, producto_id: int) -> Optional[Product]:
+        fila = await self._ejecutar(self._una, SQL_OBTENER, (producto_id,))
+        return _fila_a_producto(fila) if fila else None
+
+    async def listar(self) -> List[Product]:
+        filas = await self._ejecutar(self._todas, SQL_LISTAR, ())
+        return [_fila_a_producto(fila) for fila in filas]
+
+    async def listar_pagina(self, despues_de: int = 0, limite: int = 100) -> List[Product]:
+        # Cursor por clave primaria: cada página es un rango del índice, sin OFFSET
+        filas = await self._ejecutar(self._todas, SQL_PAGINA, (despues_de, limite))
+        return [_fila_a_producto(fila) for fila in filas]
+
+    async def estadisticas(self) -> Dict[str, Any]:
+        total, disponibles, promedio = await self._ejecutar(self._una, SQL_TOTALES, ())
+        categorias = await self._ejecutar(self._todas, SQL_POR_CATEGORIA, ())
+        return {
+            "total": total,
+            "disponibles": disponibles,
+            "por_categoria": dict(categorias),
+            "precio_promedio": promedio,
+        }
+
+    def _una(self, sql: str, parametros):
+        return self._conexion().execute(sql, parametros).fetchone()
+
+    def _todas(self, sql: str, parametros):
+        return self._conexion().execute(sql, parametros).fetchall()
+
+    # ----- Mutaciones
+
+    async def crear(self, datos: Dict[str, Any]) -> Product:
+        campos = {c: datos[c] for c in COLUMNAS_EDITABLES if c in datos}
+        campos["disponible"] = int(campos.get("disponible", True))
+        campos["fecha_agregado"] = datetime.now().isoformat()
+        columnas = ", ".join(campos)
+        sql = (f"INSERT INTO productos ({columnas}) VALUES ({', '.join('?' * len(campos))}) "
+               f"RETURNING {_SELECT}")
+        return _fila_a_producto(await self._ejecutar(self._escribir, sql, tuple(campos.values())))
+
+    async def actualizar(self, producto_id: int, cambios: Dict[str, Any]) -> Optional[Product]:
+        campos = {c: v for c, v in cambios.items() if c in COLUMNAS_EDITABLES}
+        if "disponible" in campos:
+            campos["disponible"] = int(campos["disponible"])
+        if not campos:
+            return await self.obtener(producto_id)
+        asignaciones = ", ".join(f"{c} = ?" for c in campos)
+        sql = f"UPDATE productos SET {asignaciones} WHERE id = ? RETURNING {_SELECT}"
+        fila = await self._ejecutar(self._escribir, sql, (*campos.values(), producto_id))
+        return _fila_a_producto(fila) if fila else None
+
+    async def eliminar(self, producto_id: int) -> Optional[Product]:
+        fila = await self._ejecutar(self._escribir, SQL_ELIMINAR, (producto_id,))
+        return _fila_a_producto(fila) if fila else None
+
+    def _escribir(self, sql: str, parametros):
+        # fetchall() termina la sentencia: con autocommit, ahí se confirma la transacción
+        filas = self._conexion().execute(sql, parametros).fetchall()
+        return filas[0] if filas else None
+
+    async def descontar_stock(self, producto_id: int, cantidad: int) -> ResultadoDescuento:
+        try:
+            resultado = await self._ejecutar(self._descontar, producto_id, cantidad)
+        except (ProductoNoDisponibleError, StockInsuficienteError):
+            self.rechazos += 1
+            raise
+        self.descuentos += 1
+        return resultado
+
+    def _descontar(self, producto_id: int, cantidad: int) -> ResultadoDescuento:
+        conexion = self._conexion()
+        filas = conexion.execute(SQL_DESCONTAR, {"id": producto_id, "cantidad": cantidad}).fetchall()
+        if filas:
+            stock, disponible = filas[0]
+            return ResultadoDescuento(producto_id, cantidad, stock, bool(disponible))
+
+        # No se descontó nada: averiguar por qué (lectura posterior, solo para el mensaje)
+        fila = conexion.execute(SQL_ESTADO_STOCK, (producto_id,)).fetchone()
+        if fila is None:
+            raise KeyError(producto_id)
+        stock, disponible = fila
+        if not disponible:
+            raise ProductoNoDisponibleError(producto_id)
+        raise StockInsuficienteError(producto_id, stock, cantidad)
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "ruta": self.ruta,
+            "conexiones": len(self._conexiones),
+            "sincronizacion": self.sincronizacion,
+            "descuentos": self.descuentos,
+            "rechazos": self.rechazos,
+        }
@@ -0,0 +1,409 @@
+"""
+Motor de reintentos para EcoMarket
+Reemplaza los `time.sleep()` de los modos REINTENTOS_SIMPLES,
+BACKOFF_EXPONENCIAL y REINTENTOS_SOFISTICADOS por `asyncio.sleep()`:
+una compra esperando su próximo intento ya no congela el worker, así que
+cientos de compras pueden estar en backoff al mismo tiempo.
+
+Políticas (cuánto esperar ANTES de cada intento):
+1. FixedDelayPolicy       -> 0, 1, 1, 1...          (Reintentos Simples)
+2. ExponentialBackoffPolicy -> 0, 0.5, 1, 2... con tope (Backoff Exponencial)
+3. ScheduledDelayPolicy   -> 1, 2, 4, 8, 16         (Reintentos Sofisticados)
+
+Cada política declara además:
+- jitter: "ninguno", "completo" (uniforme entre 0 y la espera nominal) o
+  "decorrelacionado" (uniforme entre la espera base y 3x la espera anterior)
+- plazo_total: segundos máximos por petición, contando esperas e intentos
+- reintentables / no_reintentables: qué errores vale la pena reintentar
+- presupuesto: RetryBudget compartido que limita los reintentos a un
+  porcentaje del tráfico, para no multiplicar la carga de un servicio caído
+
+`construir_politica()` arma una política desde un dict declarativo.
+"""
+
+import asyncio
+import inspect
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+JITTER_NINGUNO = "ninguno"
+JITTER_COMPLETO = "completo"
+JITTER_DECORRELACIONADO = "decorrelacionado"
+
+# Errores de programación o de datos: reintentar no los arregla
+NO_REINTENTABLES_POR_DEFECTO: Tuple[Type[BaseException], ...] = (ValueError, TypeError, KeyError, PermissionError)
+
+# Motivos de finalización de una ejecución
+MOTIVO_EXITO = "exito"
+MOTIVO_AGOTADO = "agotado"
+MOTIVO_PLAZO = "plazo"
+MOTIVO_PRESUPUESTO = "presupuesto"
+MOTIVO_NO_REINTENTABLE = "no_reintentable"
+
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos (token bucket) compartido por la instancia
+
+    Cada petición nueva deposita `proporcion` tokens y cada reintento retira
+    uno, así que en régimen los reintentos no superan `proporcion` del tráfico.
+    `minimo_por_segundo` recarga el balde con poco tráfico para que las
+    peticiones aisladas también puedan reintentar. Es thread-safe: se
+    puede compartir entre el event loop y hilos de trabajo.
+    """
+
+    def __init__(self, proporcion: float = 0.2, minimo_por_segundo: float = 10.0,
+                 capacidad: float = 10.0, reloj: Callable[[], float] = time.monotonic):
+        self.proporcion = proporcion
+        self.minimo_por_segundo = minimo_por_segundo
+        self.capacidad = capacidad
+        self._reloj = reloj
+        self._tokens = capacidad
+        self._ultima_recarga = reloj()
+        self._lock = threading.Lock()
+        self.peticiones = 0
+        self.reintentos_permitidos = 0
+        self.reintentos_denegados = 0
+
+    def _recargar(self):
+        ahora = self._reloj()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultima_recarga) * self.minimo_por_segundo)
+        self._ultima_recarga = ahora
+
+    def registrar_peticion(self):
+        """Una petición nueva (primer intento) aporta `proporcion` tokens"""
+        with self._lock:
+            self.peticiones += 1
+            self._recargar()
+            self._tokens = min(self.capacidad, self._tokens + self.proporcion)
+
+    def intentar_retirar(self) -> bool:
+        """Retira un token para un reintento; False si el presupuesto está agotado"""
+        with self._lock:
+            self._recargar()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self.reintentos_permitidos += 1
+                return True
+            self.reintentos_denegados += 1
+            return False
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            self._recargar()
+            return {
+                "proporcion": self.proporcion,
+                "minimo_por_segundo": self.minimo_por_segundo,
+                "capacidad": self.capacidad,
+                "tokens": round(self._tokens, 2),
+                "peticiones": self.peticiones,
+                "reintentos_permitidos": self.reintentos_permitidos,
+                "reintentos_denegados": self.reintentos_denegados,
+            }
+
+
+# Presupuesto compartido por todo el proceso (compras de main.py y publicadores)
+PRESUPUESTO_INSTANCIA = RetryBudget(
+    proporcion=float(os.getenv("ECOMARKET_RETRY_PRESUPUESTO", "0.2")),
+    minimo_por_segundo=float(os.getenv("ECOMARKET_RETRY_MINIMO_SEG", "10")),
+    capacidad=float(os.getenv("ECOMARKET_RETRY_CAPACIDAD", "10")),
+)
+
+
+class MetricasPolitica:
+    """
+    Intentos, motivos de finalización y latencia de las últimas N ejecuciones,
+    más cuántas ejecuciones están en backoff ahora y el pico
+    """
+
+    def __init__(self, ventana: int = 1000):
+        self.ejecuciones = 0
+        self.intentos = 0
+        self.motivos: Dict[str, int] = {}
+        self.en_espera = 0
+        self.max_en_espera = 0
+        self._latencias_ms = deque(maxlen=ventana)
+        self._lock = threading.Lock()
+
+    def entrar_espera(self):
+        with self._lock:
+            self.en_espera += 1
+            self.max_en_espera = max(self.max_en_espera, self.en_espera)
+
+    def salir_espera(self):
+        with self._lock:
+            self.en_espera -= 1
+
+    def registrar(self, intentos: int, motivo: str, latencia_ms: float):
+        with self._lock:
+            self.ejecuciones += 1
+            self.intentos += intentos
+            self.motivos[motivo] = self.motivos.get(motivo, 0) + 1
+            self._latencias_ms.append(latencia_ms)
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            latencias = sorted(self._latencias_ms)
+            motivos = dict(self.motivos)
+
+        def percentil(p):
+            return round(latencias[min(len(latencias) - 1, int(p * len(latencias)))], 3) if latencias else 0.0
+
+        return {
+            "ejecuciones": self.ejecuciones,
+            "intentos": self.intentos,
+            "intentos_promedio": round(self.intentos / self.ejecuciones, 2) if self.ejecuciones else 0.0,
+            "motivos": motivos,
+            "en_espera": self.en_espera,
+            "max_en_espera": self.max_en_espera,
+            "latencia_ms": {"p50": percentil(0.50), "p99": percentil(0.99), "max": percentil(1.0)},
+        }
+
+
+class RetryPolicy:
+    """Política base: intentos, espera antes de cada uno, jitter, plazo y clasificación de errores"""
+
+    nombre = "base"
+
+    def __init__(self, max_intentos: int, nombre: Optional[str] = None, jitter: str = JITTER_NINGUNO,
+                 plazo_total: Optional[float] = None,
+                 reintentables: Tuple[Type[BaseException], ...] = (Exception,),
+                 no_reintentables: Tuple[Type[BaseException], ...] = NO_REINTENTABLES_POR_DEFECTO,
+                 presupuesto: Optional[RetryBudget] = None, rng: Optional[random.Random] = None):
+        if jitter not in (JITTER_NINGUNO, JITTER_COMPLETO, JITTER_DECORRELACIONADO):
+            raise ValueError(f"Jitter desconocido: {jitter}")
+        self.max_intentos = max_intentos
+        if nombre:
+            self.nombre = nombre
+        self.jitter = jitter
+        self.plazo_total = plazo_total
+        self.reintentables = tuple(reintentables)
+        self.no_reintentables = tuple(no_reintentables)
+        self.presupuesto = presupuesto
+        self.rng = rng or random.Random()
+        self.metricas = MetricasPolitica()
+
+    def espera_antes(self, intento: int) -> float:
+        """Segundos nominales a esperar antes del intento `intento` (1..max_intentos)"""
+        raise NotImplementedError
+
+    @property
+    def espera_base(self) -> float:
+        """Menor espera nominal distinta de cero (piso del jitter decorrelacionado)"""
+        esperas = [e for e in (self.espera_antes(i) for i in range(1, self.max_intentos + 1)) if e > 0]
+        return min(esperas) if esperas else 0.0
+
+    @property
+    def espera_maxima(self) -> float:
+        return max((self.espera_antes(i) for i in range(1, self.max_intentos + 1)), default=0.0)
+
+    def calcular_espera(self, intento: int, espera_previa: float) -> float:
+        """Espera real antes del intento, aplicando el jitter declarado"""
+        nominal = self.espera_antes(intento)
+        if nominal <= 0 or self.jitter == JITTER_NINGUNO:
+            return nominal
+        if self.jitter == JITTER_COMPLETO:
+            return self.rng.uniform(0, nominal)
+        base = self.espera_base
+        return min(self.espera_maxima, self.rng.uniform(base, max(base, espera_previa * 3)))
+
+    def es_reintentable(self, error: BaseException) -> bool:
+        return isinstance(error, self.reintentables) and not isinstance(error, self.no_reintentables)
+
+
+class FixedDelayPolicy(RetryPolicy):
+    """Espera fija entre intentos; el primero es inmediato"""
+
+    nombre = "fijo"
+
+    def __init__(self, max_intentos: int = 4, espera: float = 1.0, **opciones):
+        super().__init__(max_intentos, **opciones)
+        self.espera = espera
+
+    def espera_antes(self, intento: int) -> float:
+        return 0.0 if intento == 1 else self.espera
+
+
+class ExponentialBackoffPolicy(RetryPolicy):
+    """Espera base * factor^(n-1) con tope; el primer intento es inmediato"""
+
+    nombre = "exponencial"
+
+    def __init__(self, max_intentos: int = 5, base: float = 0.5, factor: float = 2.0, maximo: float = 2.0,
+                 **opciones):
+        super().__init__(max_intentos, **opciones)
+        self.base = base
+        self.factor = factor
+        self.maximo = maximo
+
+    def espera_antes(self, intento: int) -> float:
+        if intento == 1:
+            return 0.0
+        return min(self.base * (self.factor ** (intento - 2)), self.maximo)
+
+
+class ScheduledDelayPolicy(RetryPolicy):
+    """Tabla explícita de esperas, aplicada también antes del primer intento"""
+
+    nombre = "programado"
+
+    def __init__(self, esperas: Sequence[float] = (1, 2, 4, 8, 16), **opciones):
+        self.esperas = list(esperas)
+        super().__init__(len(self.esperas), **opciones)
+
+    def espera_antes(self, intento: int) -> float:
+        return self.esperas[intento - 1]
+
+
+TIPOS_POLITICA = {
+    "fijo": FixedDelayPolicy,
+    "exponencial": ExponentialBackoffPolicy,
+    "programado": ScheduledDelayPolicy,
+}
+
+
+def construir_politica(nombre: str, especificacion: Dict[str, Any],
+                       presupuesto: Optional[RetryBudget] = None) -> RetryPolicy:
+    """
+    Crea una política desde un dict declarativo, por ejemplo:
+    {"tipo": "exponencial", "max_intentos": 5, "base": 0.5, "maximo": 2,
+     "jitter": "completo", "plazo_total": 8}
+    """
+    opciones = dict(especificacion)
+    tipo = opciones.pop("tipo")
+    if tipo not in TIPOS_POLITICA:
+        raise ValueError(f"Tipo de política desconocido: {tipo}")
+    return TIPOS_POLITICA[tipo](nombre=nombre, presupuesto=presupuesto, **opciones)
+
+
+@dataclass
+class ResultadoReintento:
+    """Resultado de una ejecución con reintentos"""
+    exito: bool
+    intento: int
+    valor: Any = None
+    errores: List[str] = field(default_factory=list)
+    tiempos_espera: List[float] = field(default_factory=list)
+    motivo: str = MOTIVO_AGOTADO
+    ultimo_error: Optional[BaseException] = None
+
+    @property
+    def tiempo_total_esperas(self) -> float:
+        return sum(self.tiempos_espera)
+
+
+Operacion = Callable[[int], Union[Any, Awaitable[Any]]]
+DescriptorError = Callable[[int, Exception, float], str]
+
+
+class _Ejecucion:
+    """Estado de una ejecución de `ejecutar_con_reintentos()`: esperas, presupuesto, plazo y resultado"""
+
+    def __init__(self, politica: RetryPolicy, describir_error: Optional[DescriptorError],
+                 reloj: Callable[[], float]):
+        self.politica = politica
+        self.describir_error = describir_error
+        self.reloj = reloj
+        self.inicio = reloj()
+        self.resultado = ResultadoReintento(exito=False, intento=0)
+        self.espera_previa = 0.0
+        if politica.presupuesto:
+            politica.presupuesto.registrar_peticion()
+
+    def restante(self) -> Optional[float]:
+        if self.politica.plazo_total is None:
+            return None
+        return self.politica.plazo_total - (self.reloj() - self.inicio)
+
+    def espera_para(self, intento: int) -> Optional[float]:
+        """Espera antes del intento, o None si el plazo o el presupuesto lo impiden"""
+        espera = self.politica.calcular_espera(intento, self.espera_previa)
+        restante = self.restante()
+        if restante is not None and espera >= restante:
+            self.resultado.motivo = MOTIVO_PLAZO
+            return None
+        if intento > 1 and self.politica.presupuesto and not self.politica.presupuesto.intentar_retirar():
+            self.resultado.motivo = MOTIVO_PRESUPUESTO
+            return None
+        if espera > 0:
+            self.resultado.tiempos_espera.append(espera)
+            self.espera_previa = espera
+        return espera
+
+    def fallo(self, intento: int, error: Exception, espera: float) -> bool:
+        """Registra el error; True si vale la pena otro intento"""
+        self.resultado.intento = intento
+        self.resultado.ultimo_error = error
+        texto = self.describir_error(intento, error, espera) if self.describir_error else f"Intento {intento}: {error}"
+        self.resultado.errores.append(texto)
+        if not self.politica.es_reintentable(error):
+            self.resultado.motivo = MOTIVO_NO_REINTENTABLE
+            return False
+        self.resultado.motivo = MOTIVO_AGOTADO
+        return True
+
+    def exito(self, intento: int, valor: Any):
+        self.resultado.intento = intento
+        self.resultado.exito = True
+        self.resultado.valor = valor
+        self.resultado.motivo = MOTIVO_EXITO
+
+    def terminar(self) -> ResultadoReintento:
+        latencia_ms = (self.reloj() - self.inicio) * 1000
+        self.politica.metricas.registrar(self.resultado.intento, self.resultado.motivo, latencia_ms)
+        return self.resultado
+
+
+async def ejecutar_con_reintentos(
+    operacion: Operacion,
+    politica: RetryPolicy,
+    describir_error: Optional[DescriptorError] = None,
+    dormir: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    reloj: Callable[[], float] = time.monotonic,
+) -> ResultadoReintento:
+    """
+    Ejecuta `operacion(intento)` hasta que no lance excepción, se agoten los
+    intentos, venza el plazo total, se acabe el presupuesto o el error no sea reintentable
+
+    Args:
+        operacion: función (síncrona o async) que recibe el número de intento
+        politica: cuánto esperar antes de cada intento y cuándo rendirse
+        describir_error: (intento, error, espera) -> texto para la lista de errores
+        dormir: espera no bloqueante (inyectable para pruebas)
+        reloj: reloj monotónico para el plazo total y la latencia (inyectable para pruebas)
+    """
+    ejecucion = _Ejecucion(politica, describir_error, reloj)
+    for intento in range(1, politica.max_intentos + 1):
+        espera = ejecucion.espera_para(intento)
+        if espera is None:
+            break
+        if espera > 0:
+            politica.metricas.entrar_espera()
+            try:
+                await dormir(espera)
+            finally:
+                politica.metricas.salir_espera()
+
+        restante = ejecucion.restante()
+        try:
+            valor = operacion(intento)
+            if inspect.isawaitable(valor):
+                # Las operaciones async se cortan al vencer el plazo total
+                valor = await (asyncio.wait_for(valor, restante) if restante is not None else valor)
+        except Exception as e:
+            if not ejecucion.fallo(intento, e, espera):
+                break
+            if restante is not None and ejecucion.restante() <= 0:
+                ejecucion.resultado.motivo = MOTIVO_PLAZO
+                break
+            continue
+
+        ejecucion.exito(intento, valor)
+        break
+
+    return ejecucion.terminar()
@@ -0,0 +1,522 @@
+"""
+Consultas distribuidas (scatter-gather) sobre los shards de shard_router
+demo_3_consulta_agregada consultaba los shards uno tras otro, traía todas
+las filas a Python y las ordenaba juntas: una lectura entre shards costaba
+la suma de las latencias más un sort completo en memoria.
+ScatterGatherExecutor:
+
+1. Lanza la consulta en todos los shards a la vez (una tarea por shard;
+   los drivers síncronos corren en un hilo por consulta)
+2. Entrega las filas en streaming a medida que llegan, con una cola
+   acotada por shard (backpressure: un shard rápido no llena la memoria)
+3. Con ORDER BY, cada shard ya devuelve sus filas ordenadas y se hace un
+   merge de k vías (heap de un elemento por shard) en vez de un sort
+4. Empuja ORDER BY y LIMIT (offset + limit) a cada shard, y COUNT/SUM/
+   MIN/MAX/AVG como agregados parciales (AVG = SUM y COUNT por shard)
+5. Timeout por shard: tiempo máximo de espera por cada fila de ese shard.
+   Si un shard falla o vence, la política decide: "fallar" (error) o
+   "parcial" (sigue con el resto y lo informa en `fallidos`), con un
+   mínimo opcional de shards que deben responder completos
+
+Con un router, `shard_keys` limita la consulta a los shards dueños de esas keys
+y, con un RangeShardRouter, `shard_range` (desde, hasta) a los shards que
+cubren ese intervalo.
+"""
+
+import asyncio
+import heapq
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+FALLAR = "fallar"
+PARCIAL = "parcial"
+
+FUNCIONES_AGREGADAS = ("COUNT", "SUM", "MIN", "MAX", "AVG")
+_IDENTIFICADOR = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+
+
+class ResultadoParcialError(Exception):
+    """Uno o más shards fallaron o vencieron y la política no admite resultados parciales"""
+
+    def __init__(self, fallidos: Dict[int, str]):
+        detalle = ", ".join(f"shard {shard_id}: {motivo}" for shard_id, motivo in fallidos.items())
+        super().__init__(f"Consulta distribuida incompleta ({detalle})")
+        self.fallidos = fallidos
+
+
+def _identificador(nombre: str) -> str:
+    """Solo nombres simples (o tabla.columna): el resto del SQL se arma con ellos"""
+    if nombre != "*" and not _IDENTIFICADOR.match(nombre):
+        raise ValueError(f"Identificador SQL inválido: {nombre!r}")
+    return nombre
+
+
+# ===========================================
+# Fuentes: cómo se consulta cada shard
+# ===========================================
+
+class FuenteShard:
+    """Un shard consultable: filas(sql, params) entrega filas tipo mapping (fila["columna"])"""
+
+    def filas(self, sql: str, params: Sequence[Any] = ()) -> AsyncIterator[Any]:
+        raise NotImplementedError
+
+
+class AsyncpgShard(FuenteShard):
+    """Shard sobre un pool de asyncpg: cursor de servidor dentro de una transacción de solo lectura"""
+
+    def __init__(self, pool, prefetch: int = 500):
+        self.pool = pool
+        self.prefetch = prefetch
+
+    async def filas(self, sql: str, params: Sequence[Any] = ()):
+        async with self.pool.acquire() as conexion:
+            async with conexion.transaction(readonly=True):
+                async for registro in conexion.cursor(sql, *params, prefetch=self.prefetch):
+                    yield registro  # asyncpg.Record admite registro["columna"]
+
+
+class DBAPIShard(FuenteShard):
+    """
+    Shard sobre un driver DB-API síncrono (psycopg2, sqlite3...)
+
+    Conectar, ejecutar y cada fetchmany corren en un hilo propio de la
+    consulta, así que varios shards avanzan en paralelo sin bloquear el
+    event loop, y la conexión nunca se usa desde dos hilos a la vez.
+    """
+
+    def __init__(self, conectar: Callable[[], Any], tamano_lote: int = 500):
+        self.conectar = conectar
+        self.tamano_lote = tamano_lote
+
+    async def filas(self, sql: str, params: Sequence[Any] = ()):
+        loop = asyncio.get_running_loop()
+        hilo = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard")
+        conexion = None
+        try:
+            conexion = await loop.run_in_executor(hilo, self.conectar)
+            cursor = conexion.cursor()
+            await loop.run_in_executor(hilo, cursor.execute, sql, tuple(params))
+            columnas = [descripcion[0] for descripcion in cursor.description]
+            while True:
+                lote = await loop.run_in_executor(hilo, cursor.fetchmany, self.tamano_lote)
+                if not lote:
+                    break
+                for fila in lote:
+                    yield dict(zip(columnas, fila))
+        finally:
+            # Sin esperar: si el shard venció, el close queda en cola detrás de la
+            # consulta que sigue corriendo en ese hilo y no bloquea el event loop
+            if conexion is not None:
+                hilo.submit(conexion.close)
+            hilo.shutdown(wait=False)
+
+
+# ===========================================
+# Consultas
+# ===========================================
+
+@dataclass
+class ConsultaDistribuida:
+    """
+    SELECT que se ejecuta igual en cada shard
+
+    where usa el estilo de parámetros del driver ($1 en asyncpg, %s en
+    psycopg2, ? en sqlite3). order_by acepta "columna", "columna DESC" o
+    ("columna", "DESC"); cada shard recibe LIMIT offset + limit y el
+    offset se aplica una sola vez, sobre el resultado combinado.
+
+    Con agregados (alias -> (función, columna)) cada shard devuelve solo
+    los agregados parciales de cada grupo de group_by.
+    """
+    tabla: str
+    columnas: Sequence[str] = ("*",)
+    where: str = ""
+    params: Sequence[Any] = ()
+    order_by: Sequence[Union[str, Tuple[str, str]]] = ()
+    limit: Optional[int] = None
+    offset: int = 0
+    agregados: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    group_by: Sequence[str] = ()
+
+    def orden(self) -> List[Tuple[str, bool]]:
+        """[(columna, descendente)] normalizado"""
+        resultado = []
+        for criterio in self.order_by:
+            columna, _, direccion = criterio.partition(" ") if isinstance(criterio, str) else criterio
+            direccion = (direccion or "ASC").strip().upper()
+            if direccion not in ("ASC", "DESC"):
+                raise ValueError(f"Dirección de orden inválida: {direccion!r}")
+            resultado.append((_identificador(columna.strip()), direccion == "DESC"))
+        return resultado
+
+    def _columnas_parciales(self) -> List[str]:
+        """SELECT de los agregados parciales: AVG viaja como SUM y COUNT"""
+        columnas = [_identificador(c) for c in self.group_by]
+        for alias, (funcion, columna) in self.agregados.items():
+            funcion, alias, columna = funcion.upper(), _identificador(alias), _identificador(columna)
+            if funcion not in FUNCIONES_AGREGADAS:
+                raise ValueError(f"Función agregada no soportada: {funcion!r}")
+            if funcion == "AVG":
+                columnas += [f"SUM({columna}) AS {alias}__suma", f"COUNT({columna}) AS {alias}__cuenta"]
+            else:
+                columnas.append(f"{funcion}({columna}) AS {alias}")
+        return columnas
+
+    def sql_shard(self) -> str:
+        """El SQL que recibe cada shard (con ORDER BY, LIMIT o agregados parciales)"""
+        orden = self.orden()
+        if self.agregados:
+            if orden or self.limit is not None:
+                raise ValueError("ORDER BY/LIMIT no se combinan con agregados parciales")
+            columnas = self._columnas_parciales()
+        else:
+            columnas = [_identificador(c) for c in self.columnas]
+            faltantes = [c for c, _ in orden if "*" not in columnas and c not in columnas]
+            if faltantes:
+                raise ValueError(f"Las columnas de ORDER BY deben estar en el SELECT: {faltantes}")
+
+        sql = f"SELECT {', '.join(columnas)} FROM {_identificador(self.tabla)}"
+        if self.where:
+            sql += f" WHERE {self.where}"
+        if self.group_by:
+            sql += " GROUP BY " + ", ".join(_identificador(c) for c in self.group_by)
+        if orden:
+            # NULLS explícito: el merge asume el orden de Postgres aunque el shard sea otro motor
+            sql += " ORDER BY " + ", ".join(f"{c} DESC NULLS FIRST" if d else f"{c} ASC NULLS LAST"
+                                            for c, d in orden)
+        if self.limit is not None:
+            sql += f" LIMIT {int(self.limit) + int(self.offset)}"
+        return sql
+
+
+@dataclass
+class ResultadoDistribuido:
+    """Filas combinadas y cómo respondió cada shard"""
+    filas: List[Any]
+    por_shard: Dict[int, int]  # Filas recibidas de cada shard
+    fallidos: Dict[int, str]
+    parciales: Dict[int, List[Any]] = field(default_factory=dict)  # Agregados parciales por shard
+    duracion_s: float = 0.0
+
+    @property
+    def completo(self) -> bool:
+        return not self.fallidos
+
+
+class _ClaveOrden:
+    """Compara filas según [(columna, descendente)]; NULL es el mayor valor, como en Postgres"""
+
+    __slots__ = ("valores", "orden")
+
+    def __init__(self, fila, orden: List[Tuple[str, bool]]):
+        self.valores = [(fila[columna] is None, fila[columna]) for columna, _ in orden]
+        self.orden = orden
+
+    def __lt__(self, otra: "_ClaveOrden") -> bool:
+        for (nulo_a, a), (nulo_b, b), (_, descendente) in zip(self.valores, otra.valores, self.orden):
+            if nulo_a != nulo_b:
+                return nulo_b != descendente  # ASC: NULL al final; DESC: NULL primero
+            if nulo_a or a == b:
+                continue
+            return (a > b) if descendente else (a < b)
+        return False
+
+
+_FIN = object()
+
+
+class _Falla:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+# ===========================================
+# Ejecutor
+# ===========================================
+
+class FlujoDistribuido:
+    """
+    Filas de una consulta distribuida en streaming (async for)
+
+    Con orden, las filas salen por merge de k vías; sin orden, en el orden
+    en que llegan. Al terminar, `por_shard` y `fallidos` describen la
+    respuesta de cada shard. Con la política "parcial", las filas que un
+    shard ya entregó antes de fallar se conservan.
+    """
+
+    def __init__(self, ejecutor: "ScatterGatherExecutor", destinos: List[int], consulta: ConsultaDistribuida):
+        self.ejecutor = ejecutor
+        self.destinos = destinos
+        self.consulta = consulta
+        self.por_shard: Dict[int, int] = {shard_id: 0 for shard_id in destinos}
+        self.fallidos: Dict[int, str] = {}
+
+    def __aiter__(self):
+        return self._filas()
+
+    async def _filas(self):
+        async for _, fila in self._filas_con_shard():
+            yield fila
+
+    async def _filas_con_shard(self):
+        """(shard_id, fila) aplicando offset y limit sobre el resultado combinado"""
+        consulta = self.consulta
+        restantes = consulta.limit
+        saltar = consulta.offset
+        if restantes is not None and restantes <= 0:
+            return
+        fuente = self._merge() if consulta.orden() else self._llegada()
+        try:
+            async for shard_id, fila in fuente:
+                if saltar:
+                    saltar -= 1
+                    continue
+                yield shard_id, fila
+                if restantes is not None:
+                    restantes -= 1
+                    if restantes == 0:
+                        break  # Sin return: min_shards se verifica también al cortar por limit
+        finally:
+            await fuente.aclose()
+        self._verificar_minimo()
+
+    def _registrar_falla(self, shard_id: int, error: BaseException):
+        motivo = "timeout" if isinstance(error, asyncio.TimeoutError) else f"{type(error).__name__}: {error}"
+        self.fallidos[shard_id] = motivo
+        self.ejecutor.fallos[shard_id] = self.ejecutor.fallos.get(shard_id, 0) + 1
+        if self.ejecutor.politica == FALLAR:
+            raise ResultadoParcialError(dict(self.fallidos))
+
+    def _verificar_minimo(self):
+        minimo = self.ejecutor.min_shards
+        if minimo is not None and len(self.destinos) - len(self.fallidos) < minimo:
+            raise ResultadoParcialError(dict(self.fallidos))
+
+    async def _bombear(self, shard_id: int, sql: str, cola: asyncio.Queue, etiqueta: bool):
+        """Lee el shard hacia su cola; el timeout cubre cada espera de fila a la fuente"""
+        filas = self.ejecutor.fuentes[shard_id].filas(sql, self.consulta.params).__aiter__()
+        timeout = self.ejecutor.timeout_shard
+        try:
+            while True:
+                try:
+                    fila = await asyncio.wait_for(filas.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                await cola.put((shard_id, fila) if etiqueta else fila)
+            await cola.put((shard_id, _FIN) if etiqueta else _FIN)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # Incluye el TimeoutError del wait_for
+            await cola.put((shard_id, _Falla(e)) if etiqueta else _Falla(e))
+        finally:
+            cerrar = getattr(filas, "aclose", None)
+            if cerrar is not None:
+                try:
+                    await cerrar()
+                except Exception:
+                    pass
+
+    def _tareas(self, colas: Dict[int, asyncio.Queue], etiqueta: bool) -> List[asyncio.Task]:
+        sql = self.consulta.sql_shard()
+        return [asyncio.create_task(self._bombear(shard_id, sql, cola, etiqueta), name=f"shard-{shard_id}")
+                for shard_id, cola in colas.items()]
+
+    @staticmethod
+    async def _detener(tareas: List[asyncio.Task]):
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    async def _llegada(self):
+        """Sin ORDER BY: una cola compartida, las filas salen según llegan"""
+        cola = asyncio.Queue(maxsize=self.ejecutor.prefetch * max(len(self.destinos), 1))
+        tareas = self._tareas({shard_id: cola for shard_id in self.destinos}, etiqueta=True)
+        activos = len(self.destinos)
+        try:
+            while activos:
+                shard_id, fila = await cola.get()
+                if fila is _FIN:
+                    activos -= 1
+                elif isinstance(fila, _Falla):
+                    activos -= 1
+                    self._registrar_falla(shard_id, fila.error)
+                else:
+                    self.por_shard[shard_id] += 1
+                    yield shard_id, fila
+        finally:
+            await self._detener(tareas)
+
+    async def _merge(self):
+        """Con ORDER BY: merge de k vías sobre las colas de cada shard (ya ordenadas)"""
+        orden = self.consulta.orden()
+        colas = {shard_id: asyncio.Queue(maxsize=self.ejecutor.prefetch) for shard_id in self.destinos}
+        tareas = self._tareas(colas, etiqueta=False)
+
+        async def siguiente(shard_id: int):
+            while True:
+                fila = await colas[shard_id].get()
+                if fila is _FIN:
+                    return None
+                if isinstance(fila, _Falla):
+                    self._registrar_falla(shard_id, fila.error)
+                    return None
+                self.por_shard[shard_id] += 1
+                return fila
+
+        try:
+            heap = []
+            # Las consultas ya corren en paralelo: esperar las primeras filas en orden no suma latencias
+            for posicion, shard_id in enumerate(self.destinos):
+                fila = await siguiente(shard_id)
+                if fila is not None:
+                    heap.append((_ClaveOrden(fila, orden), posicion, shard_id, fila))
+            heapq.heapify(heap)
+            while heap:
+                _, posicion, shard_id, fila = heap[0]
+                yield shard_id, fila
+                proxima = await siguiente(shard_id)
+                if proxima is None:
+                    heapq.heappop(heap)
+                else:
+                    heapq.heapreplace(heap, (_ClaveOrden(proxima, orden), posicion, shard_id, proxima))
+        finally:
+            await self._detener(tareas)
+
+
+class ScatterGatherExecutor:
+    """
+    Ejecuta una consulta en todos los shards (o en los dueños de ciertas keys)
+
+    Args:
+        fuentes: shard_id -> FuenteShard (mismos ids que el router)
+        router: router de shard_router, para limitar la consulta con shard_keys
+            (o con shard_range si es un RangeShardRouter)
+        timeout_shard: segundos máximos de espera por cada fila de un shard
+        politica: "fallar" (ResultadoParcialError) o "parcial" (sigue sin el shard)
+        min_shards: con "parcial", shards que deben responder completos como mínimo
+        prefetch: filas que cada shard puede adelantar en su cola
+    """
+
+    def __init__(self, fuentes: Dict[int, FuenteShard], router=None, timeout_shard: float = 5.0,
+                 politica: str = FALLAR, min_shards: Optional[int] = None, prefetch: int = 256):
+        if politica not in (FALLAR, PARCIAL):
+            raise ValueError(f"Política desconocida: {politica!r} (usa '{FALLAR}' o '{PARCIAL}')")
+        self.fuentes = fuentes
+        self.router = router
+        self.timeout_shard = timeout_shard
+        self.politica = politica
+        self.min_shards = min_shards
+        self.prefetch = prefetch
+        self.consultas = 0
+        self.fallos: Dict[int, int] = {}
+
+    def _destinos(self, shard_keys: Optional[Sequence[str]] = None,
+                  shard_range: Optional[Tuple[Any, Any]] = None) -> List[int]:
+        if shard_keys is None and shard_range is None:
+            return list(self.fuentes)
+        if self.router is None:
+            raise ValueError("shard_keys y shard_range requieren un router")
+        destinos = set()
+        if shard_keys is not None:
+            destinos.update(self.router.get_shard_ids(shard_keys))
+        if shard_range is not None:
+            if not hasattr(self.router, "get_shard_ids_for_range"):
+                raise ValueError("shard_range requiere un router por rangos (RangeShardRouter)")
+            destinos.update(self.router.get_shard_ids_for_range(*shard_range))
+        return sorted(destinos)
+
+    def stream(self, consulta: ConsultaDistribuida, shard_keys: Optional[Sequence[str]] = None,
+               shard_range: Optional[Tuple[Any, Any]] = None) -> FlujoDistribuido:
+        """Filas en streaming: `async for fila in ejecutor.stream(consulta)`"""
+        self.consultas += 1
+        return FlujoDistribuido(self, self._destinos(shard_keys, shard_range), consulta)
+
+    async def consultar(self, consulta: ConsultaDistribuida, shard_keys: Optional[Sequence[str]] = None,
+                        shard_range: Optional[Tuple[Any, Any]] = None) -> ResultadoDistribuido:
+        """Como stream, pero junta todas las filas (ya con orden, offset y limit aplicados)"""
+        inicio = time.perf_counter()
+        flujo = self.stream(consulta, shard_keys, shard_range)
+        filas = [fila async for fila in flujo]
+        return ResultadoDistribuido(filas, flujo.por_shard, flujo.fallidos, duracion_s=time.perf_counter() - inicio)
+
+    async def agregar(self, tabla: str, agregados: Dict[str, Tuple[str, str]], where: str = "",
+                      params: Sequence[Any] = (), group_by: Sequence[str] = (),
+                      shard_keys: Optional[Sequence[str]] = None,
+                      shard_range: Optional[Tuple[Any, Any]] = None) -> ResultadoDistribuido:
+        """
+        Agregados globales a partir de agregados parciales de cada shard
+
+        agregados: alias -> (función, columna), p. ej. {"total": ("COUNT", "*"),
+        "precio_promedio": ("AVG", "precio")}. Cada shard devuelve una fila
+        por grupo (nunca las filas crudas); AVG se calcula como la suma de
+        los SUM sobre la suma de los COUNT, no como promedio de promedios.
+        """
+        inicio = time.perf_counter()
+        grupos = list(group_by)
+        consulta = ConsultaDistribuida(tabla, where=where, params=params, agregados=agregados, group_by=grupos)
+        consulta.sql_shard()  # Valida identificadores y funciones antes de lanzar nada
+
+        flujo = self.stream(consulta, shard_keys, shard_range)
+        parciales: Dict[int, List[Any]] = {shard_id: [] for shard_id in flujo.destinos}
+        combinados: Dict[tuple, Dict[str, Any]] = {}
+        async for shard_id, fila in flujo._filas_con_shard():
+            parciales[shard_id].append(fila)
+            grupo = tuple(fila[columna] for columna in grupos)
+            acumulado = combinados.setdefault(grupo, {})
+            for alias, (funcion, _) in agregados.items():
+                _combinar(acumulado, alias, funcion.upper(), fila)
+
+        filas = []
+        for grupo in sorted(combinados, key=lambda g: tuple((v is None, v) for v in g)):
+            fila = dict(zip(grupos, grupo))
+            for alias, (funcion, _) in agregados.items():
+                fila[alias] = _final(combinados[grupo], alias, funcion.upper())
+            filas.append(fila)
+        if not grupos and not filas:
+            filas.append({alias: _final({}, alias, funcion.upper()) for alias, (funcion, _) in agregados.items()})
+        return ResultadoDistribuido(filas, flujo.por_shard, flujo.fallidos, parciales,
+                                    duracion_s=time.perf_counter() - inicio)
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "shards": list(self.fuentes),
+            "consultas": self.consultas,
+            "fallos_por_shard": dict(self.fallos),
+            "timeout_shard_s": self.timeout_shard,
+            "politica": self.politica,
+        }
+
+
+def _combinar(acumulado: Dict[str, Any], alias: str, funcion: str, fila):
+    """Suma el agregado parcial de un shard al acumulado del grupo"""
+    if funcion == "AVG":
+        suma, cuenta = fila[f"{alias}__suma"], fila[f"{alias}__cuenta"]
+        if suma is not None:
+            acumulado[f"{alias}__suma"] = acumulado.get(f"{alias}__suma", 0) + suma
+        acumulado[f"{alias}__cuenta"] = acumulado.get(f"{alias}__cuenta", 0) + (cuenta or 0)
+        return
+    valor = fila[alias]
+    if valor is None:
+        return
+    actual = acumulado.get(alias)
+    if actual is None:
+        acumulado[alias] = valor
+    elif funcion in ("COUNT", "SUM"):
+        acumulado[alias] = actual + valor
+    elif funcion == "MIN":
+        acumulado[alias] = min(actual, valor)
+    else:
+        acumulado[alias] = max(actual, valor)
+
+
+def _final(acumulado: Dict[str, Any], alias: str, funcion: str):
+    if funcion == "AVG":
+        cuenta = acumulado.get(f"{alias}__cuenta", 0)
+        return acumulado[f"{alias}__suma"] / cuenta if cuenta else None
+    if funcion == "COUNT":
+        return acumulado.get(alias, 0)
+    return acumulado.get(alias)
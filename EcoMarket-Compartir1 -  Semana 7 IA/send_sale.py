@@ -2,63 +2,91 @@
 """
 Script para enviar notificaciones de ventas a RabbitMQ
 """
+import asyncio
 import pika
 import json
 from datetime import datetime
 import sys
 
+from amqp_async import AsyncAMQPPublisher
+from retry_engine import (
+    NO_REINTENTABLES_POR_DEFECTO,
+    PRESUPUESTO_INSTANCIA,
+    ExponentialBackoffPolicy,
+    ejecutar_con_reintentos,
+)
+
 RABBIT_HOST = 'localhost'
 RABBIT_PORT = 5672
 RABBIT_USER = 'user'
 RABBIT_PASS = 'pass'
 QUEUE_NAME = 'sale_notifications'
 
+# Reintentos con backoff y jitter, máximo 10 s por venta y presupuesto compartido del proceso
+POLITICA_NOTIFICACION = ExponentialBackoffPolicy(
+    max_intentos=3,
+    base=0.5,
+    maximo=2.0,
+    nombre="notificar_venta",
+    jitter="completo",
+    plazo_total=10,
+    no_reintentables=NO_REINTENTABLES_POR_DEFECTO + (
+        pika.exceptions.ProbableAuthenticationError,
+        pika.exceptions.ProbableAccessDeniedError,
+    ),
+    presupuesto=PRESUPUESTO_INSTANCIA,
+)
 
-def send_sale_notification(sale_data):
-    """Envía una notificación de venta a RabbitMQ"""
-    try:
-        # Configurar credenciales y parámetros de conexión
-        credentials = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
-        params = pika.ConnectionParameters(
-            host=RABBIT_HOST,
-            port=RABBIT_PORT,
-            credentials=credentials,
-            heartbeat=600
-        )
 
-        # Conectar a RabbitMQ
-        connection = pika.BlockingConnection(params)
-        channel = connection.channel()
+def _connection_params():
+    credentials = pika.PlainCredentials(RABBIT_USER, RABBIT_PASS)
+    return pika.ConnectionParameters(
+        host=RABBIT_HOST,
+        port=RABBIT_PORT,
+        credentials=credentials,
+        heartbeat=600
+    )
 
-        # Declarar la cola (durable para persistencia)
-        channel.queue_declare(queue=QUEUE_NAME, durable=True)
 
-        # Agregar timestamp si no existe
-        if 'timestamp' not in sale_data:
-            sale_data['timestamp'] = datetime.now().isoformat()
+async def send_sale_notification_async(sale_data, publicador):
+    """Envía una notificación de venta con un AsyncAMQPPublisher ya abierto (reintentos según POLITICA_NOTIFICACION)"""
+    # Agregar timestamp si no existe
+    if 'timestamp' not in sale_data:
+        sale_data['timestamp'] = datetime.now().isoformat()
+    message = json.dumps(sale_data)
 
-        # Publicar mensaje
-        message = json.dumps(sale_data)
-        channel.basic_publish(
-            exchange='',
-            routing_key=QUEUE_NAME,
-            body=message,
-            properties=pika.BasicProperties(
+    async def publicar(intento):
+        # La cola (durable) se declara una sola vez por canal del publicador
+        await publicador.publicar_en_cola(
+            QUEUE_NAME,
+            message,
+            pika.BasicProperties(
                 delivery_mode=2,  # Mensaje persistente
                 content_type='application/json'
             )
         )
 
+    def describir(intento, error, espera):
+        if isinstance(error, pika.exceptions.AMQPConnectionError):
+            print(f"❌ Error de conexión a RabbitMQ (intento {intento}): {error}")
+        else:
+            print(f"❌ Error inesperado (intento {intento}): {error}")
+        return f"Intento {intento}: {error}"
+
+    resultado = await ejecutar_con_reintentos(publicar, POLITICA_NOTIFICACION, describir)
+    if resultado.exito:
         print(f"✅ Venta enviada exitosamente: {sale_data}")
-        connection.close()
         return True
+    return False
+
+
+def send_sale_notification(sale_data):
+    """Envía una notificación de venta a RabbitMQ desde código síncrono (abre un publicador solo para ella)"""
+    async def con_publicador_propio():
+        async with AsyncAMQPPublisher(_connection_params()) as publicador:
+            return await send_sale_notification_async(sale_data, publicador)
 
-    except pika.exceptions.AMQPConnectionError as e:
-        print(f"❌ Error de conexión a RabbitMQ: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ Error inesperado: {e}")
-        return False
+    return asyncio.run(con_publicador_propio())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,395 @@
+"""
+Migración en línea de shards: backfill, doble escritura, verificación y cambio de ruteo
+ConsistentHashRouter.add_shard cambia el dueño de las keys en el acto, pero
+nadie mueve las filas existentes: las lecturas de las keys migradas fallan.
+MigracionShards mueve los datos antes de cambiar el ruteo:
+
+1. Backfill: recorre cada shard de origen por lotes (keyset sobre la
+   clave), se queda con las filas cuyo hash cae en un rango que cambia de
+   dueño (plan_rebalance) y las inserta en bloque (upsert) en el destino
+2. Doble escritura: desde que empieza la copia, toda escritura de una key
+   que se mueve va al dueño actual (autoritativo) y al nuevo. Backfill y
+   dobles escrituras comparten un lock por lote: una escritura nunca queda
+   pisada por un lote leído antes que ella
+3. Verificación: cantidad de filas y checksum (independiente del orden)
+   por rango en origen y destino; los rangos que no coinciden se vuelven a
+   copiar y se verifican de nuevo
+4. Cambio de ruteo atómico: bajo el mismo lock, el router vigente pasa a
+   ser el de la topología nueva; desde ahí lecturas y escrituras de esas
+   keys van al destino. limpiar() borra las copias viejas del origen
+
+Un Limitador (filas por segundo) reparte los lotes en el tiempo para no
+dejar sin recursos al tráfico normal. TablaShard sirve para cualquier
+driver DB-API (psycopg2, o sqlite3 en las pruebas).
+"""
+
+import asyncio
+import bisect
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from scatter_gather import _identificador
+from shard_router import ConsistentHashRouter, RangoRebalanceo, ShardConfig
+
+PLANIFICADA = "planificada"
+COPIANDO = "copiando"
+VERIFICANDO = "verificando"
+CAMBIADA = "cambiada"
+LIMPIA = "limpia"
+FALLIDA = "fallida"
+
+
+class MigracionError(Exception):
+    """La migración no puede avanzar (fase incorrecta o verificación sin éxito)"""
+
+
+class TablaShard:
+    """
+    La tabla migrada en un shard, sobre un driver DB-API
+
+    La conexión se abre y se usa siempre en el mismo hilo (un executor de
+    un solo worker), así que las operaciones se serializan por shard sin
+    bloquear el event loop. `marcador` es el placeholder del driver ("?"
+    en sqlite3, "%s" en psycopg2).
+    """
+
+    def __init__(self, conectar: Callable[[], Any], tabla: str, clave: str, columnas: Sequence[str],
+                 marcador: str = "?"):
+        self.conectar = conectar
+        self.tabla = _identificador(tabla)
+        self.clave = _identificador(clave)
+        self.columnas = [_identificador(c) for c in columnas]
+        if self.clave not in self.columnas:
+            raise ValueError(f"La clave {clave!r} debe estar entre las columnas")
+        self.marcador = marcador
+        self._hilo = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"tabla-{tabla}")
+        self._conexion = None
+
+        lista = ", ".join(self.columnas)
+        self._sql_select = f"SELECT {lista} FROM {tabla}"
+        self._sql_lote = f"{self._sql_select} WHERE {clave} > {marcador} ORDER BY {clave} LIMIT {marcador}"
+        self._sql_primer_lote = f"{self._sql_select} ORDER BY {clave} LIMIT {marcador}"
+        self._sql_obtener = f"{self._sql_select} WHERE {clave} = {marcador}"
+        actualizar = ", ".join(f"{c} = excluded.{c}" for c in self.columnas if c != clave) or f"{clave} = excluded.{clave}"
+        self._sql_upsert = (f"INSERT INTO {tabla} ({lista}) VALUES ({', '.join([marcador] * len(self.columnas))}) "
+                            f"ON CONFLICT ({clave}) DO UPDATE SET {actualizar}")
+        self._sql_eliminar = f"DELETE FROM {tabla} WHERE {clave} = {marcador}"
+
+    def _ejecutar(self, operacion: Callable, *args):
+        return asyncio.get_running_loop().run_in_executor(self._hilo, operacion, *args)
+
+    def _cursor(self):
+        if self._conexion is None:
+            self._conexion = self.conectar()
+        return self._conexion.cursor()
+
+    def _consultar(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        cursor = self._cursor()
+        cursor.execute(sql, params)
+        return [dict(zip(self.columnas, fila)) for fila in cursor.fetchall()]
+
+    def _modificar(self, sql: str, lote: List[tuple]):
+        cursor = self._cursor()
+        try:
+            cursor.executemany(sql, lote)
+            self._conexion.commit()
+        except Exception:
+            self._conexion.rollback()
+            raise
+
+    async def leer_lote(self, despues_de: Any, limite: int) -> List[Dict[str, Any]]:
+        """Hasta `limite` filas con clave > despues_de (None = desde el principio), en orden de clave"""
+        if despues_de is None:
+            return await self._ejecutar(self._consultar, self._sql_primer_lote, (limite,))
+        return await self._ejecutar(self._consultar, self._sql_lote, (despues_de, limite))
+
+    async def leer_intervalo(self, despues_de: Any, hasta: Any) -> List[Dict[str, Any]]:
+        """Filas con despues_de < clave <= hasta (extremos None = sin límite)"""
+        condiciones, params = [], []
+        if despues_de is not None:
+            condiciones.append(f"{self.clave} > {self.marcador}")
+            params.append(despues_de)
+        if hasta is not None:
+            condiciones.append(f"{self.clave} <= {self.marcador}")
+            params.append(hasta)
+        sql = self._sql_select
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        return await self._ejecutar(self._consultar, sql, tuple(params))
+
+    async def obtener(self, clave: Any) -> Optional[Dict[str, Any]]:
+        filas = await self._ejecutar(self._consultar, self._sql_obtener, (clave,))
+        return filas[0] if filas else None
+
+    async def escribir(self, filas: List[Dict[str, Any]]):
+        """Upsert en bloque (una transacción por lote)"""
+        if filas:
+            lote = [tuple(fila[c] for c in self.columnas) for fila in filas]
+            await self._ejecutar(self._modificar, self._sql_upsert, lote)
+
+    async def eliminar(self, claves: List[Any]):
+        if claves:
+            await self._ejecutar(self._modificar, self._sql_eliminar, [(clave,) for clave in claves])
+
+    async def cerrar(self):
+        if self._conexion is not None:
+            await self._ejecutar(self._conexion.close)
+            self._conexion = None
+        self._hilo.shutdown(wait=False)
+
+
+class Limitador:
+    """Token bucket de filas por segundo (None = sin límite)"""
+
+    def __init__(self, filas_por_segundo: Optional[float] = None, reloj: Callable[[], float] = time.monotonic):
+        self.filas_por_segundo = filas_por_segundo
+        self.reloj = reloj
+        self._disponible_en = reloj()
+        self.esperado_s = 0.0
+
+    async def esperar(self, filas: int):
+        if not self.filas_por_segundo:
+            await asyncio.sleep(0)  # Igual cede el event loop entre lotes
+            return
+        ahora = self.reloj()
+        espera = max(0.0, self._disponible_en - ahora)
+        self._disponible_en = max(ahora, self._disponible_en) + filas / self.filas_por_segundo
+        self.esperado_s += espera
+        await asyncio.sleep(espera)
+
+
+def _huella(fila: Dict[str, Any], columnas: Sequence[str]) -> int:
+    contenido = repr(tuple(fila[c] for c in columnas)).encode()
+    return int.from_bytes(hashlib.blake2b(contenido, digest_size=8).digest(), "big")
+
+
+class MigracionShards:
+    """
+    Lleva un ConsistentHashRouter de su topología actual a `nueva_topologia`
+
+    Args:
+        router: el router en uso (no se modifica; sigue rigiendo hasta el cambio)
+        nueva_topologia: lista completa de shards después de la migración
+        tablas: shard_id -> TablaShard, para todos los shards de ambas topologías
+        tamano_lote: filas leídas del origen por lote
+        filas_por_segundo: tope del backfill, la verificación y la limpieza
+        reintentos_verificacion: veces que se recopian los rangos con diferencias
+    """
+
+    def __init__(self, router: ConsistentHashRouter, nueva_topologia: List[ShardConfig],
+                 tablas: Dict[int, TablaShard], tamano_lote: int = 500,
+                 filas_por_segundo: Optional[float] = None, reintentos_verificacion: int = 2):
+        self.router = router  # El vigente: se reemplaza en el cambio de ruteo
+        self.router_anterior = router
+        self.router_nuevo = ConsistentHashRouter(nueva_topologia, router.vnodes_per_shard, router.hash_fn)
+        self.plan: List[RangoRebalanceo] = router.plan_rebalance(nueva_topologia)
+        self._inicios = [rango.inicio for rango in self.plan]
+        faltantes = ({r.origen for r in self.plan} | {r.destino for r in self.plan}) - set(tablas)
+        if faltantes:
+            raise ValueError(f"Faltan las tablas de los shards {sorted(faltantes)}")
+        self.tablas = tablas
+        self.clave = next(iter(tablas.values())).clave
+        self.tamano_lote = tamano_lote
+        self.limitador = Limitador(filas_por_segundo)
+        self.reintentos_verificacion = reintentos_verificacion
+        self.fase = PLANIFICADA
+        self._bloqueo = asyncio.Lock()
+        self.copiadas = 0
+        self.lotes = 0
+        self.escrituras_dobles = 0
+        self.fallos_doble_escritura = 0
+        self.recopias = 0
+        self.borradas_origen = 0
+        self.verificacion: Dict[int, Dict[str, Any]] = {}
+
+    # ----- Ruteo -----
+
+    def _rango(self, clave: Any) -> Optional[int]:
+        """Índice del rango del plan que contiene la key (None si no cambia de dueño)"""
+        hash_value = self.router._hash(str(clave))
+        indice = bisect.bisect_right(self._inicios, hash_value) - 1
+        if indice >= 0 and self.plan[indice].contiene(hash_value):
+            return indice
+        return None
+
+    def _en_migracion(self, clave: Any) -> Optional[RangoRebalanceo]:
+        if self.fase not in (COPIANDO, VERIFICANDO):
+            return None
+        indice = self._rango(clave)
+        return None if indice is None else self.plan[indice]
+
+    async def leer(self, clave: Any) -> Optional[Dict[str, Any]]:
+        """Lectura del tráfico normal: siempre al dueño según el router vigente"""
+        return await self.tablas[self.router.get_shard(str(clave)).shard_id].obtener(clave)
+
+    async def escribir(self, fila: Dict[str, Any]):
+        """Escritura del tráfico normal (upsert); doble escritura si la key se está moviendo"""
+        await self._modificar(fila[self.clave], lambda tabla: tabla.escribir([fila]))
+
+    async def eliminar(self, clave: Any):
+        await self._modificar(clave, lambda tabla: tabla.eliminar([clave]))
+
+    async def _modificar(self, clave: Any, operacion: Callable[[TablaShard], Any]):
+        if self._en_migracion(clave) is None:
+            await operacion(self.tablas[self.router.get_shard(str(clave)).shard_id])
+            return
+        async with self._bloqueo:
+            rango = self._en_migracion(clave)  # La fase pudo cambiar mientras se esperaba el lock
+            if rango is None:
+                await operacion(self.tablas[self.router.get_shard(str(clave)).shard_id])
+                return
+            await operacion(self.tablas[rango.origen])  # El origen sigue siendo autoritativo
+            try:
+                await operacion(self.tablas[rango.destino])
+                self.escrituras_dobles += 1
+            except Exception:
+                self.fallos_doble_escritura += 1  # La verificación detecta y recopia el rango
+
+    # ----- Fases -----
+
+    async def _recorrer_origenes(self, procesar: Callable, rangos: Optional[set] = None):
+        """
+        Recorre por lotes cada shard de origen (keyset sobre la clave)
+
+        procesar(origen, filas_del_lote_que_se_mueven, desde, hasta) corre
+        con el lock tomado; el limitador espera entre lotes, sin el lock.
+        """
+        origenes = sorted({rango.origen for i, rango in enumerate(self.plan) if rangos is None or i in rangos})
+        for origen in origenes:
+            tabla, cursor = self.tablas[origen], None
+            while True:
+                async with self._bloqueo:
+                    lote = await tabla.leer_lote(cursor, self.tamano_lote)
+                    hasta = lote[-1][tabla.clave] if len(lote) == self.tamano_lote else None
+                    moviles = []
+                    for fila in lote:
+                        indice = self._rango(fila[tabla.clave])
+                        if indice is not None and self.plan[indice].origen == origen \
+                                and (rangos is None or indice in rangos):
+                            moviles.append((indice, fila))
+                    await procesar(origen, moviles, cursor, hasta)
+                    self.lotes += 1
+                await self.limitador.esperar(len(lote))
+                if hasta is None:
+                    break
+                cursor = hasta
+
+    async def backfill(self, rangos: Optional[set] = None):
+        """Fase 1 y 2: activa la doble escritura y copia las filas que cambian de dueño"""
+        if self.fase not in (PLANIFICADA, COPIANDO, VERIFICANDO):
+            raise MigracionError(f"No se puede copiar en la fase {self.fase!r}")
+        self.fase = COPIANDO
+
+        async def copiar(origen, moviles, desde, hasta):
+            por_destino: Dict[int, List[Dict[str, Any]]] = {}
+            for indice, fila in moviles:
+                por_destino.setdefault(self.plan[indice].destino, []).append(fila)
+            for destino, filas in por_destino.items():
+                await self.tablas[destino].escribir(filas)
+                self.copiadas += len(filas)
+            if rangos is not None:
+                # Recopia: también sobran en el destino las keys que ya no están en el origen
+                await self._borrar_sobrantes(origen, moviles, desde, hasta, rangos)
+
+        await self._recorrer_origenes(copiar, rangos)
+
+    async def _borrar_sobrantes(self, origen, moviles, desde, hasta, rangos):
+        clave = self.tablas[origen].clave
+        presentes = {fila[clave] for _, fila in moviles}
+        for destino in {self.plan[i].destino for i in rangos if self.plan[i].origen == origen}:
+            sobrantes = []
+            for fila in await self.tablas[destino].leer_intervalo(desde, hasta):
+                indice = self._rango(fila[clave])
+                if fila[clave] not in presentes and indice in rangos and self.plan[indice].origen == origen:
+                    sobrantes.append(fila[clave])
+            await self.tablas[destino].eliminar(sobrantes)
+
+    async def verificar(self) -> Dict[int, Dict[str, Any]]:
+        """
+        Fase 3: filas y checksum por rango en origen y destino
+
+        Cada lote del origen se compara con el mismo intervalo de claves del
+        destino bajo el lock, así que las dobles escrituras no generan falsos
+        positivos. Retorna índice de rango -> {filas/checksum de cada lado, ok}.
+        """
+        if self.fase not in (COPIANDO, VERIFICANDO):
+            raise MigracionError(f"Primero hay que copiar (fase {self.fase!r})")
+        self.fase = VERIFICANDO
+        resultado = {i: {"origen": r.origen, "destino": r.destino, "filas_origen": 0, "filas_destino": 0,
+                         "checksum_origen": 0, "checksum_destino": 0} for i, r in enumerate(self.plan)}
+
+        async def comparar(origen, moviles, desde, hasta):
+            tabla = self.tablas[origen]
+            for indice, fila in moviles:
+                resultado[indice]["filas_origen"] += 1
+                resultado[indice]["checksum_origen"] ^= _huella(fila, tabla.columnas)
+            for destino in {r.destino for r in self.plan if r.origen == origen}:
+                for fila in await self.tablas[destino].leer_intervalo(desde, hasta):
+                    indice = self._rango(fila[tabla.clave])
+                    if indice is not None and self.plan[indice].origen == origen \
+                            and self.plan[indice].destino == destino:
+                        resultado[indice]["filas_destino"] += 1
+                        resultado[indice]["checksum_destino"] ^= _huella(fila, tabla.columnas)
+
+        await self._recorrer_origenes(comparar)
+        for fila in resultado.values():
+            fila["ok"] = (fila["filas_origen"], fila["checksum_origen"]) == \
+                         (fila["filas_destino"], fila["checksum_destino"])
+        self.verificacion = resultado
+        return resultado
+
+    async def cambiar_ruteo(self):
+        """Fase 4: con la verificación limpia, el router nuevo pasa a ser el vigente"""
+        if self.fase != VERIFICANDO or not self.verificacion or \
+                not all(fila["ok"] for fila in self.verificacion.values()):
+            raise MigracionError("El ruteo solo cambia después de una verificación sin diferencias")
+        async with self._bloqueo:  # Ninguna doble escritura queda a mitad de camino
+            self.router = self.router_nuevo
+            self.fase = CAMBIADA
+
+    async def limpiar(self):
+        """Borra del origen las filas que ya pertenecen a otro shard"""
+        if self.fase != CAMBIADA:
+            raise MigracionError("Solo se limpia después del cambio de ruteo")
+
+        async def borrar(origen, moviles, desde, hasta):
+            clave = self.tablas[origen].clave
+            await self.tablas[origen].eliminar([fila[clave] for _, fila in moviles])
+            self.borradas_origen += len(moviles)
+
+        await self._recorrer_origenes(borrar)
+        self.fase = LIMPIA
+
+    async def ejecutar(self, limpiar: bool = True) -> Dict[str, Any]:
+        """Backfill, verificación (con recopia de los rangos que difieren) y cambio de ruteo"""
+        await self.backfill()
+        for intento in range(self.reintentos_verificacion + 1):
+            diferencias = {i for i, fila in (await self.verificar()).items() if not fila["ok"]}
+            if not diferencias:
+                break
+            if intento == self.reintentos_verificacion:
+                self.fase = FALLIDA
+                raise MigracionError(f"Rangos con diferencias tras {intento} recopias: {sorted(diferencias)}")
+            self.recopias += len(diferencias)
+            await self.backfill(rangos=diferencias)
+        await self.cambiar_ruteo()
+        if limpiar:
+            await self.limpiar()
+        return self.progreso()
+
+    def progreso(self) -> Dict[str, Any]:
+        return {
+            "fase": self.fase,
+            "rangos": len(self.plan),
+            "fraccion_del_ring": round(sum(r.fraccion for r in self.plan), 6),
+            "filas_copiadas": self.copiadas,
+            "lotes": self.lotes,
+            "escrituras_dobles": self.escrituras_dobles,
+            "fallos_doble_escritura": self.fallos_doble_escritura,
+            "rangos_recopiados": self.recopias,
+            "borradas_origen": self.borradas_origen,
+            "espera_limitador_s": round(self.limitador.esperado_s, 3),
+            "rangos_con_diferencias": sorted(i for i, f in self.verificacion.items() if not f["ok"]),
+        }
@@ -3,20 +3,249 @@ Router de Sharding para EcoMarket
 Implementa estrategias de particionamiento de datos:
 1. Simple Hash Sharding
 2. Consistent Hashing (para mejor redistribución)
+   - plan_rebalance: rangos de hash que cambian de dueño entre dos topologías
+3. Jump Consistent Hash (memoria O(1), shards numerados)
+4. Rendezvous Hashing (highest random weight, con pesos)
+5. Range Sharding (rangos ordenados de una key creciente, ej: órdenes por
+   created_at): los scans por intervalo solo tocan los shards que lo cubren
+
+HotKeyRouter envuelve a cualquiera de ellos: detecta las keys calientes
+(Count-Min Sketch + top-k) y reparte lecturas o escrituras de las marcadas.
+
+Los routers por hash aceptan una función de hash intercambiable (hash_fn):
+"md5" (la original, compatible con los datos ya distribuidos), "blake2b",
+"crc32" y "fnv1a" (ver HASHES).
 """
 
+import bisect
 import hashlib
-from typing import List, Dict, Any
-from dataclasses import dataclass
+import math
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
+from dataclasses import dataclass, field, replace
+
+try:
+    import numpy as np
+except ImportError:  # Está en requirements.txt; sin NumPy los lotes se rutean con bisect en Python puro
+    np = None
 
 
 @dataclass
 class ShardConfig:
-    """Configuración de un shard"""
+    """
+    Configuración de un shard
+    
+    weight es la capacidad relativa del nodo: ConsistentHashRouter le da
+    vnodes_per_shard·weight vnodes y RendezvousHashRouter la usa como peso
+    (Simple y Jump la ignoran).
+    """
     shard_id: int
     host: str
     port: int
     database: str
+    weight: float = 1.0
+    
+    def __post_init__(self):
+        if self.weight <= 0:
+            raise ValueError(f"El peso del shard {self.shard_id} debe ser positivo")
+
+
+# ===========================================
+# Funciones de hash
+# ===========================================
+
+MASCARA_32 = 0xFFFFFFFF
+MASCARA_64 = 0xFFFFFFFFFFFFFFFF
+
+
+class HashStrategy:
+    """
+    Función de hash para rutear keys
+    
+    hash() devuelve el entero completo de la función (SimpleHash hace
+    hash % num_shards) y hash32() su posición en el ring de 32 bits
+    (ConsistentHash). Las versiones *_many hashean un lote completo y
+    hash32_array (solo con NumPy) lo devuelve como arreglo uint32.
+    """
+    
+    nombre = "base"
+    bits = 32
+    
+    def hash(self, key: str) -> int:
+        raise NotImplementedError
+    
+    def hash32(self, key: str) -> int:
+        return self.hash(key) & MASCARA_32
+    
+    def hash_many(self, keys: Iterable[str]) -> List[int]:
+        hash_ = self.hash
+        return [hash_(key) for key in keys]
+    
+    def hash32_many(self, keys: Iterable[str]) -> List[int]:
+        return [h & MASCARA_32 for h in self.hash_many(keys)]
+    
+    def hash32_array(self, keys: Iterable[str]):
+        return np.array(self.hash32_many(keys), dtype=np.uint32)
+    
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class MD5Hash(HashStrategy):
+    """
+    MD5 de 128 bits: la función original de ambos routers
+    
+    hash() == int(md5.hexdigest(), 16) y hash32() == ese valor % 2^32, así
+    que las keys ya distribuidas siguen en el mismo shard.
+    """
+    
+    nombre = "md5"
+    bits = 128
+    
+    def hash(self, key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest(), "big")
+    
+    def hash32(self, key: str) -> int:
+        # Los 4 últimos bytes del digest = MD5 % 2^32, sin pasar por hex
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[12:], "big")
+    
+    def hash_many(self, keys: Iterable[str]) -> List[int]:
+        md5, desde_bytes = hashlib.md5, int.from_bytes
+        return [desde_bytes(md5(key.encode()).digest(), "big") for key in keys]
+    
+    def hash32_many(self, keys: Iterable[str]) -> List[int]:
+        md5, desde_bytes = hashlib.md5, int.from_bytes
+        return [desde_bytes(md5(key.encode()).digest()[12:], "big") for key in keys]
+    
+    def hash32_array(self, keys: Iterable[str]):
+        # Los digests juntos en un buffer: la última palabra big-endian de cada uno, sin un int por key
+        md5 = hashlib.md5
+        digests = b"".join([md5(datos).digest() for datos in map(str.encode, keys)])
+        return np.frombuffer(digests, dtype=">u4")[3::4].astype(np.uint32)
+
+
+class Blake2bHash(HashStrategy):
+    """BLAKE2b con digest de 8 bytes: criptográfico y más rápido que MD5"""
+    
+    nombre = "blake2b"
+    bits = 64
+    
+    def hash(self, key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+    
+    def hash_many(self, keys: Iterable[str]) -> List[int]:
+        blake2b, desde_bytes = hashlib.blake2b, int.from_bytes
+        return [desde_bytes(blake2b(key.encode(), digest_size=8).digest(), "big") for key in keys]
+
+
+class Crc32Hash(HashStrategy):
+    """
+    CRC32 (zlib, en C) seguido del finalizador fmix32 de MurmurHash3
+    
+    El CRC solo no reparte bien keys casi iguales ("user_1", "user_2"...):
+    el finalizador mezcla todos los bits. Es la opción más rápida de la stdlib.
+    """
+    
+    nombre = "crc32"
+    bits = 32
+    
+    def hash(self, key: str) -> int:
+        h = zlib.crc32(key.encode())
+        h ^= h >> 16
+        h = (h * 0x85EBCA6B) & MASCARA_32
+        h ^= h >> 13
+        h = (h * 0xC2B2AE35) & MASCARA_32
+        return h ^ (h >> 16)
+    
+    hash32 = hash
+    
+    def hash_many(self, keys: Iterable[str]) -> List[int]:
+        if np is not None:
+            return self.hash32_array(keys).tolist()
+        return [self.hash(key) for key in keys]
+    
+    hash32_many = hash_many
+    
+    def hash32_array(self, keys: Iterable[str]):
+        h = np.fromiter(map(zlib.crc32, map(str.encode, keys)), dtype=np.uint32)
+        h ^= h >> np.uint32(16)
+        h *= np.uint32(0x85EBCA6B)
+        h ^= h >> np.uint32(13)
+        h *= np.uint32(0xC2B2AE35)
+        h ^= h >> np.uint32(16)
+        return h
+
+
+class FNV1a64Hash(HashStrategy):
+    """
+    FNV-1a de 64 bits con el finalizador fmix64 de MurmurHash3
+    
+    Sin dependencias: byte a byte en Python puro (lento para keys sueltas);
+    con NumPy, hash_many procesa el lote columna por columna.
+    """
+    
+    nombre = "fnv1a"
+    bits = 64
+    BASE = 0xCBF29CE484222325
+    PRIMO = 0x100000001B3
+    
+    @staticmethod
+    def _fmix64(h: int) -> int:
+        h ^= h >> 33
+        h = (h * 0xFF51AFD7ED558CCD) & MASCARA_64
+        h ^= h >> 33
+        h = (h * 0xC4CEB9FE1A85EC53) & MASCARA_64
+        return h ^ (h >> 33)
+    
+    def hash(self, key: str) -> int:
+        h, primo = self.BASE, self.PRIMO
+        for byte in key.encode():
+            h = ((h ^ byte) * primo) & MASCARA_64
+        return self._fmix64(h)
+    
+    def hash_many(self, keys: Iterable[str]) -> List[int]:
+        if np is None:
+            hash_ = self.hash
+            return [hash_(key) for key in keys]
+        datos = [key.encode() for key in keys]
+        if not datos:
+            return []
+        
+        # Matriz de bytes (una fila por key, rellena con ceros) y largo de cada una
+        largos = np.fromiter((len(d) for d in datos), dtype=np.int64, count=len(datos))
+        ancho = max(int(largos.max()), 1)
+        matriz = np.array(datos, dtype=f"S{ancho}").view(np.uint8).reshape(len(datos), ancho)
+        h = np.full(len(datos), self.BASE, dtype=np.uint64)
+        primo = np.uint64(self.PRIMO)
+        for columna in range(ancho):
+            activos = largos > columna
+            h = np.where(activos, (h ^ matriz[:, columna]) * primo, h)
+        
+        h ^= h >> np.uint64(33)
+        h *= np.uint64(0xFF51AFD7ED558CCD)
+        h ^= h >> np.uint64(33)
+        h *= np.uint64(0xC4CEB9FE1A85EC53)
+        h ^= h >> np.uint64(33)
+        return h.tolist()
+
+
+HASHES: Dict[str, HashStrategy] = {
+    estrategia.nombre: estrategia
+    for estrategia in (MD5Hash(), Blake2bHash(), Crc32Hash(), FNV1a64Hash())
+}
+
+
+def obtener_hash(hash_fn: Union[str, HashStrategy]) -> HashStrategy:
+    """Resuelve hash_fn: un nombre de HASHES o una HashStrategy propia"""
+    if isinstance(hash_fn, HashStrategy):
+        return hash_fn
+    try:
+        return HASHES[hash_fn]
+    except KeyError:
+        raise ValueError(f"Función de hash desconocida: {hash_fn!r} (opciones: {', '.join(HASHES)})")
 
 
 class SimpleHashShardRouter:
@@ -27,9 +256,10 @@ class SimpleHashShardRouter:
     ⚠️ Problema: Al agregar/quitar shards, requiere redistribuir muchos datos
     """
     
-    def __init__(self, shards: List[ShardConfig]):
+    def __init__(self, shards: List[ShardConfig], hash_fn: Union[str, HashStrategy] = "md5"):
         self.shards = shards
         self.num_shards = len(shards)
+        self.hash_fn = obtener_hash(hash_fn)
     
     def get_shard(self, key: str) -> ShardConfig:
         """
@@ -41,17 +271,51 @@ class SimpleHashShardRouter:
         Returns:
             ShardConfig del shard asignado
         """
-        hash_value = int(hashlib.md5(key.encode()).hexdigest(), 16)
+        hash_value = self.hash_fn.hash(key)
         shard_index = hash_value % self.num_shards
         return self.shards[shard_index]
     
+    def get_shard_ids(self, keys: Iterable[str]) -> List[int]:
+        """Rutea un lote de keys de una vez y retorna el shard_id de cada una"""
+        ids = [shard.shard_id for shard in self.shards]
+        return [ids[h % self.num_shards] for h in self.hash_fn.hash_many(keys)]
+    
     def get_distribution(self, keys: List[str]) -> Dict[int, int]:
-        """Analiza la distribución de keys entre shards"""
+        """Analiza la distribución de keys entre shards (hashea el lote de una vez)"""
         distribution = {shard.shard_id: 0 for shard in self.shards}
-        for key in keys:
-            shard = self.get_shard(key)
-            distribution[shard.shard_id] += 1
+        indices = Counter(h % self.num_shards for h in self.hash_fn.hash_many(keys))
+        for shard_index, count in indices.items():
+            distribution[self.shards[shard_index].shard_id] += count
         return distribution
+    
+    def add_shard(self, shard: ShardConfig):
+        """Agrega un shard al final (cambia el módulo: mueve ~N/(N+1) de las keys)"""
+        self.shards = self.shards + [shard]
+        self.num_shards = len(self.shards)
+    
+    def remove_shard(self, shard_id: int):
+        """Remueve un shard (los siguientes cambian de índice)"""
+        self.shards = [shard for shard in self.shards if shard.shard_id != shard_id]
+        self.num_shards = len(self.shards)
+
+
+@dataclass
+class RangoRebalanceo:
+    """
+    Rango del ring que cambia de dueño: hashes de `inicio` a `fin` (ambos incluidos)
+
+    keys_estimadas asume que las keys de `origen` se reparten uniformemente
+    en su porción del ring (None si no se dieron conteos por shard)
+    """
+    inicio: int
+    fin: int
+    origen: int
+    destino: int
+    fraccion: float
+    keys_estimadas: Optional[int] = None
+
+    def contiene(self, hash_value: int) -> bool:
+        return self.inicio <= hash_value <= self.fin
 
 
 class ConsistentHashRouter:
@@ -66,29 +330,99 @@ class ConsistentHashRouter:
     1. Crea múltiples "virtual nodes" por cada shard físico
     2. Posiciona virtual nodes en un ring hash (0 a 2^32-1)
     3. Para cada key, encuentra el próximo virtual node en sentido horario
+       (búsqueda binaria sobre las posiciones ordenadas: O(log(vnodes·shards)))
+    
+    Agregar o quitar un shard inserta/borra solo sus vnodes en los arreglos
+    ordenados (sin reordenar el ring); plan_rebalance dice qué rangos de
+    hash cambian de dueño antes de aplicar una topología nueva.
+    
+    Cada shard recibe vnodes_per_shard·weight vnodes, así que su porción
+    del ring es proporcional a su capacidad; set_weight cambia el peso
+    agregando o quitando solo los vnodes del final.
     """
     
-    def __init__(self, shards: List[ShardConfig], vnodes_per_shard: int = 150):
+    ESPACIO = 2**32
+    
+    def __init__(self, shards: List[ShardConfig], vnodes_per_shard: int = 150,
+                 hash_fn: Union[str, HashStrategy] = "md5"):
         self.shards = {shard.shard_id: shard for shard in shards}
         self.vnodes_per_shard = vnodes_per_shard
+        self.hash_fn = obtener_hash(hash_fn)
         self.ring: Dict[int, int] = {}  # hash_value -> shard_id
+        self._vnodes: Dict[int, List[int]] = {}  # shard_id -> posiciones de sus vnodes
         self._build_ring()
     
     def _hash(self, key: str) -> int:
-        """Genera hash de 32 bits"""
-        return int(hashlib.md5(key.encode()).hexdigest(), 16) % (2**32)
+        """Genera hash de 32 bits (con MD5: MD5 % 2^32, igual que antes)"""
+        return self.hash_fn.hash32(key)
+    
+    def _hash_many(self, keys: Iterable[str]) -> List[int]:
+        """_hash para un lote (sin una llamada a método por key)"""
+        return self.hash_fn.hash32_many(keys)
+    
+    def _vnode_count(self, shard: ShardConfig) -> int:
+        """Cantidad de vnodes según la capacidad del shard (al menos uno)"""
+        return max(1, round(self.vnodes_per_shard * shard.weight))
+    
+    def _vnode_positions(self, shard: ShardConfig, desde: int = 0, hasta: Optional[int] = None) -> List[int]:
+        """Posiciones en el ring de los virtual nodes de un shard (vnode{desde}..vnode{hasta-1})"""
+        hasta = self._vnode_count(shard) if hasta is None else hasta
+        return self._hash_many(f"{shard.host}:{shard.port}:vnode{vnode_id}"
+                               for vnode_id in range(desde, hasta))
     
     def _build_ring(self):
         """Construye el ring con virtual nodes"""
         for shard in self.shards.values():
-            for vnode_id in range(self.vnodes_per_shard):
-                # Crea virtual node único para cada shard
-                vnode_key = f"{shard.host}:{shard.port}:vnode{vnode_id}"
-                hash_value = self._hash(vnode_key)
+            # Crea virtual node único para cada shard
+            self._vnodes[shard.shard_id] = self._vnode_positions(shard)
+            for hash_value in self._vnodes[shard.shard_id]:
                 self.ring[hash_value] = shard.shard_id
         
-        # Ordena el ring para búsqueda binaria eficiente
+        # Arreglos compactos para la búsqueda binaria: posiciones del ring
+        # ordenadas y, en paralelo, el shard dueño de cada posición
         self.sorted_keys = sorted(self.ring.keys())
+        self._owners = [self.ring[h] for h in self.sorted_keys]
+        self._np_keys = None
+    
+    @classmethod
+    def desde_ring(cls, shards: List[ShardConfig], vnodes_per_shard: int, hash_fn: Union[str, HashStrategy],
+                   vnodes: Dict[int, List[int]], sorted_keys: List[int],
+                   owners: List[int]) -> "ConsistentHashRouter":
+        """
+        Router a partir de un ring ya calculado (ver shard_topology), sin hashear vnodes
+        
+        vnodes: shard_id -> posiciones en orden vnode0, vnode1... (las que
+        usan set_weight y remove_shard); sorted_keys/owners: el ring ordenado.
+        """
+        router = cls.__new__(cls)
+        router.shards = {shard.shard_id: shard for shard in shards}
+        router.vnodes_per_shard = vnodes_per_shard
+        router.hash_fn = obtener_hash(hash_fn)
+        router._vnodes = vnodes
+        router.sorted_keys = sorted_keys
+        router._owners = owners
+        router.ring = dict(zip(sorted_keys, owners))
+        router._np_keys = None
+        return router
+    
+    def _arrays_np(self):
+        """Copias NumPy de los arreglos (se regeneran solo tras un cambio del ring)"""
+        if self._np_keys is None:
+            self._np_keys = np.array(self.sorted_keys, dtype=np.uint32)
+            self._np_owners = np.array(self._owners, dtype=np.int64)
+        return self._np_keys, self._np_owners
+    
+    def _indices_np(self, keys: Iterable[str]):
+        """Índice en el ring del vnode de cada key: un searchsorted sobre el lote hasheado"""
+        np_keys, _ = self._arrays_np()
+        indices = np.searchsorted(np_keys, self.hash_fn.hash32_array(keys), side="left")
+        indices[indices == len(np_keys)] = 0
+        return indices
+    
+    def _owner_index(self, hash_value: int) -> int:
+        """Índice del primer vnode >= hash_value (con wraparound al primero)"""
+        indice = bisect.bisect_left(self.sorted_keys, hash_value)
+        return indice if indice < len(self.sorted_keys) else 0
     
     def get_shard(self, key: str) -> ShardConfig:
         """
@@ -100,52 +434,880 @@ class ConsistentHashRouter:
         if not self.ring:
             raise ValueError("No hay shards configurados")
         
-        hash_value = self._hash(key)
-        
         # Búsqueda binaria del próximo nodo
-        for ring_key in self.sorted_keys:
-            if ring_key >= hash_value:
-                shard_id = self.ring[ring_key]
-                return self.shards[shard_id]
+        return self.shards[self._owners[self._owner_index(self._hash(key))]]
+    
+    def get_shard_ids(self, keys: Iterable[str]) -> List[int]:
+        """
+        Rutea un lote de keys de una vez y retorna el shard_id de cada una
         
-        # Wraparound al primer nodo del ring
-        shard_id = self.ring[self.sorted_keys[0]]
-        return self.shards[shard_id]
+        Hashea todo el lote y luego busca todas las posiciones (con NumPy,
+        un solo searchsorted vectorizado); evita crear un ShardConfig por key.
+        """
+        if not self.ring:
+            raise ValueError("No hay shards configurados")
+        
+        if np is not None:
+            return self._arrays_np()[1][self._indices_np(keys)].tolist()
+        
+        hashes = self._hash_many(keys)
+        buscar, posiciones, owners = bisect.bisect_left, self.sorted_keys, self._owners
+        total = len(owners)
+        return [owners[i] if i < total else owners[0] for i in (buscar(posiciones, h) for h in hashes)]
+    
+    def get_shards(self, keys: Iterable[str]) -> List[ShardConfig]:
+        """Versión por lotes de get_shard (mismo orden que `keys`)"""
+        shards = self.shards
+        return [shards[shard_id] for shard_id in self.get_shard_ids(keys)]
+    
+    def _insert_vnode(self, hash_value: int, shard_id: int):
+        indice = bisect.bisect_left(self.sorted_keys, hash_value)
+        if indice < len(self.sorted_keys) and self.sorted_keys[indice] == hash_value:
+            self._owners[indice] = shard_id  # Colisión: como en _build_ring, gana el último
+        else:
+            self.sorted_keys.insert(indice, hash_value)
+            self._owners.insert(indice, shard_id)
+        self.ring[hash_value] = shard_id
+    
+    def _delete_vnode(self, hash_value: int, shard_id: int):
+        if self.ring.get(hash_value) != shard_id:
+            return  # La posición quedó en manos de otro shard (colisión)
+        indice = bisect.bisect_left(self.sorted_keys, hash_value)
+        del self.sorted_keys[indice]
+        del self._owners[indice]
+        del self.ring[hash_value]
     
     def add_shard(self, shard: ShardConfig):
-        """Agrega un nuevo shard al ring"""
+        """Agrega un nuevo shard al ring (inserta solo sus vnodes)"""
+        if shard.shard_id in self.shards:
+            self.remove_shard(shard.shard_id)
         self.shards[shard.shard_id] = shard
-        for vnode_id in range(self.vnodes_per_shard):
-            vnode_key = f"{shard.host}:{shard.port}:vnode{vnode_id}"
-            hash_value = self._hash(vnode_key)
-            self.ring[hash_value] = shard.shard_id
-        self.sorted_keys = sorted(self.ring.keys())
+        self._vnodes[shard.shard_id] = self._vnode_positions(shard)
+        for hash_value in self._vnodes[shard.shard_id]:
+            self._insert_vnode(hash_value, shard.shard_id)
+        self._np_keys = None
     
     def remove_shard(self, shard_id: int):
-        """Remueve un shard del ring"""
+        """Remueve un shard del ring (borra solo sus vnodes, sin recorrer el ring)"""
         if shard_id not in self.shards:
             return
         
-        shard = self.shards[shard_id]
-        # Remueve todos los virtual nodes de este shard
-        keys_to_remove = []
-        for hash_val, sid in self.ring.items():
-            if sid == shard_id:
-                keys_to_remove.append(hash_val)
+        for hash_value in self._vnodes.pop(shard_id):
+            self._delete_vnode(hash_value, shard_id)
         
-        for key in keys_to_remove:
-            del self.ring[key]
+        del self.shards[shard_id]
+        self._np_keys = None
+    
+    def set_weight(self, shard_id: int, weight: float):
+        """
+        Cambia la capacidad de un shard en caliente
         
+        Los vnodes se numeran vnode0, vnode1...: subir el peso agrega los
+        que faltan al final y bajarlo quita los últimos. Solo se mueven las
+        keys que esos vnodes ganan (hacia el shard) o pierden (desde él).
+        """
+        anterior = self.shards[shard_id]
+        shard = replace(anterior, weight=weight)
+        actuales, nuevos = len(self._vnodes[shard_id]), self._vnode_count(shard)
+        self.shards[shard_id] = shard
+        if nuevos > actuales:
+            agregados = self._vnode_positions(shard, actuales, nuevos)
+            for hash_value in agregados:
+                self._insert_vnode(hash_value, shard_id)
+            self._vnodes[shard_id].extend(agregados)
+        elif nuevos < actuales:
+            for hash_value in self._vnodes[shard_id][nuevos:]:
+                self._delete_vnode(hash_value, shard_id)
+            del self._vnodes[shard_id][nuevos:]
+        self._np_keys = None
+    
+    def get_distribution(self, keys: List[str]) -> Dict[int, int]:
+        """Analiza la distribución de keys entre shards (ruteo por lotes)"""
+        distribution = {shard_id: 0 for shard_id in self.shards.keys()}
+        if np is not None and self.ring:
+            # Conteo por vnode en NumPy; luego se suma por dueño (tantos vnodes como el ring)
+            por_vnode = np.bincount(self._indices_np(keys), minlength=len(self._owners)).tolist()
+            for shard_id, cantidad in zip(self._owners, por_vnode):
+                distribution[shard_id] += cantidad
+            return distribution
+        distribution.update(Counter(self.get_shard_ids(keys)))
+        return distribution
+    
+    def ownership(self) -> Dict[int, float]:
+        """Fracción del espacio de hash que posee cada shard"""
+        fracciones = {shard_id: 0.0 for shard_id in self.shards}
+        posiciones = self.sorted_keys
+        for i, hash_value in enumerate(posiciones):
+            # El vnode i posee (vnode anterior, hash_value]; el primero, además, el tramo que da la vuelta
+            anterior = posiciones[i - 1] if i else posiciones[-1] - self.ESPACIO
+            fracciones[self._owners[i]] += (hash_value - anterior) / self.ESPACIO
+        return fracciones
+    
+    def load_report(self, keys: Optional[List[str]] = None) -> Dict[int, Dict[str, float]]:
+        """
+        Porción objetivo vs real de cada shard
+        
+        - objetivo: weight / suma de los weights
+        - ring: fracción del espacio de hash que posee (ownership)
+        - keys: fracción de `keys` que rutea (solo si se pasan keys)
+        - desvio: (real / objetivo) - 1, usando keys si están y si no el ring
+        """
+        peso_total = sum(shard.weight for shard in self.shards.values())
+        ring = self.ownership()
+        distribucion = self.get_distribution(keys) if keys else None
+        reporte = {}
+        for shard_id, shard in self.shards.items():
+            fila = {"weight": shard.weight, "vnodes": len(self._vnodes[shard_id]),
+                    "objetivo": shard.weight / peso_total, "ring": ring[shard_id]}
+            if distribucion is not None:
+                fila["keys"] = distribucion[shard_id] / len(keys)
+            fila["desvio"] = fila.get("keys", fila["ring"]) / fila["objetivo"] - 1
+            reporte[shard_id] = fila
+        return reporte
+    
+    def plan_rebalance(self, new_topology: List[ShardConfig],
+                       keys_por_shard: Optional[Dict[int, int]] = None) -> List[RangoRebalanceo]:
+        """
+        Rangos de hash que cambian de dueño al pasar a `new_topology`
+        
+        Recorre juntas las posiciones de ambos rings: entre dos posiciones
+        consecutivas el dueño es constante en los dos, así que cada tramo
+        se compara una sola vez. Los tramos contiguos con el mismo
+        (origen, destino) se fusionan. Una key se mueve sii su hash cae en
+        un rango devuelto; el resto del ring no necesita copiarse.
+        
+        Args:
+            new_topology: lista completa de shards de la topología nueva
+            keys_por_shard: keys actuales por shard, para estimar cuántas mueve cada rango
+        """
+        nuevo = ConsistentHashRouter(new_topology, self.vnodes_per_shard, self.hash_fn)
+        if not self.ring or not nuevo.ring:
+            raise ValueError("Ambas topologías necesitan al menos un shard")
+        
+        limites = sorted(set(self.sorted_keys) | set(nuevo.sorted_keys))
+        tramos = [(0, limites[0])]  # Incluye el tramo que da la vuelta al ring...
+        tramos += [(limites[i - 1] + 1, limites[i]) for i in range(1, len(limites))]
+        if limites[-1] < self.ESPACIO - 1:
+            tramos.append((limites[-1] + 1, self.ESPACIO - 1))  # ...y su parte final
+        
+        rangos: List[RangoRebalanceo] = []
+        for inicio, fin in tramos:
+            origen = self._owners[self._owner_index(fin)]
+            destino = nuevo._owners[nuevo._owner_index(fin)]
+            if origen == destino:
+                continue
+            ultimo = rangos[-1] if rangos else None
+            if ultimo and ultimo.fin + 1 == inicio and (ultimo.origen, ultimo.destino) == (origen, destino):
+                ultimo.fin = fin
+            else:
+                rangos.append(RangoRebalanceo(inicio, fin, origen, destino, 0.0))
+        
+        propiedad = self.ownership() if keys_por_shard is not None else {}
+        for rango in rangos:
+            rango.fraccion = (rango.fin - rango.inicio + 1) / self.ESPACIO
+            if keys_por_shard is not None and propiedad.get(rango.origen):
+                densidad = keys_por_shard.get(rango.origen, 0) / propiedad[rango.origen]
+                rango.keys_estimadas = round(densidad * rango.fraccion)
+        return rangos
+
+
+def jump_hash(key: int, num_buckets: int) -> int:
+    """Jump Consistent Hash (Lamport y Veach): bucket en [0, num_buckets) en O(log n)"""
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & MASCARA_64
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def jump_hash_many(keys: List[int], num_buckets: int) -> List[int]:
+    """jump_hash vectorizado con NumPy: todas las keys avanzan juntas hasta salir del rango"""
+    key = np.array(keys, dtype=np.uint64)
+    b = np.full(len(keys), -1, dtype=np.int64)
+    j = np.zeros(len(keys), dtype=np.int64)
+    activos = j < num_buckets
+    while activos.any():
+        b[activos] = j[activos]
+        key[activos] = key[activos] * np.uint64(2862933555777941757) + np.uint64(1)
+        divisor = (key[activos] >> np.uint64(33)).astype(np.float64) + 1
+        j[activos] = ((b[activos] + 1) * ((1 << 31) / divisor)).astype(np.int64)
+        activos = j < num_buckets
+    return b.tolist()
+
+
+class JumpHashRouter:
+    """
+    Router con Jump Consistent Hash
+    
+    Ventajas:
+    - Memoria O(1) más la lista de shards: no hay ring ni vnodes
+    - Balance casi perfecto (cada bucket recibe ~K/N keys)
+    - Agregar un shard al final mueve solo K/(N+1) keys
+    
+    Limitación: los buckets son números consecutivos. Quitar el último
+    shard mueve solo sus keys; quitar otro hace swap-remove (el último
+    ocupa su bucket), así que se mueven sus keys y las del último (~2K/N).
+    """
+    
+    def __init__(self, shards: List[ShardConfig], hash_fn: Union[str, HashStrategy] = "md5"):
+        self.hash_fn = obtener_hash(hash_fn)
+        self._buckets: List[ShardConfig] = list(shards)
+        self.shards = {shard.shard_id: shard for shard in shards}
+    
+    def _bucket(self, key: str) -> int:
+        return jump_hash(self.hash_fn.hash(key) & MASCARA_64, len(self._buckets))
+    
+    def get_shard(self, key: str) -> ShardConfig:
+        """Encuentra el shard para una key (bucket de jump hash)"""
+        if not self._buckets:
+            raise ValueError("No hay shards configurados")
+        return self._buckets[self._bucket(key)]
+    
+    def get_shard_ids(self, keys: Iterable[str]) -> List[int]:
+        """Rutea un lote de keys de una vez y retorna el shard_id de cada una"""
+        if not self._buckets:
+            raise ValueError("No hay shards configurados")
+        ids, total = [shard.shard_id for shard in self._buckets], len(self._buckets)
+        hashes = [h & MASCARA_64 for h in self.hash_fn.hash_many(keys)]
+        if np is not None:
+            return [ids[b] for b in jump_hash_many(hashes, total)]
+        return [ids[jump_hash(h, total)] for h in hashes]
+    
+    def get_shards(self, keys: Iterable[str]) -> List[ShardConfig]:
+        """Versión por lotes de get_shard (mismo orden que `keys`)"""
+        shards = self.shards
+        return [shards[shard_id] for shard_id in self.get_shard_ids(keys)]
+    
+    def get_distribution(self, keys: List[str]) -> Dict[int, int]:
+        """Analiza la distribución de keys entre shards"""
+        distribution = {shard.shard_id: 0 for shard in self._buckets}
+        distribution.update(Counter(self.get_shard_ids(keys)))
+        return distribution
+    
+    def add_shard(self, shard: ShardConfig):
+        """Agrega un shard como último bucket"""
+        if shard.shard_id in self.shards:
+            self.remove_shard(shard.shard_id)
+        self._buckets.append(shard)
+        self.shards[shard.shard_id] = shard
+    
+    def remove_shard(self, shard_id: int):
+        """Remueve un shard (swap-remove: el último bucket ocupa su lugar)"""
+        if shard_id not in self.shards:
+            return
+        indice = next(i for i, shard in enumerate(self._buckets) if shard.shard_id == shard_id)
+        ultimo = self._buckets.pop()
+        if indice < len(self._buckets):
+            self._buckets[indice] = ultimo
         del self.shards[shard_id]
-        self.sorted_keys = sorted(self.ring.keys())
+
+
+class RendezvousHashRouter:
+    """
+    Router con Rendezvous Hashing (Highest Random Weight), con pesos
+    
+    Cada key elige el shard de mayor puntaje hash(key, shard); con pesos
+    el puntaje es -peso / ln(u) (u uniforme en (0, 1)), así que cada shard
+    recibe una fracción proporcional a su peso. Agregar o quitar un shard
+    solo mueve las keys que gana o que tenía.
+    
+    La key se hashea una vez y se combina con una semilla por shard
+    (fmix64), en vez de hashear un string por shard. Costo O(N) por key:
+    con NumPy, get_shard_ids evalúa el lote completo como una matriz.
+    """
+    
+    LOTE_NP = 4096  # Filas por bloque de la matriz keys × shards
+    
+    def __init__(self, shards: List[ShardConfig], weights: Optional[Dict[int, float]] = None,
+                 hash_fn: Union[str, HashStrategy] = "md5"):
+        self.hash_fn = obtener_hash(hash_fn)
+        self.shards: Dict[int, ShardConfig] = {}
+        self.weights: Dict[int, float] = {}
+        self._semillas: Dict[int, int] = {}
+        for shard in shards:
+            self.add_shard(shard, (weights or {}).get(shard.shard_id))
+    
+    def _refrescar(self):
+        """Arreglos paralelos (ids, semillas, pesos) para el cálculo por key"""
+        self._ids = list(self.shards)
+        self._lista_semillas = [self._semillas[shard_id] for shard_id in self._ids]
+        self._lista_pesos = [self.weights[shard_id] for shard_id in self._ids]
+        self._uniforme = len(set(self._lista_pesos)) <= 1
+        self._np_semillas = None
+    
+    @staticmethod
+    def _fmix64(h: int) -> int:
+        h ^= h >> 33
+        h = (h * 0xFF51AFD7ED558CCD) & MASCARA_64
+        h ^= h >> 33
+        h = (h * 0xC4CEB9FE1A85EC53) & MASCARA_64
+        return h ^ (h >> 33)
+    
+    def _ganador(self, hash_key: int) -> int:
+        """Índice del shard de mayor puntaje para una key ya hasheada"""
+        mezclar = self._fmix64
+        puntajes = [mezclar(hash_key ^ semilla) for semilla in self._lista_semillas]
+        if not self._uniforme:
+            # u = 53 bits altos en (0, 1): -peso / ln(u) crece con u y con el peso
+            puntajes = [-peso / math.log(((x >> 11) + 0.5) / 2**53)
+                        for x, peso in zip(puntajes, self._lista_pesos)]
+        return puntajes.index(max(puntajes))
+    
+    def get_shard(self, key: str) -> ShardConfig:
+        """Encuentra el shard de mayor puntaje para la key"""
+        if not self.shards:
+            raise ValueError("No hay shards configurados")
+        return self.shards[self._ids[self._ganador(self.hash_fn.hash(key) & MASCARA_64)]]
+    
+    def _ganadores_np(self, hashes: List[int]) -> List[int]:
+        if self._np_semillas is None:
+            self._np_semillas = np.array(self._lista_semillas, dtype=np.uint64)
+            self._np_pesos = np.array(self._lista_pesos, dtype=np.float64)
+        ganadores = []
+        c33 = np.uint64(33)
+        for inicio in range(0, len(hashes), self.LOTE_NP):
+            bloque = np.array(hashes[inicio:inicio + self.LOTE_NP], dtype=np.uint64)
+            x = bloque[:, None] ^ self._np_semillas[None, :]
+            x ^= x >> c33
+            x *= np.uint64(0xFF51AFD7ED558CCD)
+            x ^= x >> c33
+            x *= np.uint64(0xC4CEB9FE1A85EC53)
+            x ^= x >> c33
+            if not self._uniforme:
+                u = ((x >> np.uint64(11)).astype(np.float64) + 0.5) / 2**53
+                x = -self._np_pesos[None, :] / np.log(u)
+            ganadores.extend(np.argmax(x, axis=1).tolist())
+        return ganadores
+    
+    def get_shard_ids(self, keys: Iterable[str]) -> List[int]:
+        """Rutea un lote de keys de una vez y retorna el shard_id de cada una"""
+        if not self.shards:
+            raise ValueError("No hay shards configurados")
+        hashes = [h & MASCARA_64 for h in self.hash_fn.hash_many(keys)]
+        if np is not None:
+            indices = self._ganadores_np(hashes)
+        else:
+            indices = [self._ganador(h) for h in hashes]
+        ids = self._ids
+        return [ids[i] for i in indices]
+    
+    def get_shards(self, keys: Iterable[str]) -> List[ShardConfig]:
+        """Versión por lotes de get_shard (mismo orden que `keys`)"""
+        shards = self.shards
+        return [shards[shard_id] for shard_id in self.get_shard_ids(keys)]
     
     def get_distribution(self, keys: List[str]) -> Dict[int, int]:
         """Analiza la distribución de keys entre shards"""
-        distribution = {shard_id: 0 for shard_id in self.shards.keys()}
-        for key in keys:
-            shard = self.get_shard(key)
-            distribution[shard.shard_id] += 1
+        distribution = {shard_id: 0 for shard_id in self.shards}
+        distribution.update(Counter(self.get_shard_ids(keys)))
+        return distribution
+    
+    def add_shard(self, shard: ShardConfig, weight: Optional[float] = None):
+        """Agrega un shard con su peso (por defecto shard.weight; solo se mueven las keys que pasa a ganar)"""
+        weight = shard.weight if weight is None else weight
+        if weight <= 0:
+            raise ValueError(f"El peso del shard {shard.shard_id} debe ser positivo")
+        self.shards[shard.shard_id] = shard
+        self.weights[shard.shard_id] = float(weight)
+        self._semillas[shard.shard_id] = self.hash_fn.hash(f"{shard.host}:{shard.port}") & MASCARA_64
+        self._refrescar()
+    
+    def remove_shard(self, shard_id: int):
+        """Remueve un shard (solo se mueven sus keys)"""
+        if shard_id not in self.shards:
+            return
+        del self.shards[shard_id], self.weights[shard_id], self._semillas[shard_id]
+        self._refrescar()
+    
+    def set_weight(self, shard_id: int, weight: float):
+        """Cambia el peso de un shard existente"""
+        self.add_shard(self.shards[shard_id], weight)
+
+
+@dataclass
+class MovimientoRango:
+    """Intervalo [inicio, fin) de keys que pasa de `origen` a `destino` (None = sin límite)"""
+    inicio: Any
+    fin: Any
+    origen: int
+    destino: int
+
+
+class RangeShardRouter:
+    """
+    Router por rangos de una key ordenada (order_id, created_at...)
+    
+    `limites` son los puntos de corte ordenados: el rango i va de
+    limites[i-1] (incluido) a limites[i] (excluido); el primero y el último
+    quedan abiertos. owners[i] es el shard del rango i (un shard puede tener
+    varios). Una consulta por intervalo solo toca los shards de los rangos
+    que lo cubren (scan_plan), mientras que con hash hay que consultar
+    todos. La contracara: con keys crecientes todas las inserciones nuevas
+    caen en el último rango; split_range lo parte y move_range lo reasigna.
+    
+    split_range, merge_range y move_range retornan los MovimientoRango
+    cuyas filas hay que copiar al nuevo dueño.
+    """
+    
+    def __init__(self, shards: List[ShardConfig], limites: Iterable[Any] = (),
+                 owners: Optional[List[int]] = None):
+        self.shards = {shard.shard_id: shard for shard in shards}
+        self.limites = list(limites)
+        if any(a >= b for a, b in zip(self.limites, self.limites[1:])):
+            raise ValueError("Los límites deben ser estrictamente crecientes")
+        if owners is None:
+            if len(self.shards) != len(self.limites) + 1:
+                raise ValueError("Sin owners, hace falta un límite menos que la cantidad de shards")
+            owners = list(self.shards)
+        if len(owners) != len(self.limites) + 1:
+            raise ValueError(f"{len(self.limites)} límites definen {len(self.limites) + 1} rangos, no {len(owners)}")
+        desconocidos = set(owners) - set(self.shards)
+        if desconocidos:
+            raise ValueError(f"Shards desconocidos: {sorted(desconocidos)}")
+        self._owners = list(owners)
+    
+    @staticmethod
+    def cuantiles(keys: Iterable[Any], partes: int) -> List[Any]:
+        """Límites que parten una muestra de keys en `partes` rangos con igual cantidad"""
+        ordenadas = sorted(set(keys))
+        limites = [ordenadas[len(ordenadas) * i // partes] for i in range(1, partes)]
+        return sorted(set(limites))
+    
+    def rangos(self) -> List[Tuple[Any, Any, int]]:
+        """(inicio, fin, shard_id) de cada rango, en orden (None = sin límite)"""
+        bordes = [None] + self.limites + [None]
+        return [(bordes[i], bordes[i + 1], owner) for i, owner in enumerate(self._owners)]
+    
+    def _indice(self, key: Any) -> int:
+        return bisect.bisect_right(self.limites, key)
+    
+    def get_shard(self, key: Any) -> ShardConfig:
+        """Shard del rango que contiene la key (búsqueda binaria sobre los límites)"""
+        return self.shards[self._owners[self._indice(key)]]
+    
+    def get_shard_ids(self, keys: Iterable[Any]) -> List[int]:
+        buscar, limites, owners = bisect.bisect_right, self.limites, self._owners
+        return [owners[buscar(limites, key)] for key in keys]
+    
+    def get_shards(self, keys: Iterable[Any]) -> List[ShardConfig]:
+        shards = self.shards
+        return [shards[shard_id] for shard_id in self.get_shard_ids(keys)]
+    
+    def get_distribution(self, keys: List[Any]) -> Dict[int, int]:
+        distribution = {shard_id: 0 for shard_id in self.shards}
+        distribution.update(Counter(self.get_shard_ids(keys)))
         return distribution
+    
+    def scan_plan(self, desde: Any = None, hasta: Any = None) -> List[Tuple[int, Any, Any]]:
+        """
+        Tramos que cubren [desde, hasta), recortados al intervalo: (shard_id, inicio, fin)
+        
+        Rangos contiguos del mismo shard se unen en un tramo. None = sin límite.
+        """
+        if desde is not None and hasta is not None and hasta <= desde:
+            return []
+        primero = 0 if desde is None else self._indice(desde)
+        ultimo = len(self.limites) if hasta is None else bisect.bisect_left(self.limites, hasta)
+        plan: List[Tuple[int, Any, Any]] = []
+        for i in range(primero, ultimo + 1):
+            inicio = desde if i == primero else self.limites[i - 1]
+            fin = hasta if i == ultimo else self.limites[i]
+            if plan and plan[-1][0] == self._owners[i]:
+                plan[-1] = (plan[-1][0], plan[-1][1], fin)
+            else:
+                plan.append((self._owners[i], inicio, fin))
+        return plan
+    
+    def get_shard_ids_for_range(self, desde: Any = None, hasta: Any = None) -> List[int]:
+        """Shards a consultar para [desde, hasta) (solo los que lo cubren)"""
+        return sorted({shard_id for shard_id, _, _ in self.scan_plan(desde, hasta)})
+    
+    def get_shards_for_range(self, desde: Any = None, hasta: Any = None) -> List[ShardConfig]:
+        return [self.shards[shard_id] for shard_id in self.get_shard_ids_for_range(desde, hasta)]
+    
+    def _verificar_shard(self, shard_id: int):
+        if shard_id not in self.shards:
+            raise ValueError(f"Shard desconocido: {shard_id}")
+    
+    def split_range(self, en: Any, shard_id: Optional[int] = None) -> List[MovimientoRango]:
+        """
+        Parte en `en` el rango que lo contiene; [en, fin) queda para `shard_id`
+        
+        Sin shard_id ambas mitades siguen en el mismo shard (nada se mueve):
+        sirve para preparar un move_range posterior.
+        """
+        indice = self._indice(en)
+        if indice and self.limites[indice - 1] == en:
+            raise ValueError(f"{en!r} ya es un límite")
+        origen = self._owners[indice]
+        destino = origen if shard_id is None else shard_id
+        self._verificar_shard(destino)
+        fin = self.limites[indice] if indice < len(self.limites) else None
+        self.limites.insert(indice, en)
+        self._owners.insert(indice + 1, destino)
+        return [MovimientoRango(en, fin, origen, destino)] if destino != origen else []
+    
+    def merge_range(self, en: Any, shard_id: Optional[int] = None) -> List[MovimientoRango]:
+        """
+        Une los dos rangos separados por el límite `en`
+        
+        El rango unido queda para `shard_id` (por defecto el dueño del de la
+        izquierda); retorna el o los tramos que cambian de shard.
+        """
+        indice = bisect.bisect_left(self.limites, en)
+        if indice == len(self.limites) or self.limites[indice] != en:
+            raise ValueError(f"{en!r} no es un límite")
+        izquierdo, derecho = self._owners[indice], self._owners[indice + 1]
+        destino = izquierdo if shard_id is None else shard_id
+        self._verificar_shard(destino)
+        inicio, _, _ = self.rangos()[indice]
+        fin = self.limites[indice + 1] if indice + 1 < len(self.limites) else None
+        movimientos = []
+        if izquierdo != destino:
+            movimientos.append(MovimientoRango(inicio, en, izquierdo, destino))
+        if derecho != destino:
+            movimientos.append(MovimientoRango(en, fin, derecho, destino))
+        del self.limites[indice]
+        del self._owners[indice + 1]
+        self._owners[indice] = destino
+        return movimientos
+    
+    def move_range(self, key: Any, shard_id: int) -> List[MovimientoRango]:
+        """Reasigna a `shard_id` el rango que contiene la key"""
+        self._verificar_shard(shard_id)
+        indice = self._indice(key)
+        inicio, fin, origen = self.rangos()[indice]
+        self._owners[indice] = shard_id
+        return [MovimientoRango(inicio, fin, origen, shard_id)] if origen != shard_id else []
+    
+    def add_shard(self, shard: ShardConfig):
+        """Registra un shard (sin rangos: recibe datos con split_range o move_range)"""
+        self.shards[shard.shard_id] = shard
+    
+    def remove_shard(self, shard_id: int):
+        """Quita un shard que ya no tiene rangos"""
+        if shard_id in self._owners:
+            raise ValueError(f"El shard {shard_id} todavía tiene rangos: muévelos antes de quitarlo")
+        self.shards.pop(shard_id, None)
+
+
+# ===========================================
+# Hot keys
+# ===========================================
+
+class CountMinSketch:
+    """
+    Frecuencias aproximadas de un flujo de keys en memoria fija (ancho × profundidad)
+    
+    Con conservative update estimar() nunca subestima y sobreestima a lo
+    sumo total·e/ancho con probabilidad 1 - e^-profundidad. Las filas usan
+    doble hashing sobre hash() de Python: barato, pero con semilla por
+    proceso, así que el sketch es local a cada instancia.
+    """
+    
+    def __init__(self, ancho: int = 2048, profundidad: int = 4):
+        self.ancho = ancho
+        self.profundidad = profundidad
+        self.filas = [[0] * ancho for _ in range(profundidad)]
+        self.total = 0
+    
+    def _indices(self, key: str) -> List[int]:
+        h = hash(key) & MASCARA_64
+        h1, h2 = h & MASCARA_32, (h >> 32) | 1
+        return [(h1 + i * h2) % self.ancho for i in range(self.profundidad)]
+    
+    def agregar(self, key: str, cantidad: int = 1) -> int:
+        """Suma `cantidad` a la key y retorna su estimación nueva"""
+        celdas = list(zip(self.filas, self._indices(key)))
+        estimado = min(fila[j] for fila, j in celdas) + cantidad
+        for fila, j in celdas:
+            if fila[j] < estimado:
+                fila[j] = estimado  # Conservative update: solo sube lo necesario
+        self.total += cantidad
+        return estimado
+    
+    def estimar(self, key: str) -> int:
+        return min(fila[j] for fila, j in zip(self.filas, self._indices(key)))
+    
+    def decaer(self, factor: float = 0.5):
+        """Envejece los conteos (ej: cada minuto) para que una key deje de ser caliente"""
+        self.filas = [[int(c * factor) for c in fila] for fila in self.filas]
+        self.total = int(self.total * factor)
+
+
+class DetectorHotKeys:
+    """
+    Top-k de las keys más ruteadas: Count-Min Sketch + tabla de candidatas
+    
+    Toda key suma en el sketch; entra a la tabla de las `capacidad` más
+    frecuentes solo si su estimación supera a la menor de la tabla. El
+    mínimo se recalcula en esos reemplazos y cuando crece la entrada que lo
+    tenía (las demás solo crecen, así que no pueden bajarlo). Cada entrada
+    recuerda a qué shard se ruteó la key; por_shard cuenta (exacto) el
+    tráfico de cada uno.
+    """
+    
+    def __init__(self, capacidad: int = 64, ancho: int = 2048, profundidad: int = 4):
+        self.sketch = CountMinSketch(ancho, profundidad)
+        self.capacidad = capacidad
+        self.por_shard: Counter = Counter()
+        self._top: Dict[str, List[int]] = {}  # key -> [estimado, shard_id]
+        self._clave_minima: Optional[str] = None  # La entrada de menor estimado (con la tabla llena)
+    
+    def registrar(self, key: str, shard_id: int, cantidad: int = 1):
+        estimado = self.sketch.agregar(key, cantidad)
+        self.por_shard[shard_id] += cantidad
+        entrada = self._top.get(key)
+        if entrada is not None:
+            entrada[0], entrada[1] = estimado, shard_id
+            if key == self._clave_minima:
+                self._recalcular_minimo()
+        elif len(self._top) < self.capacidad:
+            self._top[key] = [estimado, shard_id]
+            if len(self._top) == self.capacidad:
+                self._recalcular_minimo()
+        elif estimado > self._top[self._clave_minima][0]:
+            del self._top[self._clave_minima]
+            self._top[key] = [estimado, shard_id]
+            self._recalcular_minimo()
+    
+    def _recalcular_minimo(self):
+        self._clave_minima = min(self._top, key=lambda k: self._top[k][0])
+    
+    def registrar_lote(self, keys: List[str], shard_ids: List[int]):
+        """Un lote ruteado: una actualización del sketch por key distinta"""
+        for (key, shard_id), cantidad in Counter(zip(keys, shard_ids)).items():
+            self.registrar(key, shard_id, cantidad)
+    
+    def hot_keys(self, n: int = 10, umbral: float = 0.0) -> List[Dict[str, Any]]:
+        """Las n keys más frecuentes con al menos `umbral` del tráfico total"""
+        total = self.sketch.total or 1
+        filas = [{"key": key, "shard_id": shard_id, "estimado": estimado, "fraccion": estimado / total}
+                 for key, (estimado, shard_id) in self._top.items() if estimado / total >= umbral]
+        filas.sort(key=lambda fila: -fila["estimado"])
+        return filas[:n]
+    
+    def hot_keys_por_shard(self, n: int = 5) -> Dict[int, List[Dict[str, Any]]]:
+        """Top n de cada shard (fraccion relativa al tráfico de ese shard)"""
+        resultado: Dict[int, List[Dict[str, Any]]] = {}
+        for fila in self.hot_keys(self.capacidad):
+            lista = resultado.setdefault(fila["shard_id"], [])
+            if len(lista) < n:
+                lista.append(dict(fila, fraccion=fila["estimado"] / (self.por_shard.get(fila["shard_id"]) or 1)))
+        return resultado
+    
+    def decaer(self, factor: float = 0.5):
+        self.sketch.decaer(factor)
+        for key in list(self._top):
+            entrada = self._top[key]
+            entrada[0] = int(entrada[0] * factor)
+            if entrada[0] == 0:
+                del self._top[key]  # Ya no es candidata: deja lugar a las keys nuevas
+        for shard_id in self.por_shard:
+            self.por_shard[shard_id] = int(self.por_shard[shard_id] * factor)
+        # El redondeo puede cambiar el orden entre empates; con la tabla sin llenar no hay mínimo
+        self._clave_minima = None
+        if len(self._top) == self.capacidad:
+            self._recalcular_minimo()
+
+
+@dataclass
+class HotKeyOverride:
+    """
+    Cómo repartir una key caliente
+    
+    - replicas: shards extra que sirven sus lecturas, en round-robin con el dueño
+    - sub_keys: sus escrituras se reparten en key#0..key#n-1 (cada sub-key
+      se rutea por separado); leerla exige juntar todas (claves_lectura)
+    """
+    replicas: List[ShardConfig] = field(default_factory=list)
+    sub_keys: int = 1
+    _turno: int = field(default=0, repr=False)
+    
+    def __post_init__(self):
+        if self.sub_keys < 1:
+            raise ValueError("sub_keys debe ser al menos 1")
+
+
+class HotKeyRouter:
+    """
+    Envuelve cualquier router: detecta las keys calientes y aplica overrides
+    
+    get_shard / get_shard_ids / get_shards / get_distribution se comportan
+    como los del router envuelto y además alimentan el DetectorHotKeys.
+    get_shard_lectura y get_shard_escritura consultan la tabla de overrides.
+    """
+    
+    def __init__(self, router, detector: Optional[DetectorHotKeys] = None):
+        self.router = router
+        self.detector = detector or DetectorHotKeys()
+        self.overrides: Dict[str, HotKeyOverride] = {}
+    
+    @property
+    def shards(self) -> Dict[int, ShardConfig]:
+        return self.router.shards
+    
+    def get_shard(self, key: str) -> ShardConfig:
+        shard = self.router.get_shard(key)
+        self.detector.registrar(key, shard.shard_id)
+        return shard
+    
+    def get_shard_ids(self, keys: Iterable[str]) -> List[int]:
+        keys = list(keys)
+        shard_ids = self.router.get_shard_ids(keys)
+        self.detector.registrar_lote(keys, shard_ids)
+        return shard_ids
+    
+    def get_shards(self, keys: Iterable[str]) -> List[ShardConfig]:
+        shards = self.router.shards
+        return [shards[shard_id] for shard_id in self.get_shard_ids(keys)]
+    
+    def get_distribution(self, keys: List[str]) -> Dict[int, int]:
+        distribution = {shard_id: 0 for shard_id in self.router.shards}
+        distribution.update(Counter(self.get_shard_ids(keys)))
+        return distribution
+    
+    def distribution_report(self, keys: Optional[List[str]] = None, n: int = 5) -> Dict[int, Dict[str, Any]]:
+        """
+        get_distribution junto con las hot keys de cada shard
+        
+        - keys: keys ruteadas (solo si se pasan keys; también se registran)
+        - trafico: lo que registró el detector para el shard
+        - hot_keys: su top n; hot_fraccion: parte de su tráfico que se llevan
+        """
+        distribucion = self.get_distribution(keys) if keys else None
+        por_shard = self.detector.hot_keys_por_shard(n)
+        reporte = {}
+        for shard_id in self.router.shards:
+            calientes = por_shard.get(shard_id, [])
+            fila = {"trafico": self.detector.por_shard[shard_id], "hot_keys": calientes,
+                    "hot_fraccion": sum(h["fraccion"] for h in calientes)}
+            if distribucion is not None:
+                fila["keys"] = distribucion[shard_id]
+            reporte[shard_id] = fila
+        return reporte
+    
+    def marcar_hot_key(self, key: str, replicas: Optional[List[ShardConfig]] = None, sub_keys: int = 1):
+        """Agrega (o reemplaza) el override de una key"""
+        self.overrides[key] = HotKeyOverride(list(replicas or []), sub_keys)
+    
+    def quitar_override(self, key: str):
+        self.overrides.pop(key, None)
+    
+    def get_shard_lectura(self, key: str) -> ShardConfig:
+        """Shard para leer la key: con réplicas en el override, rota entre dueño y réplicas"""
+        shard = self.get_shard(key)
+        override = self.overrides.get(key)
+        if override is None or not override.replicas:
+            return shard
+        candidatos = [shard] + override.replicas
+        override._turno += 1
+        return candidatos[override._turno % len(candidatos)]
+    
+    def get_shard_escritura(self, key: str) -> Tuple[str, ShardConfig]:
+        """(key a escribir, shard): con sub_keys en el override, rota entre key#0..key#n-1"""
+        override = self.overrides.get(key)
+        if override is None or override.sub_keys == 1:
+            return key, self.get_shard(key)
+        self.detector.registrar(key, self.router.get_shard(key).shard_id)
+        override._turno += 1
+        sub_key = f"{key}#{override._turno % override.sub_keys}"
+        return sub_key, self.router.get_shard(sub_key)
+    
+    def claves_lectura(self, key: str) -> List[str]:
+        """Keys a leer y combinar para obtener la key completa (ej: shard_keys del scatter-gather)"""
+        override = self.overrides.get(key)
+        if override is None or override.sub_keys == 1:
+            return [key]
+        return [f"{key}#{i}" for i in range(override.sub_keys)]
+
+
+# ===========================================
+# Comparación de estrategias
+# ===========================================
+
+ESTRATEGIAS = {
+    "simple": lambda shards, vnodes, hash_fn: SimpleHashShardRouter(shards, hash_fn),
+    "consistente": lambda shards, vnodes, hash_fn: ConsistentHashRouter(shards, vnodes, hash_fn),
+    "jump": lambda shards, vnodes, hash_fn: JumpHashRouter(shards, hash_fn),
+    "rendezvous": lambda shards, vnodes, hash_fn: RendezvousHashRouter(shards, hash_fn=hash_fn),
+}
+
+
+def _keys_movidas(antes: List[int], despues: List[int]) -> float:
+    return sum(a != b for a, b in zip(antes, despues)) / len(antes) * 100
+
+
+def comparar_estrategias(num_shards: Iterable[int] = (3, 16, 64, 256), num_keys: int = 20_000,
+                         vnodes_per_shard: int = 150, hash_fn: Union[str, HashStrategy] = "md5",
+                         muestra: int = 2_000) -> List[Dict[str, Any]]:
+    """
+    Mide las cuatro estrategias (ESTRATEGIAS) para cada cantidad de shards
+    
+    Por estrategia y cantidad de shards retorna:
+    - keys_seg / keys_seg_lote: throughput de get_shard (sobre `muestra`
+      keys) y de get_shard_ids con todo el lote
+    - memoria_kb: memoria del router ya construido (tracemalloc)
+    - desviacion: desviación estándar de las keys por shard, en % de la media
+    - movidas_agregar / movidas_quitar: % de keys que cambian de shard al
+      agregar uno nuevo y al quitar el primero (add_shard / remove_shard)
+    """
+    keys = [f"user_{i}" for i in range(num_keys)]
+    filas = []
+    for n in num_shards:
+        shards = [ShardConfig(i, f"postgres-{i}", 5432, "ecomarket") for i in range(1, n + 1)]
+        for nombre, fabrica in ESTRATEGIAS.items():
+            ya_midiendo = tracemalloc.is_tracing()
+            if not ya_midiendo:
+                tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            router = fabrica(shards, vnodes_per_shard, hash_fn)
+            router.get_shard_ids(keys[:1])  # Incluye estructuras que se arman al primer uso
+            memoria = tracemalloc.get_traced_memory()[0] - base
+            if not ya_midiendo:
+                tracemalloc.stop()
+            
+            inicio = time.perf_counter()
+            for key in keys[:muestra]:
+                router.get_shard(key)
+            t_uno = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            antes = router.get_shard_ids(keys)
+            t_lote = time.perf_counter() - inicio
+            
+            conteos = Counter(antes)
+            media = len(keys) / n
+            varianza = sum((conteos.get(s.shard_id, 0) - media) ** 2 for s in shards) / n
+            
+            router.add_shard(ShardConfig(n + 1, f"postgres-{n + 1}", 5432, "ecomarket"))
+            agregado = router.get_shard_ids(keys)
+            router = fabrica(shards, vnodes_per_shard, hash_fn)
+            router.remove_shard(shards[0].shard_id)
+            quitado = router.get_shard_ids(keys)
+            
+            filas.append({
+                "estrategia": nombre,
+                "shards": n,
+                "keys_seg": min(muestra, len(keys)) / t_uno if t_uno else float("inf"),
+                "keys_seg_lote": len(keys) / t_lote if t_lote else float("inf"),
+                "memoria_kb": memoria / 1024,
+                "desviacion": varianza ** 0.5 / media * 100,
+                "movidas_agregar": _keys_movidas(antes, agregado),
+                "movidas_quitar": _keys_movidas(antes, quitado),
+            })
+    return filas
+
+
+def imprimir_comparacion(filas: List[Dict[str, Any]]):
+    """Tabla de comparar_estrategias (ideal al agregar: 1/(N+1); al quitar: 1/N)"""
+    print(f"{'estrategia':>11} | {'shards':>6} | {'keys/s':>9} | {'lote keys/s':>11} | {'memoria':>10} | "
+          f"{'σ carga':>7} | {'mueve +1':>8} | {'mueve -1':>8}")
+    print("-" * 92)
+    for fila in filas:
+        print(f"{fila['estrategia']:>11} | {fila['shards']:>6} | {fila['keys_seg']:>9,.0f} | "
+              f"{fila['keys_seg_lote']:>11,.0f} | {fila['memoria_kb']:>7.1f} KB | {fila['desviacion']:>6.1f}% | "
+              f"{fila['movidas_agregar']:>7.1f}% | {fila['movidas_quitar']:>7.1f}%")
 
 
 # ===========================================
@@ -221,9 +1383,50 @@ if __name__ == "__main__":
     print(f"  Keys que cambiarían de shard: {moved_keys_consistent}/{len(test_keys)} ({(moved_keys_consistent/len(test_keys)*100):.1f}%)")
     print(f"  ✅ Solo redistribuye ~25% (K/N donde N=4)!")
     
+    # 3. Las cuatro estrategias de 3 a 256 shards
+    print("\n\n3️⃣  SIMPLE vs CONSISTENT vs JUMP vs RENDEZVOUS")
+    print("-" * 92)
+    imprimir_comparacion(comparar_estrategias((3, 16, 64, 256)))
+    
+    # 4. Capacidad por shard
+    print("\n\n4️⃣  SHARDS CON PESO (el primario tiene el doble de capacidad)")
+    print("-" * 60)
+    pesados = [replace(shards[0], weight=2.0)] + shards[1:]
+    weighted_router = ConsistentHashRouter(pesados, vnodes_per_shard=150)
+    claves = [f"user_{i}" for i in range(20000)]
+    
+    def imprimir_carga(router):
+        for shard_id, fila in router.load_report(claves).items():
+            print(f"  Shard {shard_id}: peso {fila['weight']:.1f} ({fila['vnodes']} vnodes) | "
+                  f"objetivo {fila['objetivo']:.1%} | real {fila['keys']:.1%} | desvío {fila['desvio']:+.1%}")
+    
+    imprimir_carga(weighted_router)
+    antes = weighted_router.get_shard_ids(claves)
+    weighted_router.set_weight(3, 2.0)
+    movidas = sum(a != b for a, b in zip(antes, weighted_router.get_shard_ids(claves)))
+    print(f"\n  set_weight(3, 2.0): se mueven {movidas}/{len(claves)} keys, todas hacia el shard 3")
+    imprimir_carga(weighted_router)
+    
+    # 5. Hot keys: un producto en oferta flash se lleva el 20% del tráfico
+    print("\n\n5️⃣  HOT KEYS (producto en oferta flash)")
+    print("-" * 60)
+    hot_router = HotKeyRouter(ConsistentHashRouter(shards, vnodes_per_shard=150))
+    trafico = [f"product_{i % 5000}" for i in range(40000)] + ["product_flash"] * 10000
+    for shard_id, fila in hot_router.distribution_report(trafico, n=2).items():
+        calientes = ", ".join(f"{h['key']} ({h['fraccion']:.1%})" for h in fila["hot_keys"])
+        print(f"  Shard {shard_id}: {fila['keys']} requests | hot keys: {calientes}")
+    
+    hot_router.marcar_hot_key("product_flash", sub_keys=6)
+    destinos = Counter(hot_router.get_shard_escritura("product_flash")[1].shard_id for _ in range(6000))
+    print(f"\n  Override sub_keys=6: escrituras de product_flash por shard {dict(sorted(destinos.items()))}")
+    print(f"  Para leerla se juntan: {hot_router.claves_lectura('product_flash')}")
+    
     print("\n" + "=" * 60)
     print("CONCLUSIÓN")
     print("=" * 60)
     print("Simple Hash: Fácil de implementar pero costoso escalar")
     print("Consistent Hash: Más complejo pero eficiente para elastic scaling")
+    print("Jump Hash: Sin ring (memoria mínima); ideal si los shards solo se agregan al final")
+    print("Rendezvous: Acepta pesos y mueve lo mínimo, pero cuesta O(N) por key")
+    print("Hot keys: El hashing no reparte una sola key; se detecta y se divide con overrides")
     print("=" * 60)
@@ -0,0 +1,261 @@
+"""
+Topología de shards versionada y distribuida a todas las instancias de la API
+Cada proceso armaba su ConsistentHashRouter desde una lista fija de
+ShardConfig: nada garantizaba que todas las instancias ruteen igual
+después de un cambio. Ahora:
+
+1. Topologia: documento versionado (shards, pesos, vnodes, función de
+   hash) serializable a JSON; huella() identifica su contenido
+2. Ring precalculado: exportar_ring() guarda el documento + las posiciones
+   de los vnodes en arreglos binarios de 32 bits (con SHA-256 al final);
+   cargar_ring() arma el router sin hashear 150×N vnodes, en milisegundos
+3. publicar(): escribe el archivo del ring de forma atómica (temporal +
+   rename), así una instancia nunca lee un archivo a medias
+4. RouterVersionado: las instancias rutean a través de él; actualizar()
+   arma el router nuevo aparte y lo reemplaza con una sola asignación.
+   Las requests en curso terminan con el router que ya tomaron y ninguna
+   se corta. vigilar() recarga el archivo cuando cambia
+
+Las versiones solo avanzan: una versión vieja se ignora y la misma
+versión con otro contenido es un error de publicación.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import sys
+from array import array
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from shard_router import HASHES, ConsistentHashRouter, ShardConfig
+
+MAGIA = b"ECRING"
+FORMATO = 1
+_CABECERA = struct.Struct("<6sHII")  # magia, formato, bytes del JSON, posiciones del ring
+
+
+class TopologiaInvalidaError(ValueError):
+    """El documento o el archivo del ring no se puede usar (corrupto, incoherente o de otra versión)"""
+
+
+@dataclass
+class Topologia:
+    """Documento versionado con todo lo que define el ruteo"""
+    version: int
+    shards: List[ShardConfig]
+    vnodes_per_shard: int = 150
+    hash_fn: str = "md5"
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.hash_fn not in HASHES:
+            raise TopologiaInvalidaError(f"Función de hash desconocida: {self.hash_fn!r}")
+        ids = [shard.shard_id for shard in self.shards]
+        if len(ids) != len(set(ids)):
+            raise TopologiaInvalidaError(f"shard_id repetido en la versión {self.version}")
+
+    def a_dict(self) -> Dict[str, Any]:
+        return {"version": self.version, "vnodes_per_shard": self.vnodes_per_shard, "hash_fn": self.hash_fn,
+                "shards": [asdict(shard) for shard in self.shards], "metadata": self.metadata}
+
+    @classmethod
+    def desde_dict(cls, datos: Dict[str, Any]) -> "Topologia":
+        try:
+            return cls(int(datos["version"]), [ShardConfig(**shard) for shard in datos["shards"]],
+                       int(datos.get("vnodes_per_shard", 150)), datos.get("hash_fn", "md5"),
+                       datos.get("metadata", {}))
+        except (KeyError, TypeError, ValueError) as error:
+            raise TopologiaInvalidaError(f"Documento de topología inválido: {error}") from error
+
+    def a_json(self) -> str:
+        return json.dumps(self.a_dict(), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+    @classmethod
+    def desde_json(cls, texto: str) -> "Topologia":
+        return cls.desde_dict(json.loads(texto))
+
+    def huella(self) -> str:
+        """SHA-256 de lo que afecta al ruteo (sin version ni metadata)"""
+        datos = self.a_dict()
+        del datos["version"], datos["metadata"]
+        return hashlib.sha256(json.dumps(datos, sort_keys=True).encode()).hexdigest()
+
+    def siguiente(self, **cambios) -> "Topologia":
+        """La versión siguiente con los cambios dados (ej: shards=[...])"""
+        return replace(self, version=self.version + 1, **cambios)
+
+    def crear_router(self) -> ConsistentHashRouter:
+        return ConsistentHashRouter(self.shards, self.vnodes_per_shard, self.hash_fn)
+
+
+def _a_bytes(valores: List[int], tipo: str) -> bytes:
+    arreglo = array(tipo, valores)
+    if sys.byteorder == "big":
+        arreglo.byteswap()  # El archivo siempre es little-endian
+    return arreglo.tobytes()
+
+
+def _desde_bytes(datos: memoryview, tipo: str, cantidad: int, desde: int):
+    arreglo = array(tipo)
+    hasta = desde + cantidad * arreglo.itemsize
+    if hasta > len(datos):
+        raise TopologiaInvalidaError("Archivo del ring truncado")
+    arreglo.frombytes(datos[desde:hasta])
+    if sys.byteorder == "big":
+        arreglo.byteswap()
+    return arreglo.tolist(), hasta
+
+
+def exportar_ring(topologia: Topologia, router: Optional[ConsistentHashRouter] = None) -> bytes:
+    """
+    Formato compacto: cabecera + JSON de la topología + arreglos uint32/int32 + SHA-256
+
+    Arreglos: vnodes por shard (en el orden de topologia.shards), sus
+    posiciones en orden vnode0, vnode1..., y el ring ordenado (posiciones
+    y dueños). `router` evita recalcular el ring si ya está armado.
+    """
+    router = router or topologia.crear_router()
+    documento = topologia.a_json().encode()
+    vnodes = [router._vnodes[shard.shard_id] for shard in topologia.shards]
+    partes = [
+        _CABECERA.pack(MAGIA, FORMATO, len(documento), len(router.sorted_keys)),
+        documento,
+        _a_bytes([len(v) for v in vnodes], "I"),
+        _a_bytes([p for v in vnodes for p in v], "I"),
+        _a_bytes(router.sorted_keys, "I"),
+        _a_bytes(router._owners, "i"),
+    ]
+    cuerpo = b"".join(partes)
+    return cuerpo + hashlib.sha256(cuerpo).digest()
+
+
+def cargar_ring(datos: bytes, verificar_muestra: bool = True) -> Tuple[Topologia, ConsistentHashRouter]:
+    """
+    Topología y router desde exportar_ring(), sin hashear los vnodes
+
+    verificar_muestra recalcula el vnode0 de cada shard: detecta un archivo
+    generado con otra implementación de la función de hash (N hashes, no 150×N).
+    """
+    if len(datos) < _CABECERA.size + 32 or hashlib.sha256(datos[:-32]).digest() != datos[-32:]:
+        raise TopologiaInvalidaError("Archivo del ring corrupto (checksum)")
+    magia, formato, largo_json, total = _CABECERA.unpack_from(datos)
+    if magia != MAGIA or formato != FORMATO:
+        raise TopologiaInvalidaError(f"Formato de ring desconocido: {magia!r} v{formato}")
+    vista = memoryview(datos)[:-32]
+    inicio = _CABECERA.size + largo_json
+    topologia = Topologia.desde_json(bytes(vista[_CABECERA.size:inicio]).decode())
+
+    cantidades, cursor = _desde_bytes(vista, "I", len(topologia.shards), inicio)
+    posiciones, cursor = _desde_bytes(vista, "I", sum(cantidades), cursor)
+    sorted_keys, cursor = _desde_bytes(vista, "I", total, cursor)
+    owners, cursor = _desde_bytes(vista, "i", total, cursor)
+    if cursor != len(vista):
+        raise TopologiaInvalidaError("Archivo del ring con bytes de más")
+
+    vnodes, desde = {}, 0
+    for shard, cantidad in zip(topologia.shards, cantidades):
+        vnodes[shard.shard_id] = posiciones[desde:desde + cantidad]
+        desde += cantidad
+    router = ConsistentHashRouter.desde_ring(topologia.shards, topologia.vnodes_per_shard, topologia.hash_fn,
+                                             vnodes, sorted_keys, owners)
+    if verificar_muestra:
+        for shard in topologia.shards:
+            if vnodes[shard.shard_id][:1] != router._vnode_positions(shard, 0, 1):
+                raise TopologiaInvalidaError(f"El ring no coincide con {topologia.hash_fn} (shard {shard.shard_id})")
+    return topologia, router
+
+
+def publicar(ruta: str, topologia: Topologia, router: Optional[ConsistentHashRouter] = None):
+    """Escribe el ring precalculado de forma atómica (temporal + fsync + rename)"""
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(exportar_ring(topologia, router))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+def leer(ruta: str) -> Tuple[Topologia, ConsistentHashRouter]:
+    with open(ruta, "rb") as f:
+        return cargar_ring(f.read())
+
+
+class RouterVersionado:
+    """
+    Router vigente de una instancia, reemplazable en caliente
+
+    get_shard/get_shards/get_shard_ids delegan en el router de la versión
+    vigente. Quien necesite varias operaciones con la misma versión toma
+    `actual()` una vez: el par (topología, router) nunca se mezcla.
+    """
+
+    def __init__(self, topologia: Topologia, router: Optional[ConsistentHashRouter] = None):
+        self._vigente = (topologia, router or topologia.crear_router())
+        self.recargas = 0
+        self.ignoradas = 0
+        self._firma_archivo = None
+
+    def actual(self) -> Tuple[Topologia, ConsistentHashRouter]:
+        return self._vigente
+
+    @property
+    def version(self) -> int:
+        return self._vigente[0].version
+
+    @property
+    def topologia(self) -> Topologia:
+        return self._vigente[0]
+
+    @property
+    def router(self) -> ConsistentHashRouter:
+        return self._vigente[1]
+
+    def get_shard(self, key: str) -> ShardConfig:
+        return self._vigente[1].get_shard(key)
+
+    def get_shard_ids(self, keys) -> List[int]:
+        return self._vigente[1].get_shard_ids(keys)
+
+    def get_shards(self, keys) -> List[ShardConfig]:
+        return self._vigente[1].get_shards(keys)
+
+    def actualizar(self, topologia: Topologia, router: Optional[ConsistentHashRouter] = None) -> bool:
+        """
+        Pasa a `topologia` si es más nueva; retorna si hubo cambio
+
+        El router se arma antes del reemplazo, que es una única asignación:
+        no hay ningún momento en que una request vea un ring a medio armar.
+        """
+        vigente = self._vigente[0]
+        if topologia.version < vigente.version:
+            self.ignoradas += 1
+            return False
+        if topologia.version == vigente.version:
+            if topologia.huella() != vigente.huella():
+                raise TopologiaInvalidaError(f"La versión {topologia.version} se publicó con dos contenidos distintos")
+            return False
+        self._vigente = (topologia, router or topologia.crear_router())
+        self.recargas += 1
+        return True
+
+    def recargar(self, ruta: str) -> bool:
+        """Relee el archivo del ring solo si cambió (tamaño + mtime)"""
+        estado = os.stat(ruta)
+        firma = (estado.st_size, estado.st_mtime_ns)
+        if firma == self._firma_archivo:
+            return False
+        cambio = self.actualizar(*leer(ruta))
+        self._firma_archivo = firma
+        return cambio
+
+    async def vigilar(self, ruta: str, intervalo: float = 1.0):
+        """Tarea de fondo: revisa el archivo cada `intervalo` segundos (la carga corre fuera del event loop)"""
+        while True:
+            try:
+                await asyncio.to_thread(self.recargar, ruta)
+            except (OSError, TopologiaInvalidaError) as error:
+                print(f"⚠️  Topología no recargada ({ruta}): {error}")  # Se sigue con la versión vigente
+            await asyncio.sleep(intervalo)
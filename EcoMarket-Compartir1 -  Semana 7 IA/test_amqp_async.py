@@ -0,0 +1,253 @@
+"""
+Pruebas del publicador AMQP asíncrono (amqp_async.py)
+Usan una conexión en memoria con los mismos callbacks que pika AsyncioConnection.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pika
+import pytest
+from pika.exceptions import AMQPConnectionError, NackError
+
+from amqp_async import AsyncAMQPBatchPublisher, AsyncAMQPPublisher
+
+
+class CanalFalso:
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.loop = conexion.loop
+        self.is_open = True
+        self.declaradas = []
+        self.exchanges = []
+        self.publicados = []
+        self._al_confirmar = None
+        self._al_cerrar = []
+
+    def add_on_close_callback(self, callback):
+        self._al_cerrar.append(callback)
+
+    def confirm_delivery(self, ack_nack_callback, callback):
+        self._al_confirmar = ack_nack_callback
+        self.loop.call_soon(callback, None)
+
+    def queue_declare(self, queue, durable, callback):
+        self.declaradas.append(queue)
+        self.loop.call_soon(callback, None)
+
+    def exchange_declare(self, exchange, exchange_type, durable, callback):
+        self.exchanges.append((exchange, exchange_type))
+        self.loop.call_soon(callback, None)
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.publicados.append((exchange, routing_key, body))
+        if self.conexion.broker.confirmar_solo:
+            self.loop.call_soon(self.confirmar, len(self.publicados))
+
+    def confirmar(self, tag, multiple=False, ack=True):
+        clase = pika.spec.Basic.Ack if ack else pika.spec.Basic.Nack
+        self._al_confirmar(SimpleNamespace(method=clase(delivery_tag=tag, multiple=multiple)))
+
+    def cerrar(self, motivo):
+        self.is_open = False
+        for callback in self._al_cerrar:
+            callback(self, motivo)
+
+
+class ConexionFalsa:
+    def __init__(self, broker, parametros, on_open_callback, on_open_error_callback, on_close_callback,
+                 custom_ioloop):
+        self.broker = broker
+        self.loop = custom_ioloop
+        self.is_open = not broker.caido
+        self.canales = []
+        self._al_cerrar = on_close_callback
+        if broker.caido:
+            self.loop.call_soon(on_open_error_callback, self, AMQPConnectionError("broker caído"))
+        else:
+            self.loop.call_soon(on_open_callback, self)
+
+    def channel(self, on_open_callback):
+        canal = CanalFalso(self)
+        self.canales.append(canal)
+        self.loop.call_soon(on_open_callback, canal)
+
+    def close(self, motivo="cierre normal"):
+        self.is_open = False
+        for canal in self.canales:
+            canal.cerrar(motivo)
+        self.loop.call_soon(self._al_cerrar, self, motivo)
+
+
+class Broker:
+    """Fábrica de conexiones que recuerda todas las que abrió"""
+
+    def __init__(self):
+        self.conexiones = []
+        self.caido = False
+        self.confirmar_solo = True
+
+    def __call__(self, *args, **kwargs):
+        conexion = ConexionFalsa(self, *args, **kwargs)
+        if not self.caido:
+            self.conexiones.append(conexion)
+        return conexion
+
+    @property
+    def canal(self):
+        return self.conexiones[-1].canales[-1]
+
+
+def _publicador(broker, espera_reconexion=0.01, **opciones):
+    return AsyncAMQPPublisher(fabrica_conexion=broker, espera_reconexion=espera_reconexion, **opciones)
+
+
+def test_publica_concurrente_con_confirmacion_y_declaracion_cacheada():
+    async def escenario():
+        broker = Broker()
+        async with _publicador(broker) as publicador:
+            tags = await asyncio.gather(*(publicador.publicar_en_cola("compras_ecomarket", f"m{i}")
+                                          for i in range(5)))
+            metricas = publicador.metricas()
+        return broker, tags, metricas
+
+    broker, tags, metricas = asyncio.run(escenario())
+    assert len(broker.conexiones) == 1
+    assert broker.canal.declaradas == ["compras_ecomarket"]
+    assert sorted(tags) == [1, 2, 3, 4, 5]
+    assert metricas["confirmados"] == 5 and metricas["pendientes"] == 0
+    assert not broker.conexiones[0].is_open
+
+
+def test_ack_multiple_resuelve_todos_los_anteriores_y_nack_falla():
+    async def escenario():
+        broker = Broker()
+        broker.confirmar_solo = False
+        publicador = _publicador(broker)
+        await publicador.iniciar()
+        tareas = [asyncio.ensure_future(publicador.publicar("user_events", "", f"m{i}",
+                                                            declarar_exchange=("user_events", "fanout")))
+                  for i in range(3)]
+        while len(broker.canal.publicados) < 3:
+            await asyncio.sleep(0)
+        broker.canal.confirmar(2, multiple=True)
+        broker.canal.confirmar(3, ack=False)
+        resultados = await asyncio.gather(*tareas, return_exceptions=True)
+        await publicador.cerrar()
+        return broker, resultados, publicador.metricas()
+
+    broker, resultados, metricas = asyncio.run(escenario())
+    assert resultados[:2] == [1, 2]
+    assert isinstance(resultados[2], NackError)
+    assert broker.canal.exchanges == [("user_events", "fanout")]
+    assert metricas["confirmados"] == 2 and metricas["rechazados"] == 1
+
+
+def test_broker_caido_no_bloquea_el_arranque():
+    async def escenario():
+        broker = Broker()
+        broker.caido = True
+        publicador = _publicador(broker)
+        await publicador.iniciar()
+        with pytest.raises(AMQPConnectionError):
+            await publicador.publicar_en_cola("compras_ecomarket", "m1")
+
+        broker.caido = False
+        while not publicador.conectado:
+            await asyncio.sleep(0.01)
+        await publicador.publicar_en_cola("compras_ecomarket", "m2")
+        await publicador.cerrar()
+        return publicador.metricas()
+
+    metricas = asyncio.run(escenario())
+    assert metricas["confirmados"] == 1
+    assert metricas["errores"] == 1
+
+
+def test_conexion_perdida_falla_pendientes_y_reconecta():
+    async def escenario():
+        broker = Broker()
+        broker.confirmar_solo = False
+        publicador = _publicador(broker)
+        await publicador.iniciar()
+        tarea = asyncio.ensure_future(publicador.publicar_en_cola("compras_ecomarket", "m1"))
+        while not broker.canal.publicados:
+            await asyncio.sleep(0)
+        broker.conexiones[0].close("socket cerrado")
+        with pytest.raises(AMQPConnectionError):
+            await tarea
+
+        while not publicador.conectado:
+            await asyncio.sleep(0.01)
+        broker.confirmar_solo = True
+        tag = await publicador.publicar_en_cola("compras_ecomarket", "m2")
+        await publicador.cerrar()
+        return broker, tag, publicador.metricas()
+
+    broker, tag, metricas = asyncio.run(escenario())
+    assert len(broker.conexiones) == 2
+    assert tag == 1  # Los delivery tags reinician con el canal nuevo
+    assert broker.canal.declaradas == ["compras_ecomarket"]
+    assert metricas["conexiones"] == 2
+
+
+def test_lote_por_tamano_publica_seguido_y_confirma_por_mensaje():
+    async def escenario():
+        broker = Broker()
+        broker.confirmar_solo = False
+        publicador = _publicador(broker)
+        await publicador.iniciar()
+        lotes = AsyncAMQPBatchPublisher(publicador, max_lote=3, ventana_ms=10_000)
+        tareas = [asyncio.ensure_future(lotes.publicar_en_cola("compras_ecomarket", f"m{i}")) for i in range(3)]
+        while len(broker.canal.publicados) < 3:
+            await asyncio.sleep(0)
+        broker.canal.confirmar(1)
+        broker.canal.confirmar(2, ack=False)
+        broker.canal.confirmar(3)
+        resultados = await asyncio.gather(*tareas, return_exceptions=True)
+        await lotes.cerrar()
+        await publicador.cerrar()
+        return broker, resultados, lotes.metricas()
+
+    broker, resultados, metricas = asyncio.run(escenario())
+    assert [m[2] for m in broker.canal.publicados] == ["m0", "m1", "m2"]
+    assert resultados[0] == 1 and resultados[2] == 3
+    assert isinstance(resultados[1], NackError)
+    assert broker.canal.declaradas == ["compras_ecomarket"]
+    assert metricas["lotes"] == 1 and metricas["tamano_medio_lote"] == 3
+
+
+def test_lote_por_ventana_y_cierre_vacia_el_buffer():
+    async def escenario():
+        broker = Broker()
+        async with _publicador(broker) as publicador:
+            lotes = AsyncAMQPBatchPublisher(publicador, max_lote=100, ventana_ms=5)
+            await asyncio.gather(*(lotes.publicar_en_cola("compras_ecomarket", f"m{i}") for i in range(4)))
+            pendiente = asyncio.ensure_future(lotes.publicar_en_cola("compras_ecomarket", "ultimo"))
+            await asyncio.sleep(0)
+            await lotes.cerrar()
+            await pendiente
+            with pytest.raises(AMQPConnectionError):
+                await lotes.publicar_en_cola("compras_ecomarket", "tarde")
+        return broker, lotes.metricas()
+
+    broker, metricas = asyncio.run(escenario())
+    assert len(broker.canal.publicados) == 5
+    assert metricas["lotes"] == 2 and metricas["mensajes"] == 5
+    assert metricas["en_buffer"] == 0
+
+
+def test_lote_sin_conexion_falla_a_todos_los_llamadores():
+    async def escenario():
+        broker = Broker()
+        broker.caido = True
+        publicador = _publicador(broker, espera_reconexion=60)
+        await publicador.iniciar()
+        lotes = AsyncAMQPBatchPublisher(publicador, max_lote=2)
+        resultados = await asyncio.gather(
+            *(lotes.publicar_en_cola("compras_ecomarket", f"m{i}") for i in range(2)), return_exceptions=True
+        )
+        await publicador.cerrar()
+        return resultados
+
+    resultados = asyncio.run(escenario())
+    assert all(isinstance(r, AMQPConnectionError) for r in resultados)
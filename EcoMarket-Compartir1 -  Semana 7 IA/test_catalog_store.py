@@ -0,0 +1,73 @@
+"""
+Pruebas del catálogo indexado (catalog_store.py)
+"""
+import pytest
+
+from catalog_store import CatalogStore
+from models import Product
+
+
+def _producto(id, categoria="Frutas", stock=10, disponible=True, precio=2.0):
+    return Product(id=id, nombre=f"P{id}", categoria=categoria, precio=precio,
+                   disponible=disponible, stock=stock)
+
+
+@pytest.fixture
+def store():
+    return CatalogStore([
+        _producto(1, "Frutas"),
+        _producto(2, "Verduras"),
+        _producto(3, "Verduras", stock=0, disponible=False),
+    ])
+
+
+def test_obtener_por_id(store):
+    assert store.obtener(2).nombre == "P2"
+    assert store.obtener(99) is None
+    assert len(store) == 3
+    assert store.next_id == 4
+
+
+def test_indices_secundarios(store):
+    assert [p.id for p in store.por_categoria("Verduras")] == [2, 3]
+    assert [p.id for p in store.por_disponibilidad(True)] == [1, 2]
+    assert store.contar_por_categoria() == {"Frutas": 1, "Verduras": 2}
+    assert store.contar_disponibles() == 2
+
+
+def test_crear_asigna_id(store):
+    nuevo = store.crear({"nombre": "Palta", "categoria": "Frutas", "precio": 4.5, "stock": 3})
+    assert nuevo.id == 4
+    assert store.next_id == 5
+    assert [p.id for p in store.por_categoria("Frutas")] == [1, 4]
+
+
+def test_agregar_id_duplicado(store):
+    with pytest.raises(ValueError):
+        store.agregar(_producto(1))
+
+
+def test_actualizar_reindexa(store):
+    store.actualizar(1, {"categoria": "Verduras", "disponible": False})
+    assert store.contar_por_categoria() == {"Verduras": 3}
+    assert store.contar_disponibles() == 1
+    assert store.actualizar(99, {"nombre": "x"}) is None
+
+
+def test_descontar_stock_agota(store):
+    store.descontar_stock(1, 4)
+    assert store.obtener(1).stock == 6
+    store.descontar_stock(1, 6)
+    assert store.obtener(1).disponible is False
+    assert [p.id for p in store.por_disponibilidad(False)] == [1, 3]
+    with pytest.raises(ValueError):
+        store.descontar_stock(2, 11)
+
+
+def test_eliminar(store):
+    eliminado = store.eliminar(2)
+    assert eliminado.id == 2
+    assert 2 not in store
+    assert store.eliminar(2) is None
+    assert store.contar_por_categoria() == {"Frutas": 1, "Verduras": 1}
+    assert store.precio_promedio() == pytest.approx(2.0)
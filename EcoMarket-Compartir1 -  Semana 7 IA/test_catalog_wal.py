@@ -0,0 +1,182 @@
+"""
+Pruebas de la persistencia con Write-Ahead Log (catalog_wal.py)
+"""
+import json
+import os
+
+import pytest
+
+from catalog_store import CatalogStore
+from catalog_wal import CatalogWAL, coalescer_lote
+from models import Product
+
+
+def _catalogo_inicial():
+    return CatalogStore([
+        Product(id=1, nombre="Manzana", categoria="Frutas", precio=2.5, stock=10),
+        Product(id=2, nombre="Tomate", categoria="Verduras", precio=3.0, stock=5),
+    ])
+
+
+def test_primer_arranque_sin_datos(tmp_path):
+    wal = CatalogWAL(str(tmp_path / "productos.json"))
+    assert wal.cargar() is None
+
+
+def test_replay_de_mutaciones(tmp_path):
+    ruta = str(tmp_path / "productos.json")
+    wal = CatalogWAL(ruta)
+    store = _catalogo_inicial()
+    wal.escribir_snapshot(store)
+
+    store.descontar_stock(1, 3)
+    wal.registrar_stock(1, -3)
+    wal.registrar_actualizacion(2, {"precio": 3.5})
+    nuevo = store.crear({"nombre": "Palta", "categoria": "Frutas", "precio": 4.5, "stock": 1})
+    wal.registrar_creacion(nuevo)
+    wal.registrar_eliminacion(2)
+    wal.cerrar()
+
+    recargado = CatalogWAL(ruta).cargar()
+    assert recargado.obtener(1).stock == 7
+    assert recargado.obtener(2) is None
+    assert recargado.obtener(3).nombre == "Palta"
+    assert recargado.next_id == 4
+
+
+def test_compactacion_en_segundo_plano(tmp_path):
+    ruta = str(tmp_path / "productos.json")
+    wal = CatalogWAL(ruta, umbral_compactacion=3)
+    wal.escribir_snapshot(_catalogo_inicial())
+
+    for _ in range(7):
+        wal.registrar_stock(1, -1)
+        wal.flush().result(timeout=5)  # Un lote por registro: sin fusión
+    wal.cerrar()
+
+    assert wal.compactaciones >= 1
+    assert not [p for p in os.listdir(tmp_path) if ".wal." in p]
+    with open(ruta, encoding="utf-8") as f:
+        assert json.load(f)["lsn"] >= 3
+    assert CatalogWAL(ruta).cargar().obtener(1).stock == 3
+
+
+def test_falla_al_sellar_el_log_no_mata_al_escritor(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "productos.json")
+    wal = CatalogWAL(ruta, umbral_compactacion=2)
+    wal.escribir_snapshot(_catalogo_inicial())
+    reemplazar = os.replace
+    fallas = []
+
+    def replace_que_falla_una_vez(origen, destino):
+        if not fallas:
+            fallas.append(destino)
+            raise OSError("disco lleno")
+        return reemplazar(origen, destino)
+
+    monkeypatch.setattr("catalog_wal.os.replace", replace_que_falla_una_vez)
+    for _ in range(4):
+        wal.registrar_stock(1, -1).result(timeout=5)  # Ninguno queda colgado
+        wal.flush().result(timeout=5)
+    wal.cerrar()
+
+    assert fallas and wal.compactaciones >= 1  # El sellado se reintentó en el commit siguiente
+    assert CatalogWAL(ruta).cargar().obtener(1).stock == 6
+def test_caida_entre_snapshot_y_borrado_de_segmentos(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "productos.json")
+    wal = CatalogWAL(ruta)
+    wal.escribir_snapshot(_catalogo_inicial())
+    wal.cerrar()
+    # Segmento sellado de un lote fusionado: stock (n=1) + stock (n=3) quedaron en
+    # el primer lugar con el LSN mayor, antes que el upd con n=2
+    with open(wal.log_path + ".000001", "w", encoding="utf-8") as f:
+        f.write('{"n":3,"op":"stock","id":1,"d":-2}\n{"n":2,"op":"upd","id":2,"f":{"precio":4.0}}\n')
+
+    def caida(_ruta):
+        raise RuntimeError("proceso muerto antes de borrar los segmentos")
+
+    monkeypatch.setattr("catalog_wal.os.remove", caida)
+    with pytest.raises(RuntimeError):
+        CatalogWAL(ruta).compactar()
+    monkeypatch.undo()
+
+    with open(ruta, encoding="utf-8") as f:
+        assert json.load(f)["lsn"] == 3
+    recargado = CatalogWAL(ruta).cargar()  # El segmento sigue ahí: el replay no lo reaplica
+    assert recargado.obtener(1).stock == 8
+    assert recargado.obtener(2).precio == 4.0
+
+
+def test_registro_incompleto_se_descarta(tmp_path):
+    ruta = str(tmp_path / "productos.json")
+    wal = CatalogWAL(ruta)
+    wal.escribir_snapshot(_catalogo_inicial())
+    wal.registrar_stock(2, -1)
+    wal.cerrar()
+    with open(wal.log_path, "a", encoding="utf-8") as f:
+        f.write('{"n":2,"op":"sto')
+
+    # El replay descarta la línea incompleta y la trunca: los nuevos appends siguen siendo visibles
+    wal = CatalogWAL(ruta)
+    assert wal.cargar().obtener(2).stock == 4
+    wal.registrar_stock(2, -1).result(timeout=5)
+    wal.cerrar()
+    assert CatalogWAL(ruta).cargar().obtener(2).stock == 3
+
+
+def test_group_commit_agrupa_registros(tmp_path):
+    ruta = str(tmp_path / "productos.json")
+    wal = CatalogWAL(ruta, ventana_ms=20, max_lote=64)
+    wal.escribir_snapshot(_catalogo_inicial())
+
+    futuros = [wal.registrar_stock(1, -1) for _ in range(10)]
+    for futuro in futuros:
+        futuro.result(timeout=5)
+
+    metricas = wal.metricas()["group_commit"]
+    assert metricas["registros"] == 10
+    assert metricas["commits"] < 10
+    assert metricas["lote_maximo"] > 1
+    wal.cerrar()
+    assert CatalogWAL(ruta).cargar().obtener(1).stock == 0
+
+
+def test_coalescer_fusiona_registros_redundantes():
+    lote = [
+        {"op": "stock", "id": 1, "d": -1, "n": 1},
+        {"op": "upd", "id": 2, "f": {"precio": 3.0}, "n": 2},
+        {"op": "stock", "id": 1, "d": -2, "n": 3},
+        {"op": "upd", "id": 2, "f": {"nombre": "Tomate"}, "n": 4},
+        {"op": "stock", "id": 3, "d": -1, "n": 5},
+        {"op": "del", "id": 3, "n": 6},
+    ]
+    assert coalescer_lote(lote) == [
+        {"op": "stock", "id": 1, "d": -3, "n": 3},
+        {"op": "upd", "id": 2, "f": {"precio": 3.0, "nombre": "Tomate"}, "n": 4},
+        {"op": "del", "id": 3, "n": 6},
+    ]
+
+
+def test_flush_confirma_lo_pendiente(tmp_path):
+    ruta = str(tmp_path / "productos.json")
+    wal = CatalogWAL(ruta, ventana_ms=1000)
+    wal.escribir_snapshot(_catalogo_inicial())
+
+    futuros = [wal.registrar_stock(2, -1) for _ in range(3)]
+    wal.flush().result(timeout=0.5)  # No espera la ventana de 1 s
+    assert all(f.done() for f in futuros)
+    assert CatalogWAL(ruta).cargar().obtener(2).stock == 2
+    wal.cerrar()
+
+
+def test_snapshot_formato_antiguo(tmp_path):
+    ruta = tmp_path / "productos.json"
+    ruta.write_text(json.dumps([{
+        "id": 7, "nombre": "Zanahoria", "categoria": "Verduras", "precio": 2.2,
+        "disponible": True, "stock": 3, "descripcion": None,
+        "fecha_agregado": "2025-10-29T18:48:49.369743"
+    }]), encoding="utf-8")
+
+    store = CatalogWAL(str(ruta)).cargar()
+    assert store.obtener(7).stock == 3
+    assert store.next_id == 8
@@ -0,0 +1,177 @@
+"""
+Pruebas del circuit breaker (circuit_breaker.py)
+"""
+import asyncio
+import time
+
+import pytest
+
+from circuit_breaker import ABIERTO, CERRADO, SEMIABIERTO, CircuitBreaker, CircuitoAbiertoError
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def _falla():
+    raise ConnectionError("sin conexión")
+
+
+def _breaker(reloj, **opciones):
+    return CircuitBreaker("prueba", ventana=10, minimo_llamadas=4, espera_abierto=5.0,
+                          llamadas_prueba=2, reloj=reloj, **opciones)
+
+
+def test_se_abre_por_tasa_de_fallos():
+    breaker = _breaker(Reloj(), umbral_fallos=0.5)
+    breaker.llamar(lambda: "ok")
+    breaker.llamar(lambda: "ok")
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.llamar(_falla)
+    assert breaker.estado == ABIERTO
+    assert breaker.historial[-1]["hacia"] == ABIERTO
+
+
+def test_abierto_rechaza_en_microsegundos():
+    breaker = _breaker(Reloj())
+    for _ in range(4):
+        breaker.llamar(lambda: {"success": False}, es_fallo=lambda r: not r["success"])
+    llamado = []
+
+    inicio = time.perf_counter()
+    for _ in range(1000):
+        with pytest.raises(CircuitoAbiertoError):
+            breaker.llamar(llamado.append, 1)
+    por_llamada = (time.perf_counter() - inicio) / 1000
+
+    assert not llamado
+    assert breaker.resumen()["rechazadas"] == 1000
+    assert por_llamada < 1e-3
+
+
+def test_semiabierto_cierra_tras_pruebas_exitosas():
+    reloj = Reloj()
+    breaker = _breaker(reloj)
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            breaker.llamar(_falla)
+
+    reloj.ahora = 5.0
+    assert breaker.estado == SEMIABIERTO
+    breaker.llamar(lambda: "ok")
+    breaker.llamar(lambda: "ok")
+    assert breaker.estado == CERRADO
+    assert [t["hacia"] for t in breaker.historial] == [ABIERTO, SEMIABIERTO, CERRADO]
+
+
+def test_semiabierto_limita_pruebas_y_reabre():
+    reloj = Reloj()
+    breaker = _breaker(reloj)
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            breaker.llamar(_falla)
+
+    reloj.ahora = 5.0
+    primera = breaker.antes_de_llamar()
+    segunda = breaker.antes_de_llamar()
+    with pytest.raises(CircuitoAbiertoError):
+        breaker.antes_de_llamar()  # Solo `llamadas_prueba` en vuelo
+    breaker.registrar(primera, False, 0.01)
+    breaker.registrar(segunda, True, 0.01)
+    assert breaker.estado == ABIERTO
+
+
+def test_se_abre_por_llamadas_lentas():
+    breaker = _breaker(Reloj(), umbral_lentas=0.5, llamada_lenta_s=1.0)
+    for duracion in (0.1, 2.0, 0.1, 3.0):
+        breaker.registrar(breaker.antes_de_llamar(), True, duracion)
+    assert breaker.estado == ABIERTO
+    assert "lentas" in breaker.historial[-1]["motivo"]
+
+
+def test_llamar_async_cuenta_fallos_y_rechaza_abierto():
+    breaker = _breaker(Reloj())
+
+    async def publicar(exito):
+        await asyncio.sleep(0)
+        return {"success": exito}
+
+    async def escenario():
+        resultados = [await breaker.llamar_async(publicar, False, es_fallo=lambda r: not r["success"])
+                      for _ in range(4)]
+        with pytest.raises(CircuitoAbiertoError):
+            await breaker.llamar_async(publicar, True)
+        return resultados
+
+    assert asyncio.run(escenario()) == [{"success": False}] * 4
+    assert breaker.estado == ABIERTO
+    assert breaker.resumen()["fallos"] == 4
+
+
+def test_prueba_cancelada_libera_el_cupo_semiabierto():
+    reloj = Reloj()
+    breaker = _breaker(reloj)
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            breaker.llamar(_falla)
+    reloj.ahora = 5.0
+
+    async def colgada():
+        await asyncio.sleep(10)
+
+    async def ok():
+        return "ok"
+
+    async def escenario():
+        for _ in range(2):  # Ambas pruebas se cancelan (el que llama se cansa de esperar)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(breaker.llamar_async(colgada), timeout=0.01)
+        assert breaker.estado == SEMIABIERTO
+        return [await breaker.llamar_async(ok) for _ in range(2)]
+
+    assert asyncio.run(escenario()) == ["ok", "ok"]
+    assert breaker.estado == CERRADO
+    assert breaker.resumen()["fallos"] == 4  # La cancelación no contó como fallo
+
+
+def test_liberar_no_toca_una_ronda_nueva():
+    reloj = Reloj()
+    breaker = _breaker(reloj)
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            breaker.llamar(_falla)
+    reloj.ahora = 5.0
+    vieja = breaker.antes_de_llamar()
+    otra = breaker.antes_de_llamar()
+    breaker.registrar(vieja, False, 0.01)
+    breaker.registrar(otra, False, 0.01)  # Reabre
+    reloj.ahora = 10.0
+    breaker.antes_de_llamar()
+    breaker.antes_de_llamar()
+    breaker.liberar(vieja)  # Reserva de la ronda anterior: no libera nada
+    with pytest.raises(CircuitoAbiertoError):
+        breaker.antes_de_llamar()
+
+
+def test_resultado_tardio_de_cerrado_no_decide_las_pruebas():
+    reloj = Reloj()
+    breaker = _breaker(reloj)
+    lenta = breaker.antes_de_llamar()  # Admitida en cerrado; su resultado llega mucho después
+    for _ in range(4):
+        with pytest.raises(ConnectionError):
+            breaker.llamar(_falla)
+    reloj.ahora = 5.0
+    primera = breaker.antes_de_llamar()
+    segunda = breaker.antes_de_llamar()
+    breaker.registrar(lenta, False, 0.01)  # Se ignora: no reabre ni ocupa lugar de prueba
+    assert breaker.estado == SEMIABIERTO
+    breaker.registrar(primera, True, 0.01)
+    breaker.registrar(segunda, True, 0.01)
+    assert breaker.estado == CERRADO
+    breaker.registrar(primera, False, 0.01)  # Ni una prueba repetida cae en la ventana nueva
+    assert breaker.resumen()["llamadas_en_ventana"] == 0
@@ -0,0 +1,66 @@
+"""
+Pruebas del inventario con locks en franjas (inventory.py)
+"""
+import threading
+
+import pytest
+
+from catalog_store import CatalogStore
+from inventory import ProductoNoDisponibleError, StockInsuficienteError, StripedInventory
+from models import Product
+
+
+def _inventario(stock=10, franjas=8):
+    store = CatalogStore([
+        Product(id=1, nombre="Manzana", categoria="Frutas", precio=2.5, disponible=True, stock=stock),
+        Product(id=2, nombre="Lechuga", categoria="Verduras", precio=1.8, disponible=False, stock=5),
+    ])
+    return StripedInventory(store, franjas=franjas)
+
+
+def test_descuenta_y_captura_el_estado_de_su_compra():
+    inventario = _inventario(stock=3)
+    primero = inventario.descontar(1, 2)
+    segundo = inventario.descontar(1, 1)
+    assert (primero.stock_restante, primero.disponible) == (1, True)
+    assert (segundo.stock_restante, segundo.disponible) == (0, False)
+    assert inventario.store.contar_disponibles() == 0
+
+
+def test_rechaza_sin_descontar():
+    inventario = _inventario(stock=3)
+    with pytest.raises(StockInsuficienteError) as error:
+        inventario.descontar(1, 4)
+    assert error.value.disponible == 3
+    assert inventario.store.obtener(1).stock == 3
+    with pytest.raises(ProductoNoDisponibleError):
+        inventario.descontar(2, 1)
+    with pytest.raises(KeyError):
+        inventario.descontar(99, 1)
+    assert inventario.metricas()["rechazos"] == 2
+
+
+def test_mil_compras_concurrentes_sin_sobreventa():
+    inventario = _inventario(stock=500)
+    barrera = threading.Barrier(50)
+    vendidas = []
+    rechazadas = []
+
+    def comprador(n):
+        barrera.wait()
+        for _ in range(n):
+            try:
+                vendidas.append(inventario.descontar(1, 1).stock_restante)
+            except (StockInsuficienteError, ProductoNoDisponibleError):
+                rechazadas.append(1)
+
+    hilos = [threading.Thread(target=comprador, args=(20,)) for _ in range(50)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(vendidas) == 500 and len(rechazadas) == 500
+    assert sorted(vendidas) == list(range(500))  # Cada compra vio un stock restante distinto
+    assert inventario.store.obtener(1).stock == 0
+    assert inventario.store.obtener(1).disponible is False
@@ -0,0 +1,343 @@
+"""
+Pruebas del repositorio Postgres con primario/standbys (pg_repository.py)
+Usan un fake en proceso de los pools de asyncpg: cada sentencia fija del
+repositorio se resuelve sobre tablas en memoria compartidas por todos los
+"servidores" (replicación instantánea).
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import pg_repository as pg
+from circuit_breaker import CircuitBreaker
+from inventory import ProductoNoDisponibleError, StockInsuficienteError
+from models import Product
+from pg_repository import PostgresProductRepository
+
+
+class BaseFalsa:
+    """Tablas en memoria: lo que el primario escribe lo ven los standbys"""
+
+    def __init__(self):
+        self.productos = {}
+        self.pedidos = []
+        self.meta = {}
+        self.proximo_id = 1
+        self.lsn = 1000  # Posición WAL del primario: avanza con cada escritura
+
+    def fila(self, p):
+        return tuple(p[c] for c in pg.COLUMNAS)
+
+
+ESCRITURAS = {pg.SQL_INSERTAR_SEMILLA, pg.SQL_CREAR, pg.SQL_ACTUALIZAR, pg.SQL_ELIMINAR, pg.SQL_DESCONTAR,
+              pg.SQL_REGISTRAR_PEDIDO}
+
+
+class ConexionFalsa:
+    def __init__(self, servidor):
+        self.servidor = servidor
+        self.base = servidor.base
+
+    def _resolver(self, sql, args):
+        if self.servidor.caido:
+            raise ConnectionRefusedError(f"{self.servidor.nombre} caído")
+        self.servidor.consultas.append(sql)
+        b = self.base
+        if sql in ESCRITURAS:
+            b.lsn += 100
+        if sql == pg.SQL_LSN_PRIMARIO:
+            return b.lsn
+        if sql == pg.SQL_LSN_REPLAY:
+            return b.lsn - self.servidor.retraso if self.servidor.en_recovery else None
+        if sql in (pg.ESQUEMA, pg.SQL_BLOQUEO_SEMILLA, pg.SQL_AJUSTAR_SECUENCIA):
+            b.proximo_id = max(b.productos, default=0) + 1
+            return None
+        if sql == pg.SQL_SEMBRADO:
+            return 1 if "sembrado" in b.meta else None
+        if sql == pg.SQL_MARCAR_SEMBRADO:
+            b.meta["sembrado"] = args[0]
+            return None
+        if sql == pg.SQL_INSERTAR_SEMILLA:
+            b.productos[args[0]] = dict(zip(pg.COLUMNAS, args))
+            return None
+        if sql == pg.SQL_OBTENER:
+            p = b.productos.get(args[0])
+            return b.fila(p) if p else None
+        if sql == pg.SQL_LISTAR:
+            return [b.fila(b.productos[i]) for i in sorted(b.productos)]
+        if sql == pg.SQL_PAGINA:
+            ids = [i for i in sorted(b.productos) if i > args[0]][:args[1]]
+            return [b.fila(b.productos[i]) for i in ids]
+        if sql == pg.SQL_TOTALES:
+            precios = [p["precio"] for p in b.productos.values()]
+            disponibles = sum(1 for p in b.productos.values() if p["disponible"])
+            return (len(precios), disponibles, sum(precios) / len(precios) if precios else 0)
+        if sql == pg.SQL_POR_CATEGORIA:
+            conteo = {}
+            for p in b.productos.values():
+                conteo[p["categoria"]] = conteo.get(p["categoria"], 0) + 1
+            return list(conteo.items())
+        if sql == pg.SQL_CREAR:
+            p = dict(zip(pg.COLUMNAS, (b.proximo_id, *args)))
+            b.productos[b.proximo_id] = p
+            b.proximo_id += 1
+            return b.fila(p)
+        if sql == pg.SQL_ACTUALIZAR:
+            p = b.productos.get(args[0])
+            if p is None:
+                return None
+            for campo, valor in zip(pg.CAMPOS_ACTUALIZABLES, args[1:]):
+                if valor is not None:
+                    p[campo] = valor
+            return b.fila(p)
+        if sql == pg.SQL_ELIMINAR:
+            p = b.productos.pop(args[0], None)
+            return b.fila(p) if p else None
+        if sql == pg.SQL_DESCONTAR:
+            p = b.productos.get(args[0])
+            if p is None or not p["disponible"] or p["stock"] < args[1]:
+                return None
+            p["stock"] -= args[1]
+            p["disponible"] = p["stock"] > 0
+            return (p["stock"], p["disponible"], p["precio"])
+        if sql == pg.SQL_ESTADO_STOCK:
+            p = b.productos.get(args[0])
+            return (p["stock"], p["disponible"]) if p else None
+        if sql == pg.SQL_REGISTRAR_PEDIDO:
+            b.pedidos.append((len(b.pedidos) + 1, *args, None))
+            return len(b.pedidos)
+        if sql == pg.SQL_PEDIDOS:
+            return [r for r in reversed(b.pedidos) if r[1] == args[0]][:args[1]]
+        raise AssertionError(f"SQL inesperado: {sql}")
+
+    async def execute(self, sql, *args):
+        self._resolver(sql, args)
+
+    async def executemany(self, sql, filas):
+        for args in filas:
+            self._resolver(sql, args)
+
+    async def fetch(self, sql, *args):
+        return self._resolver(sql, args)
+
+    async def fetchrow(self, sql, *args):
+        return self._resolver(sql, args)
+
+    async def fetchval(self, sql, *args):
+        return self._resolver(sql, args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+class ServidorFalso:
+    """
+    Un pool hacia un servidor; `caido` simula el contenedor detenido, `retraso` el lag (bytes de WAL)
+    y `en_recovery = False` un servidor que no es standby (pg_last_wal_replay_lsn() da NULL)
+    """
+
+    def __init__(self, nombre, base):
+        self.nombre = nombre
+        self.base = base
+        self.caido = False
+        self.retraso = 0
+        self.en_recovery = True
+        self.consultas = []
+        self.cerrado = False
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield ConexionFalsa(self)
+
+    async def close(self):
+        self.cerrado = True
+
+
+def _cluster(standbys=2, intervalo_sondeo=None, **opciones):
+    base = BaseFalsa()
+    servidores = {"primario": ServidorFalso("primario", base)}
+    for i in range(1, standbys + 1):
+        servidores[f"standby-{i}"] = ServidorFalso(f"standby-{i}", base)
+
+    async def fabrica_pool(dsn, **_):
+        if servidores[dsn].caido:
+            raise ConnectionRefusedError(dsn)
+        return servidores[dsn]
+
+    repo = PostgresProductRepository(
+        "primario", [f"standby-{i}" for i in range(1, standbys + 1)], fabrica_pool=fabrica_pool,
+        intervalo_sondeo=intervalo_sondeo, **opciones
+    )
+    return repo, servidores
+
+
+def _productos():
+    return [
+        Product(id=1, nombre="Manzana", categoria="Frutas", precio=2.5, disponible=True, stock=3),
+        Product(id=2, nombre="Lechuga", categoria="Verduras", precio=1.8, disponible=False, stock=5),
+    ]
+
+
+def test_escrituras_al_primario_y_lecturas_repartidas_entre_standbys():
+    repo, servidores = _cluster()
+
+    async def escenario():
+        await repo.iniciar(_productos())
+        nuevo = await repo.crear({"nombre": "Palta", "categoria": "Frutas", "precio": 4.5, "stock": 2})
+        await repo.actualizar(nuevo.id, {"precio": 5.0})
+        lecturas = [await repo.obtener(nuevo.id) for _ in range(4)]
+        await repo.cerrar()
+        return nuevo, lecturas
+
+    nuevo, lecturas = asyncio.run(escenario())
+    assert nuevo.id == 3  # La secuencia continúa tras los productos sembrados
+    assert all(p.precio == 5.0 for p in lecturas)
+    escritas = {pg.SQL_CREAR, pg.SQL_ACTUALIZAR}
+    assert escritas <= set(servidores["primario"].consultas)
+    assert pg.SQL_OBTENER not in servidores["primario"].consultas
+    assert servidores["standby-1"].consultas.count(pg.SQL_OBTENER) == 2
+    assert servidores["standby-2"].consultas.count(pg.SQL_OBTENER) == 2
+    assert all(s.cerrado for s in servidores.values())
+
+
+def test_standby_caido_se_salta_y_sin_standbys_lee_el_primario():
+    repo, servidores = _cluster(
+        fabrica_breaker=lambda nombre: CircuitBreaker(nombre, minimo_llamadas=3, espera_abierto=60)
+    )
+
+    async def escenario():
+        await repo.iniciar(_productos())
+        servidores["standby-1"].caido = True
+        parciales = [await repo.obtener(1) for _ in range(6)]
+        servidores["standby-2"].caido = True
+        completos = [await repo.obtener(1) for _ in range(2)]
+        return parciales, completos
+
+    parciales, completos = asyncio.run(escenario())
+    assert all(p.nombre == "Manzana" for p in parciales + completos)  # Ninguna lectura falló
+    metricas = repo.metricas()
+    standby_1, standby_2 = metricas["replicas"]
+    assert standby_1["circuito"] == "abierto" and standby_1["fallos"] == 2
+    assert standby_2["lecturas"] == 6
+    assert metricas["desvios_al_primario"] == 2
+    assert servidores["primario"].consultas.count(pg.SQL_OBTENER) == 2
+
+
+def test_compra_descuenta_y_registra_pedido_en_el_primario():
+    repo, servidores = _cluster()
+
+    async def escenario():
+        await repo.iniciar(_productos())
+        descuentos = [await repo.descontar_stock(1, 2), await repo.descontar_stock(1, 1)]
+        with pytest.raises(ProductoNoDisponibleError):
+            await repo.descontar_stock(1, 1)
+        with pytest.raises(KeyError):
+            await repo.descontar_stock(99, 1)
+        await repo.actualizar(2, {"disponible": True})
+        with pytest.raises(StockInsuficienteError):
+            await repo.descontar_stock(2, 6)
+        return descuentos, await repo.pedidos_de_producto(1)
+
+    descuentos, pedidos = asyncio.run(escenario())
+    assert [(d.stock_restante, d.disponible) for d in descuentos] == [(1, True), (0, False)]
+    assert [(p["cantidad"], p["total"]) for p in pedidos] == [(1, 2.5), (2, 5.0)]
+    assert repo.metricas()["rechazos"] == 2
+    assert pg.SQL_DESCONTAR not in servidores["standby-1"].consultas
+
+
+def test_siembra_una_sola_vez_y_arranca_con_standbys_caidos():
+    repo, servidores = _cluster()
+    llamadas = []
+
+    def semilla():
+        llamadas.append(1)
+        return _productos()
+
+    async def escenario():
+        await repo.iniciar(semilla)
+        await repo.iniciar(semilla)
+        for nombre in ("standby-1", "standby-2"):
+            servidores[nombre].caido = True
+        return await repo.estadisticas()
+
+    estadisticas = asyncio.run(escenario())
+    assert len(llamadas) == 1
+    assert estadisticas["total"] == 2 and estadisticas["por_categoria"] == {"Frutas": 1, "Verduras": 1}
+
+
+def test_read_your_writes_espera_al_standby_que_ya_reprodujo_la_escritura():
+    repo, servidores = _cluster()
+    sesion = pg.SesionLectura()
+
+    async def escenario():
+        await repo.iniciar(_productos())
+        servidores["standby-1"].retraso = 500  # No alcanzará la compra
+        servidores["standby-2"].retraso = 50   # La alcanzará tras el próximo sondeo
+        pg.sesion_actual.set(sesion)
+        await repo.descontar_stock(1, 1)
+        await repo.sondear_replicas()
+        await repo.obtener(1)  # standby-2 ya reprodujo lo previo, pero no la compra: primario
+        servidores["standby-2"].retraso = 0
+        await repo.sondear_replicas()
+        lecturas = [await repo.obtener(1) for _ in range(2)]
+        pg.sesion_actual.set(None)
+        [await repo.obtener(1) for _ in range(2)]  # Sin sesión cualquier standby sano sirve
+        return lecturas
+
+    asyncio.run(escenario())
+    assert sesion.lsn == repo.lsn_primario
+    metricas = repo.metricas()
+    standby_1, standby_2 = metricas["replicas"]
+    assert metricas["lecturas_por_consistencia"] == 1
+    assert standby_2["lecturas"] == 3 and standby_1["lecturas"] == 1
+    assert standby_1["retraso_bytes"] == 500 and standby_2["retraso_bytes"] == 0
+
+
+def test_standby_con_demasiado_retraso_deja_de_recibir_lecturas():
+    repo, servidores = _cluster(max_retraso_bytes=1000)
+
+    async def escenario():
+        await repo.iniciar(_productos())
+        servidores["standby-1"].retraso = 5000
+        await repo.sondear_replicas()
+        [await repo.obtener(1) for _ in range(4)]
+        servidores["standby-1"].retraso = 10
+        await repo.sondear_replicas()
+        [await repo.obtener(1) for _ in range(2)]
+
+    asyncio.run(escenario())
+    standby_1, standby_2 = repo.metricas()["replicas"]
+    assert standby_1["saltos_por_retraso"] == 2  # Cada vez que el round-robin empezó por él
+    assert standby_2["lecturas"] == 5 and standby_1["lecturas"] == 1
+
+
+def test_sondeo_en_segundo_plano_se_detiene_al_cerrar():
+    repo, servidores = _cluster(intervalo_sondeo=0.01)
+
+    async def escenario():
+        await repo.iniciar(_productos())
+        servidores["standby-2"].retraso = 70
+        await asyncio.sleep(0.05)
+        await repo.cerrar()
+        return repo.metricas()["replicas"][1]["retraso_bytes"]
+
+    assert asyncio.run(escenario()) == 70
+
+
+def test_standby_fuera_de_recovery_queda_sin_medicion_y_no_frena_el_sondeo():
+    repo, servidores = _cluster(standbys=3)
+    servidores["standby-1"].en_recovery = False  # Apunta a un primario: el LSN de replay es NULL
+
+    async def escenario():
+        await repo.iniciar(_productos())  # No debe fallar por el NULL
+        servidores["standby-3"].retraso = 40
+        await repo.sondear_replicas()
+        [await repo.obtener(1) for _ in range(4)]
+
+    asyncio.run(escenario())
+    standby_1, standby_2, standby_3 = repo.metricas()["replicas"]
+    assert standby_1["replay_lsn"] is None and standby_1["retraso_bytes"] is None
+    assert standby_1["lecturas"] == 0  # Sin medición válida no recibe lecturas
+    assert standby_2["retraso_bytes"] == 0 and standby_3["retraso_bytes"] == 40
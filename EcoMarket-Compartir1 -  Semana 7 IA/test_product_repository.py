@@ -0,0 +1,212 @@
+"""
+Pruebas del repositorio de productos (product_repository.py)
+"""
+import asyncio
+import multiprocessing
+
+import pytest
+
+from catalog_wal import CatalogWAL
+from inventory import ProductoNoDisponibleError, StockInsuficienteError
+from models import Product
+from product_repository import InMemoryProductRepository, SQLiteProductRepository
+
+
+def _productos(stock=10):
+    return [
+        Product(id=1, nombre="Manzana", categoria="Frutas", precio=2.5, disponible=True, stock=stock),
+        Product(id=2, nombre="Lechuga", categoria="Verduras", precio=1.8, disponible=False, stock=5),
+    ]
+
+
+def test_sqlite_crud_y_estadisticas(tmp_path):
+    async def escenario():
+        repo = SQLiteProductRepository(str(tmp_path / "catalogo.db"))
+        await repo.iniciar(_productos())
+        nuevo = await repo.crear({"nombre": "Palta", "categoria": "Frutas", "precio": 4.5, "stock": 3})
+        actualizado = await repo.actualizar(1, {"precio": 3.0})
+        eliminado = await repo.eliminar(2)
+        resultado = (nuevo, actualizado, eliminado, await repo.listar(), await repo.estadisticas(),
+                     await repo.actualizar(99, {"precio": 1.0}))
+        await repo.cerrar()
+        return resultado
+
+    nuevo, actualizado, eliminado, productos, estadisticas, inexistente = asyncio.run(escenario())
+    assert nuevo.id == 3 and nuevo.disponible is True
+    assert actualizado.precio == 3.0
+    assert eliminado.nombre == "Lechuga"
+    assert [p.id for p in productos] == [1, 3]
+    assert estadisticas["total"] == 2 and estadisticas["por_categoria"] == {"Frutas": 2}
+    assert inexistente is None
+
+
+def test_sqlite_siembra_una_sola_vez(tmp_path):
+    ruta = str(tmp_path / "catalogo.db")
+
+    async def arrancar():
+        repo = SQLiteProductRepository(ruta)
+        await repo.iniciar(_productos())
+        productos = await repo.listar()
+        await repo.cerrar()
+        return productos
+
+    asyncio.run(arrancar())
+    assert len(asyncio.run(arrancar())) == 2  # El segundo arranque no duplica el catálogo
+
+
+def test_sqlite_descuento_atomico_y_rechazos(tmp_path):
+    async def escenario():
+        repo = SQLiteProductRepository(str(tmp_path / "catalogo.db"))
+        await repo.iniciar(_productos(stock=3))
+        descuentos = [await repo.descontar_stock(1, 2), await repo.descontar_stock(1, 1)]
+        errores = []
+        for producto_id, cantidad in ((1, 1), (2, 1), (99, 1)):
+            try:
+                await repo.descontar_stock(producto_id, cantidad)
+            except (KeyError, ProductoNoDisponibleError, StockInsuficienteError) as e:
+                errores.append(type(e))
+        metricas = repo.metricas()
+        await repo.cerrar()
+        return descuentos, errores, metricas
+
+    descuentos, errores, metricas = asyncio.run(escenario())
+    assert [(d.stock_restante, d.disponible) for d in descuentos] == [(1, True), (0, False)]
+    # Agotado: queda no disponible, así que la tercera compra se rechaza por eso
+    assert errores == [ProductoNoDisponibleError, ProductoNoDisponibleError, KeyError]
+    assert metricas["descuentos"] == 2 and metricas["rechazos"] == 2
+
+
+def test_memoria_persiste_en_el_wal(tmp_path):
+    ruta = str(tmp_path / "productos_data.json")
+
+    async def escenario():
+        repo = InMemoryProductRepository(CatalogWAL(ruta, ventana_ms=0))
+        await repo.iniciar(_productos(stock=5))
+        await repo.descontar_stock(1, 2)
+        with pytest.raises(StockInsuficienteError):
+            await repo.descontar_stock(1, 4)
+        await repo.cerrar()
+
+        reabierto = InMemoryProductRepository(CatalogWAL(ruta, ventana_ms=0))
+        await reabierto.iniciar([])
+        producto = await reabierto.obtener(1)
+        await reabierto.cerrar()
+        return producto
+
+    assert asyncio.run(escenario()).stock == 3
+
+
+def test_memoria_no_siembra_sobre_un_snapshot_corrupto(tmp_path):
+    ruta = str(tmp_path / "productos_data.json")
+
+    async def escenario():
+        repo = InMemoryProductRepository(CatalogWAL(ruta, ventana_ms=0))
+        await repo.iniciar(_productos(stock=5))
+        await repo.descontar_stock(1, 2)
+        repo.wal.cerrar()  # Sin el snapshot del cierre: la compra solo está en el log
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write('{"lsn": 1, "productos": [')
+
+        with pytest.raises(ValueError):
+            await InMemoryProductRepository(CatalogWAL(ruta, ventana_ms=0)).iniciar(_productos(stock=5))
+        return repo.wal.log_path
+
+    log = asyncio.run(escenario())
+    with open(log, encoding="utf-8") as f:
+        assert '"op":"stock"' in f.read()  # La mutación confirmada sigue en disco
+def test_paginacion_por_cursor_en_ambos_backends(tmp_path):
+    productos = [Product(id=i, nombre=f"SKU {i}", categoria="Frutas", precio=1.0, disponible=True, stock=1)
+                 for i in range(1, 26)]
+
+    async def recorrer(repo):
+        await repo.iniciar(productos)
+        await repo.eliminar(7)
+        paginas, cursor = [], 0
+        while True:
+            pagina = await repo.listar_pagina(despues_de=cursor, limite=10)
+            if not pagina:
+                break
+            paginas.append([p.id for p in pagina])
+            cursor = pagina[-1].id
+        await repo.cerrar()
+        return paginas
+
+    esperado = [i for i in range(1, 26) if i != 7]
+    for repo in (SQLiteProductRepository(str(tmp_path / "catalogo.db")),
+                 InMemoryProductRepository(CatalogWAL(str(tmp_path / "productos_data.json"), ventana_ms=0))):
+        paginas = asyncio.run(recorrer(repo))
+        assert [len(p) for p in paginas] == [10, 10, 4]
+        assert sum(paginas, []) == esperado
+
+
+def test_semilla_perezosa_solo_en_el_primer_arranque(tmp_path):
+    ruta = str(tmp_path / "catalogo.db")
+    llamadas = []
+
+    def semilla():
+        llamadas.append(1)
+        return _productos()
+
+    async def arrancar():
+        repo = SQLiteProductRepository(ruta)
+        await repo.iniciar(semilla)
+        total = (await repo.estadisticas())["total"]
+        await repo.cerrar()
+        return total
+
+    assert asyncio.run(arrancar()) == 2
+    assert asyncio.run(arrancar()) == 2
+    assert len(llamadas) == 1  # El segundo arranque ni siquiera construye los productos
+
+
+def _instancia(ruta, compras, inicio, resultados):
+    """Una "instancia de la API" en otro proceso: su propio repositorio sobre el mismo archivo"""
+    async def comprar():
+        repo = SQLiteProductRepository(ruta, hilos=4)
+        await repo.iniciar([])
+        inicio.wait()
+
+        async def una():
+            try:
+                await repo.descontar_stock(1, 1)
+                return 1
+            except (StockInsuficienteError, ProductoNoDisponibleError):
+                return 0
+
+        vendidas = sum(await asyncio.gather(*(una() for _ in range(compras))))
+        await repo.cerrar()
+        return vendidas
+
+    resultados.put(asyncio.run(comprar()))
+
+
+def test_dos_procesos_comparten_el_stock_sin_sobreventa(tmp_path):
+    ruta = str(tmp_path / "catalogo.db")
+
+    async def sembrar():
+        repo = SQLiteProductRepository(ruta)
+        await repo.iniciar(_productos(stock=100))
+        await repo.cerrar()
+
+    asyncio.run(sembrar())
+
+    contexto = multiprocessing.get_context("spawn")
+    inicio = contexto.Event()
+    resultados = contexto.Queue()
+    procesos = [contexto.Process(target=_instancia, args=(ruta, 80, inicio, resultados)) for _ in range(2)]
+    for proceso in procesos:
+        proceso.start()
+    inicio.set()
+    vendidas = [resultados.get(timeout=60) for _ in procesos]
+    for proceso in procesos:
+        proceso.join(timeout=10)
+
+    async def final():
+        repo = SQLiteProductRepository(ruta)
+        producto = await repo.obtener(1)
+        await repo.cerrar()
+        return producto
+
+    producto = asyncio.run(final())
+    assert sum(vendidas) == 100  # 160 intentos entre dos procesos, exactamente el stock vendido
+    assert producto.stock == 0 and producto.disponible is False
@@ -0,0 +1,159 @@
+"""
+Pruebas del motor de reintentos asíncrono (retry_engine.py)
+"""
+import asyncio
+import random
+
+from retry_engine import (
+    ExponentialBackoffPolicy,
+    FixedDelayPolicy,
+    RetryBudget,
+    ScheduledDelayPolicy,
+    construir_politica,
+    ejecutar_con_reintentos,
+)
+
+
+class RelojFalso:
+    """Registra las esperas sin dormir de verdad y avanza un reloj monotónico simulado"""
+
+    def __init__(self):
+        self.esperas = []
+        self.ahora = 0.0
+
+    async def __call__(self, segundos):
+        self.esperas.append(segundos)
+        self.ahora += segundos
+
+    def reloj(self):
+        return self.ahora
+
+
+def _falla_hasta(intento_exitoso):
+    def operacion(intento):
+        if intento < intento_exitoso:
+            raise ConnectionError("sin red")
+        return intento
+    return operacion
+
+
+def test_politicas_de_espera():
+    assert [FixedDelayPolicy(4, 1.0).espera_antes(i) for i in range(1, 5)] == [0, 1, 1, 1]
+    backoff = ExponentialBackoffPolicy(max_intentos=5, base=0.5, maximo=2.0)
+    assert [backoff.espera_antes(i) for i in range(1, 6)] == [0, 0.5, 1, 2, 2]
+    assert [ScheduledDelayPolicy().espera_antes(i) for i in range(1, 6)] == [1, 2, 4, 8, 16]
+
+
+def test_exito_tras_reintentos():
+    reloj = RelojFalso()
+    resultado = asyncio.run(ejecutar_con_reintentos(
+        _falla_hasta(3), ExponentialBackoffPolicy(max_intentos=5), dormir=reloj))
+    assert resultado.exito and resultado.valor == 3
+    assert reloj.esperas == [0.5, 1.0]
+    assert resultado.errores == ["Intento 1: sin red", "Intento 2: sin red"]
+
+
+def test_agota_intentos_con_descriptor():
+    reloj = RelojFalso()
+    resultado = asyncio.run(ejecutar_con_reintentos(
+        _falla_hasta(99), ScheduledDelayPolicy([1, 2, 4]),
+        describir_error=lambda i, e, espera: f"{i}:{type(e).__name__}:{espera}", dormir=reloj))
+    assert not resultado.exito and resultado.intento == 3
+    assert resultado.errores == ["1:ConnectionError:1", "2:ConnectionError:2", "3:ConnectionError:4"]
+    assert resultado.tiempo_total_esperas == 7
+
+
+def test_operacion_async():
+    async def operacion(intento):
+        await asyncio.sleep(0)
+        return "ok"
+
+    resultado = asyncio.run(ejecutar_con_reintentos(operacion, FixedDelayPolicy(2), dormir=RelojFalso()))
+    assert resultado.valor == "ok" and resultado.intento == 1
+
+
+def test_esperas_no_bloquean_el_event_loop():
+    async def escenario():
+        politica = FixedDelayPolicy(max_intentos=2, espera=0.2)
+        tareas = [ejecutar_con_reintentos(_falla_hasta(2), politica) for _ in range(50)]
+        inicio = asyncio.get_running_loop().time()
+        await asyncio.gather(*tareas)
+        return asyncio.get_running_loop().time() - inicio
+
+    # 50 compras esperando 0.2 s cada una terminan en ~0.2 s, no en 10 s
+    assert asyncio.run(escenario()) < 1.0
+
+
+def test_jitter_completo_y_decorrelacionado():
+    completo = ExponentialBackoffPolicy(max_intentos=5, base=0.5, maximo=2.0, jitter="completo",
+                                        rng=random.Random(1))
+    for intento in range(2, 6):
+        assert 0 <= completo.calcular_espera(intento, 0) <= completo.espera_antes(intento)
+
+    decorrelacionado = ScheduledDelayPolicy([1, 2, 4, 8, 16], jitter="decorrelacionado", rng=random.Random(1))
+    previa = 0.0
+    for intento in range(1, 6):
+        espera = decorrelacionado.calcular_espera(intento, previa)
+        assert 1 <= espera <= min(16, max(1, previa * 3))
+        previa = espera
+
+
+def test_plazo_total_corta_los_reintentos():
+    reloj = RelojFalso()
+    politica = FixedDelayPolicy(max_intentos=10, espera=1.0, plazo_total=3.5)
+    resultado = asyncio.run(ejecutar_con_reintentos(_falla_hasta(99), politica, dormir=reloj, reloj=reloj.reloj))
+    assert not resultado.exito and resultado.motivo == "plazo"
+    assert resultado.intento == 4 and reloj.ahora <= 3.5
+
+
+def test_error_no_reintentable():
+    def operacion(intento):
+        raise ValueError("cantidad inválida")
+
+    resultado = asyncio.run(ejecutar_con_reintentos(operacion, FixedDelayPolicy(4), dormir=RelojFalso()))
+    assert resultado.intento == 1 and resultado.motivo == "no_reintentable"
+
+
+def test_presupuesto_compartido_limita_reintentos():
+    reloj = RelojFalso()
+    presupuesto = RetryBudget(proporcion=0.5, minimo_por_segundo=0, capacidad=1, reloj=reloj.reloj)
+    politica = FixedDelayPolicy(max_intentos=3, espera=0.0, presupuesto=presupuesto)
+
+    async def escenario():
+        return [await ejecutar_con_reintentos(_falla_hasta(99), politica, dormir=reloj, reloj=reloj.reloj)
+                for _ in range(10)]
+
+    resultados = asyncio.run(escenario())
+    # Sin presupuesto serían 20 reintentos; con 50% del tráfico quedan 5 para 10 peticiones
+    assert sum(r.intento - 1 for r in resultados) == 5
+    assert all(r.motivo == "presupuesto" for r in resultados)
+    assert presupuesto.resumen()["reintentos_denegados"] == 10
+
+
+def test_politica_declarativa_y_metricas():
+    politica = construir_politica("demo", {"tipo": "exponencial", "max_intentos": 3, "base": 0.1,
+                                           "jitter": "completo", "plazo_total": 5})
+    assert isinstance(politica, ExponentialBackoffPolicy) and politica.nombre == "demo"
+
+    reloj = RelojFalso()
+    asyncio.run(ejecutar_con_reintentos(_falla_hasta(2), politica, dormir=reloj, reloj=reloj.reloj))
+    asyncio.run(ejecutar_con_reintentos(_falla_hasta(9), politica, dormir=reloj, reloj=reloj.reloj))
+    metricas = politica.metricas.resumen()
+    assert metricas["ejecuciones"] == 2 and metricas["intentos"] == 5
+    assert metricas["motivos"] == {"exito": 1, "agotado": 1}
+
+
+def test_metricas_cuentan_las_ejecuciones_en_backoff():
+    politica = FixedDelayPolicy(max_intentos=2, espera=0.05)
+
+    async def escenario():
+        resultados = asyncio.gather(*(ejecutar_con_reintentos(_falla_hasta(2), politica) for _ in range(20)))
+        await asyncio.sleep(0.02)
+        en_espera = politica.metricas.resumen()["en_espera"]
+        await resultados
+        return en_espera
+
+    assert asyncio.run(escenario()) == 20  # Las 20 esperan a la vez, sin bloquearse entre ellas
+    metricas = politica.metricas.resumen()
+    assert metricas["max_en_espera"] == 20 and metricas["en_espera"] == 0
+
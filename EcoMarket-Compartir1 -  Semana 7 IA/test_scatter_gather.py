@@ -0,0 +1,200 @@
+"""
+Pruebas del ejecutor scatter-gather (scatter_gather.py)
+"""
+import asyncio
+import sqlite3
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from scatter_gather import (
+    ConsultaDistribuida, DBAPIShard, FuenteShard, ResultadoParcialError, ScatterGatherExecutor,
+)
+from shard_router import ConsistentHashRouter, RangeShardRouter, ShardConfig
+
+
+def _shards_sqlite(tmp_path, n=3, usuarios=300):
+    """n archivos SQLite como shards; los usuarios se reparten con el router"""
+    router = ConsistentHashRouter([ShardConfig(i, f"postgres-{i}", 5432, "ecomarket") for i in range(1, n + 1)])
+    filas = [(f"user{i:04d}", f"Usuario {i}", ("Norte", "Sur", "Centro")[i % 3], i % 50 if i % 7 else None)
+             for i in range(usuarios)]
+    fuentes = {}
+    for shard_id in range(1, n + 1):
+        ruta = str(tmp_path / f"shard{shard_id}.db")
+        with sqlite3.connect(ruta) as conexion:
+            conexion.execute("CREATE TABLE usuarios (user_id TEXT PRIMARY KEY, nombre TEXT, region TEXT, puntos INTEGER)")
+            conexion.executemany("INSERT INTO usuarios VALUES (?, ?, ?, ?)",
+                                 [f for f in filas if router.get_shard(f[0]).shard_id == shard_id])
+        fuentes[shard_id] = DBAPIShard(lambda ruta=ruta: sqlite3.connect(ruta, check_same_thread=False))
+    return router, fuentes, filas
+
+
+class FuenteFalsa(FuenteShard):
+    """Filas en memoria con demora por fila y falla opcional después de `falla_tras` filas"""
+
+    def __init__(self, filas, demora=0.0, falla_tras=None, primera_demora=0.0):
+        self._filas = filas
+        self.demora = demora
+        self.primera_demora = primera_demora
+        self.falla_tras = falla_tras
+        self.sql = []
+        self.entregadas = 0
+
+    async def filas(self, sql, params=()):
+        self.sql.append(sql)
+        await asyncio.sleep(self.primera_demora)
+        for i, fila in enumerate(self._filas):
+            if self.falla_tras is not None and i == self.falla_tras:
+                raise ConnectionError("shard caído")
+            await asyncio.sleep(self.demora)
+            self.entregadas += 1
+            yield fila
+
+
+def test_orden_y_limite_empujados_con_merge(tmp_path):
+    _, fuentes, filas = _shards_sqlite(tmp_path)
+    ejecutor = ScatterGatherExecutor(fuentes)
+    consulta = ConsultaDistribuida("usuarios", ("user_id", "puntos"), order_by=["puntos DESC", "user_id"],
+                                   limit=25, offset=30)
+    assert consulta.sql_shard() == ("SELECT user_id, puntos FROM usuarios "
+                                    "ORDER BY puntos DESC NULLS FIRST, user_id ASC NULLS LAST LIMIT 55")
+
+    resultado = asyncio.run(ejecutor.consultar(consulta))
+    # Referencia: el sort completo en memoria (NULL primero en DESC, como en Postgres)
+    esperado = sorted(filas, key=lambda f: f[0])
+    esperado = sorted(esperado, key=lambda f: (f[3] is None, f[3] or 0), reverse=True)
+    assert [f["user_id"] for f in resultado.filas] == [f[0] for f in esperado[30:55]]
+    assert resultado.filas[0]["puntos"] is None and resultado.filas[-1]["puntos"] is not None
+    assert resultado.completo and all(n <= 55 for n in resultado.por_shard.values())
+
+
+def test_stream_sin_orden_y_shard_keys(tmp_path):
+    router, fuentes, filas = _shards_sqlite(tmp_path)
+    ejecutor = ScatterGatherExecutor(fuentes, router=router)
+
+    async def leer(**opciones):
+        flujo = ejecutor.stream(ConsultaDistribuida("usuarios", ("user_id",), where="region = ?",
+                                                    params=("Sur",)), **opciones)
+        return sorted([fila["user_id"] async for fila in flujo]), flujo
+
+    todos, _ = asyncio.run(leer())
+    assert todos == sorted(f[0] for f in filas if f[2] == "Sur")
+
+    keys = ["user0001", "user0004"]
+    parciales, flujo = asyncio.run(leer(shard_keys=keys))
+    assert flujo.destinos == sorted({router.get_shard(k).shard_id for k in keys})
+    assert set(parciales) <= set(todos) and {"user0001", "user0004"} <= set(parciales)
+
+
+def test_shard_range_solo_consulta_los_shards_del_intervalo():
+    router = RangeShardRouter([ShardConfig(i, f"postgres-{i}", 5432, "ecomarket") for i in (1, 2, 3)],
+                              limites=["2025-05-01", "2025-09-01"])
+    ordenes = {i: [] for i in (1, 2, 3)}
+    for dia in range(1, 366, 5):
+        fecha = f"{date(2025, 1, 1) + timedelta(days=dia - 1)}"
+        ordenes[router.get_shard(fecha).shard_id].append({"created_at": fecha})
+    fuentes = {i: FuenteFalsa(filas) for i, filas in ordenes.items()}
+    ejecutor = ScatterGatherExecutor(fuentes, router=router)
+
+    consulta = ConsultaDistribuida("orders", ("created_at",), where="created_at >= ? AND created_at < ?",
+                                   params=("2025-06-01", "2025-07-01"), order_by=["created_at"])
+    resultado = asyncio.run(ejecutor.consultar(consulta, shard_range=("2025-06-01", "2025-07-01")))
+    assert list(resultado.por_shard) == [2]
+    assert fuentes[1].sql == [] and fuentes[3].sql == []
+    assert ejecutor.stream(consulta, shard_range=("2025-04-15", "2025-09-15")).destinos == [1, 2, 3]
+    assert ejecutor.stream(consulta, shard_keys=["2025-01-02"], shard_range=("2025-10-01", None)).destinos == [1, 3]
+    with pytest.raises(ValueError):
+        ScatterGatherExecutor(fuentes, router=ConsistentHashRouter(list(router.shards.values()))).stream(
+            consulta, shard_range=("2025-06-01", "2025-07-01"))
+
+
+def test_agregados_parciales(tmp_path):
+    _, fuentes, filas = _shards_sqlite(tmp_path)
+    ejecutor = ScatterGatherExecutor(fuentes)
+    agregados = {"total": ("COUNT", "*"), "suma": ("SUM", "puntos"), "promedio": ("AVG", "puntos"),
+                 "minimo": ("MIN", "user_id"), "maximo": ("MAX", "puntos")}
+
+    resultado = asyncio.run(ejecutor.agregar("usuarios", agregados, group_by=["region"]))
+    for fila in resultado.filas:
+        grupo = [f for f in filas if f[2] == fila["region"]]
+        puntos = [f[3] for f in grupo if f[3] is not None]
+        assert fila["total"] == len(grupo) and fila["suma"] == sum(puntos)
+        assert fila["promedio"] == pytest.approx(sum(puntos) / len(puntos))  # No es el promedio de promedios
+        assert fila["minimo"] == min(f[0] for f in grupo) and fila["maximo"] == max(puntos)
+    assert [f["region"] for f in resultado.filas] == ["Centro", "Norte", "Sur"]
+    # Cada shard devolvió una fila por región, no sus usuarios
+    assert all(len(parcial) == 3 for parcial in resultado.parciales.values())
+
+    vacio = asyncio.run(ejecutor.agregar("usuarios", {"total": ("COUNT", "*"), "promedio": ("AVG", "puntos")},
+                                         where="puntos > ?", params=(1000,)))
+    assert vacio.filas == [{"total": 0, "promedio": None}]
+
+
+def test_shards_en_paralelo():
+    fuentes = {i: FuenteFalsa([{"id": i}], primera_demora=0.2) for i in range(1, 5)}
+    inicio = time.perf_counter()
+    resultado = asyncio.run(ScatterGatherExecutor(fuentes).consultar(ConsultaDistribuida("t", order_by=["id"])))
+    assert [f["id"] for f in resultado.filas] == [1, 2, 3, 4]
+    assert time.perf_counter() - inicio < 0.5  # 4 shards de 0,2 s: en serie serían 0,8 s
+
+
+def test_timeout_y_politicas_de_resultado_parcial():
+    def fuentes():
+        return {
+            1: FuenteFalsa([{"id": i} for i in range(0, 10, 2)]),
+            2: FuenteFalsa([{"id": i} for i in range(1, 10, 2)], primera_demora=1.0),  # Vence
+            3: FuenteFalsa([{"id": i} for i in range(100, 110)], falla_tras=3),  # Se cae a mitad
+        }
+
+    consulta = ConsultaDistribuida("t", order_by=["id"])
+    with pytest.raises(ResultadoParcialError) as error:
+        asyncio.run(ScatterGatherExecutor(fuentes(), timeout_shard=0.1).consultar(consulta))
+    assert set(error.value.fallidos) <= {2, 3} and error.value.fallidos
+
+    ejecutor = ScatterGatherExecutor(fuentes(), timeout_shard=0.1, politica="parcial")
+    resultado = asyncio.run(ejecutor.consultar(consulta))
+    assert [f["id"] for f in resultado.filas] == [0, 2, 4, 6, 8, 100, 101, 102]
+    assert resultado.fallidos[2] == "timeout" and "shard caído" in resultado.fallidos[3]
+    assert not resultado.completo and ejecutor.metricas()["fallos_por_shard"] == {2: 1, 3: 1}
+
+    with pytest.raises(ResultadoParcialError):
+        asyncio.run(ScatterGatherExecutor(fuentes(), timeout_shard=0.1, politica="parcial",
+                                          min_shards=2).consultar(consulta))
+
+    # Aunque el limit se complete con el shard sano, min_shards sigue valiendo
+    caidos = {1: FuenteFalsa([{"id": i} for i in range(10)]),
+              2: FuenteFalsa([{"id": 1}], falla_tras=0), 3: FuenteFalsa([{"id": 2}], falla_tras=0)}
+    with pytest.raises(ResultadoParcialError) as error:
+        asyncio.run(ScatterGatherExecutor(caidos, politica="parcial", min_shards=2).consultar(
+            ConsultaDistribuida("t", order_by=["id"], limit=3)))
+    assert set(error.value.fallidos) == {2, 3}
+
+
+def test_limite_corta_el_stream_sin_leer_todo():
+    grande = FuenteFalsa([{"id": i} for i in range(0, 100000, 2)])
+    ejecutor = ScatterGatherExecutor({1: grande, 2: FuenteFalsa([{"id": 1}, {"id": 3}])}, prefetch=8)
+    resultado = asyncio.run(ejecutor.consultar(ConsultaDistribuida("t", order_by=["id"], limit=5)))
+    assert [f["id"] for f in resultado.filas] == [0, 1, 2, 3, 4]
+    assert grande.entregadas < 50  # Backpressure: el shard grande no se leyó completo
+    with pytest.raises(ValueError):
+        ConsultaDistribuida("t; DROP TABLE t", order_by=["id"]).sql_shard()
+
+
+def test_timeout_con_driver_sincrono_no_bloquea(tmp_path):
+    ruta = str(tmp_path / "lento.db")
+
+    def conectar():
+        conexion = sqlite3.connect(ruta, check_same_thread=False)
+        conexion.create_function("dormir", 1, lambda s: time.sleep(s) or 1)
+        return conexion
+
+    with sqlite3.connect(ruta) as conexion:
+        conexion.execute("CREATE TABLE t (id INTEGER)")
+        conexion.execute("INSERT INTO t VALUES (1)")
+    ejecutor = ScatterGatherExecutor({1: DBAPIShard(conectar), 2: FuenteFalsa([{"id": 7}])},
+                                     timeout_shard=0.1, politica="parcial")
+    inicio = time.perf_counter()
+    resultado = asyncio.run(ejecutor.consultar(ConsultaDistribuida("t", ("id",), where="dormir(0.5) = 1")))
+    assert resultado.filas == [{"id": 7}] and resultado.fallidos == {1: "timeout"}
+    assert time.perf_counter() - inicio < 0.45
@@ -0,0 +1,147 @@
+"""
+Pruebas de la migración en línea de shards (shard_migration.py)
+Archivos SQLite hacen de los shards postgres-*
+"""
+import asyncio
+import random
+import sqlite3
+import time
+
+import pytest
+
+from shard_migration import CAMBIADA, LIMPIA, Limitador, MigracionError, MigracionShards, TablaShard
+from shard_router import ConsistentHashRouter, ShardConfig
+
+
+def _shards(n):
+    return [ShardConfig(i, f"postgres-{i}", 5432, "ecomarket") for i in range(1, n + 1)]
+
+
+def _topologia_sqlite(tmp_path, n=3, total=4, usuarios=600):
+    """n shards con datos repartidos por el router y `total - n` shards nuevos vacíos"""
+    router = ConsistentHashRouter(_shards(n))
+    filas = {f"user{i:04d}": {"user_id": f"user{i:04d}", "nombre": f"Usuario {i}", "puntos": i % 50}
+             for i in range(usuarios)}
+    tablas = {}
+    for shard_id in range(1, total + 1):
+        ruta = str(tmp_path / f"postgres-{shard_id}.db")
+        with sqlite3.connect(ruta) as conexion:
+            conexion.execute("CREATE TABLE usuarios (user_id TEXT PRIMARY KEY, nombre TEXT, puntos INTEGER)")
+            conexion.executemany("INSERT INTO usuarios VALUES (:user_id, :nombre, :puntos)",
+                                 [f for f in filas.values() if shard_id <= n
+                                  and router.get_shard(f["user_id"]).shard_id == shard_id])
+        tablas[shard_id] = TablaShard(lambda ruta=ruta: sqlite3.connect(ruta, check_same_thread=False),
+                                      "usuarios", "user_id", ["user_id", "nombre", "puntos"])
+    return router, tablas, filas
+
+
+def _contenido(tmp_path, shard_id):
+    with sqlite3.connect(str(tmp_path / f"postgres-{shard_id}.db")) as conexion:
+        return {fila[0]: fila for fila in conexion.execute("SELECT user_id, nombre, puntos FROM usuarios")}
+
+
+def test_migracion_completa_al_agregar_un_shard(tmp_path):
+    router, tablas, filas = _topologia_sqlite(tmp_path)
+    migracion = MigracionShards(router, _shards(4), tablas, tamano_lote=64)
+
+    async def correr():
+        progreso = await migracion.ejecutar()
+        leidas = {clave: await migracion.leer(clave) for clave in filas}
+        return progreso, leidas
+
+    progreso, leidas = asyncio.run(correr())
+    assert progreso["fase"] == LIMPIA and not progreso["rangos_con_diferencias"]
+    assert leidas == filas and migracion.router is migracion.router_nuevo
+
+    # Cada fila vive solo en su dueño nuevo; el shard 4 recibió ~1/4 del total
+    for shard_id in range(1, 5):
+        claves = set(_contenido(tmp_path, shard_id))
+        assert claves == {c for c in filas if migracion.router_nuevo.get_shard(c).shard_id == shard_id}
+    assert progreso["filas_copiadas"] == len(_contenido(tmp_path, 4)) == progreso["borradas_origen"]
+    assert 0.15 < progreso["filas_copiadas"] / len(filas) < 0.35
+    assert all(rango.destino == 4 for rango in migracion.plan)
+
+
+def test_doble_escritura_con_trafico_concurrente(tmp_path):
+    router, tablas, filas = _topologia_sqlite(tmp_path)
+    migracion = MigracionShards(router, _shards(4), tablas, tamano_lote=32, filas_por_segundo=20000)
+    esperado = dict(filas)
+    azar = random.Random(7)
+
+    async def trafico(terminado):
+        i = 0
+        while not terminado.is_set():
+            clave = f"user{azar.randrange(700):04d}"
+            if azar.random() < 0.2 and clave in esperado:
+                await migracion.eliminar(clave)
+                esperado.pop(clave)
+            else:
+                fila = {"user_id": clave, "nombre": f"Editado {i}", "puntos": i}
+                await migracion.escribir(fila)
+                esperado[clave] = fila
+            i += 1
+            await asyncio.sleep(0)
+
+    async def correr():
+        terminado = asyncio.Event()
+        escritor = asyncio.create_task(trafico(terminado))
+        progreso = await migracion.ejecutar(limpiar=False)
+        assert migracion.fase == CAMBIADA
+        await asyncio.sleep(0.01)  # Escrituras después del cambio: van solo al dueño nuevo
+        terminado.set()
+        await escritor
+        await migracion.limpiar()
+        return progreso, {clave: await migracion.leer(clave) for clave in list(esperado) + ["user0699"]}
+
+    progreso, leidas = asyncio.run(correr())
+    assert progreso["escrituras_dobles"] > 0 and not progreso["rangos_con_diferencias"]
+    assert {c: f for c, f in leidas.items() if f is not None} == esperado
+    total = sum(len(_contenido(tmp_path, shard_id)) for shard_id in range(1, 5))
+    assert total == len(esperado)  # Sin duplicados ni filas resucitadas
+
+
+def test_verificacion_detecta_diferencias_y_bloquea_el_cambio(tmp_path):
+    router, tablas, filas = _topologia_sqlite(tmp_path)
+    migracion = MigracionShards(router, _shards(4), tablas, tamano_lote=100)
+
+    # Una key que no está en el origen pero cae en un rango que se mueve al shard 4
+    sobrante = next(f"extra{i}" for i in range(1000) if migracion._rango(f"extra{i}") is not None)
+
+    def corromper():
+        copiadas = sorted(_contenido(tmp_path, 4))
+        with sqlite3.connect(str(tmp_path / "postgres-4.db")) as conexion:
+            conexion.execute("DELETE FROM usuarios WHERE user_id = ?", (copiadas[0],))
+            conexion.execute("UPDATE usuarios SET puntos = -1 WHERE user_id = ?", (copiadas[1],))
+            conexion.execute("INSERT INTO usuarios VALUES (?, 'x', 0)", (sobrante,))
+        return copiadas[:2]
+
+    async def correr():
+        await migracion.backfill()
+        danadas = corromper()
+        verificacion = await migracion.verificar()
+        with pytest.raises(MigracionError):
+            await migracion.cambiar_ruteo()
+        antes = {clave: await migracion.leer(clave) for clave in danadas}  # Aún se lee del origen
+        progreso = await migracion.ejecutar()  # Recopia los rangos con diferencias
+        return verificacion, antes, progreso, {clave: await migracion.leer(clave) for clave in filas}
+
+    verificacion, antes, progreso, leidas = asyncio.run(correr())
+    malos = [fila for fila in verificacion.values() if not fila["ok"]]
+    assert 1 <= len(malos) <= 3 and all(fila["destino"] == 4 for fila in malos)
+    assert all(antes[c] == filas[c] for c in antes)
+    # El backfill repara filas faltantes o viejas; la sobrante obliga a recopiar su rango
+    assert progreso["fase"] == LIMPIA and progreso["rangos_recopiados"] == 1
+    assert leidas == filas and sobrante not in _contenido(tmp_path, 4)
+
+
+def test_limitador_reparte_los_lotes():
+    limitador = Limitador(filas_por_segundo=1000)
+
+    async def correr():
+        for _ in range(4):
+            await limitador.esperar(50)
+
+    inicio = time.perf_counter()
+    asyncio.run(correr())
+    assert 0.14 <= time.perf_counter() - inicio < 0.5  # 200 filas a 1000/s: el primer lote no espera
+    assert limitador.esperado_s == pytest.approx(0.15, abs=0.03)
@@ -0,0 +1,400 @@
+"""
+Pruebas del router de sharding (shard_router.py)
+"""
+import hashlib
+import random
+from collections import Counter
+
+import pytest
+
+from shard_router import (
+    HASHES, ConsistentHashRouter, CountMinSketch, DetectorHotKeys, HotKeyRouter, JumpHashRouter,
+    MovimientoRango, RangeShardRouter, RendezvousHashRouter, ShardConfig, SimpleHashShardRouter,
+    comparar_estrategias, jump_hash,
+)
+
+
+def _shards(n=3):
+    return [ShardConfig(i, f"postgres-{i}", 5432, "ecomarket") for i in range(1, n + 1)]
+
+
+def _ruteo_lineal(router, key):
+    """Referencia: el recorrido lineal original con el hash MD5 en hexadecimal"""
+    hash_value = int(hashlib.md5(key.encode()).hexdigest(), 16) % (2**32)
+    for ring_key in sorted(router.ring):
+        if ring_key >= hash_value:
+            return router.ring[ring_key]
+    return router.ring[min(router.ring)]
+
+
+def test_busqueda_binaria_equivale_al_recorrido_lineal():
+    router = ConsistentHashRouter(_shards(), vnodes_per_shard=50)
+    keys = [f"user_{i}" for i in range(3000)]
+    assert [router.get_shard(k).shard_id for k in keys] == [_ruteo_lineal(router, k) for k in keys]
+
+
+def test_wraparound_al_primer_nodo():
+    router = ConsistentHashRouter(_shards(), vnodes_per_shard=5)
+    ultimo = router.sorted_keys[-1]
+    # Una key cuyo hash queda después del último vnode vuelve al primero del ring
+    key = next(f"k{i}" for i in range(100000) if router._hash(f"k{i}") > ultimo)
+    assert router.get_shard(key).shard_id == router.ring[router.sorted_keys[0]]
+
+
+def test_ruteo_por_lotes_y_distribucion():
+    router = ConsistentHashRouter(_shards(4))
+    keys = [f"order_{i}" for i in range(5000)]
+    assert router.get_shards(keys) == [router.get_shard(k) for k in keys]
+    distribucion = router.get_distribution(keys)
+    assert sorted(distribucion) == [1, 2, 3, 4] and sum(distribucion.values()) == 5000
+
+
+def test_agregar_y_quitar_shard_mantiene_los_indices():
+    router = ConsistentHashRouter(_shards(3), vnodes_per_shard=20)
+    router.add_shard(ShardConfig(4, "postgres-4", 5432, "ecomarket"))
+    router.remove_shard(2)
+    keys = [f"user_{i}" for i in range(2000)]
+    assert set(router.get_shard_ids(keys)) == {1, 3, 4}
+    assert [router.get_shard(k).shard_id for k in keys] == [_ruteo_lineal(router, k) for k in keys]
+
+
+def test_cambios_incrementales_equivalen_a_reconstruir_el_ring():
+    router = ConsistentHashRouter(_shards(3), vnodes_per_shard=40)
+    router.add_shard(ShardConfig(4, "postgres-4", 5432, "ecomarket"))
+    router.remove_shard(1)
+    router.add_shard(ShardConfig(5, "postgres-5", 5432, "ecomarket"))
+    reconstruido = ConsistentHashRouter(
+        [router.shards[i] for i in (2, 3, 4, 5)], vnodes_per_shard=40
+    )
+    assert router.sorted_keys == reconstruido.sorted_keys
+    assert router._owners == reconstruido._owners
+    assert router.ring == reconstruido.ring
+    assert abs(sum(router.ownership().values()) - 1.0) < 1e-9
+
+
+def test_plan_rebalance_contiene_exactamente_las_keys_que_se_mueven():
+    actual = _shards(3)
+    nueva = actual[1:] + [ShardConfig(4, "postgres-4", 5432, "ecomarket")]  # Sale el 1, entra el 4
+    router = ConsistentHashRouter(actual, vnodes_per_shard=30)
+    destino = ConsistentHashRouter(nueva, vnodes_per_shard=30)
+    keys = [f"user_{i}" for i in range(20000)]
+    antes = router.get_distribution(keys)
+    plan = router.plan_rebalance(nueva, keys_por_shard=antes)
+
+    movidas = {}
+    for key, origen, final in zip(keys, router.get_shard_ids(keys), destino.get_shard_ids(keys)):
+        hash_value = router._hash(key)
+        rangos = [r for r in plan if r.contiene(hash_value)]
+        if origen == final:
+            assert not rangos
+        else:
+            assert [(r.origen, r.destino) for r in rangos] == [(origen, final)]
+            movidas[(origen, final)] = movidas.get((origen, final), 0) + 1
+
+    # Todo lo del shard 1 se va; entre los que quedan solo se mueve lo que toma el 4
+    assert {o for o, _ in movidas} >= {1} and {d for _, d in movidas} <= {2, 3, 4}
+    assert sum(movidas.get((1, d), 0) for d in (2, 3, 4)) == antes[1]
+    estimadas = sum(r.keys_estimadas for r in plan)
+    assert abs(estimadas - sum(movidas.values())) < 0.05 * len(keys)
+
+
+def test_md5_por_defecto_mantiene_la_ubicacion_original():
+    shards = _shards(5)
+    simple = SimpleHashShardRouter(shards)
+    consistente = ConsistentHashRouter(shards, vnodes_per_shard=20)
+    keys = [f"user_{i}" for i in range(2000)]
+    # Las fórmulas originales de cada router, con el hash MD5 en hexadecimal
+    assert [simple.get_shard(k) for k in keys] == \
+        [shards[int(hashlib.md5(k.encode()).hexdigest(), 16) % 5] for k in keys]
+    assert [consistente.get_shard(k).shard_id for k in keys] == [_ruteo_lineal(consistente, k) for k in keys]
+    assert simple.get_distribution(keys) == {
+        s.shard_id: sum(simple.get_shard(k) is s for k in keys) for s in shards
+    }
+
+
+@pytest.mark.parametrize("nombre", sorted(HASHES))
+def test_cada_hash_rutea_igual_de_a_una_y_por_lotes(nombre):
+    estrategia = HASHES[nombre]
+    keys = [f"order_{i}" for i in range(3000)] + ["", "ñandú"]
+    assert estrategia.hash_many(keys) == [estrategia.hash(k) for k in keys]
+    assert all(0 <= h < 2**32 for h in estrategia.hash32_many(keys))
+
+    router = ConsistentHashRouter(_shards(4), vnodes_per_shard=30, hash_fn=nombre)
+    assert router.get_shard_ids(keys) == [router.get_shard(k).shard_id for k in keys]
+    assert min(router.get_distribution(keys).values()) > 0
+    plan = router.plan_rebalance(_shards(5))
+    destino = ConsistentHashRouter(_shards(5), vnodes_per_shard=30, hash_fn=nombre)
+    movidas = [k for k, a, b in zip(keys, router.get_shard_ids(keys), destino.get_shard_ids(keys)) if a != b]
+    assert all(any(r.contiene(router._hash(k)) for r in plan) for k in movidas)
+
+
+@pytest.mark.parametrize("nombre", sorted(HASHES))
+def test_ruteo_con_numpy_equivale_a_python_puro(nombre, monkeypatch):
+    pytest.importorskip("numpy")
+    estrategia = HASHES[nombre]
+    keys = [f"order_{i}" for i in range(5000)] + ["", "ñandú"]
+    routers = [SimpleHashShardRouter(_shards(4), nombre), ConsistentHashRouter(_shards(4), 30, nombre),
+               JumpHashRouter(_shards(4), nombre),
+               RendezvousHashRouter(_shards(4), {1: 1.0, 2: 2.0, 3: 1.0, 4: 0.5}, hash_fn=nombre)]
+
+    def rutear():
+        return ([r.get_shard_ids(keys) for r in routers], [r.get_distribution(keys) for r in routers],
+                [r.get_distribution([]) for r in routers], estrategia.hash_many(keys))
+
+    vectorizado = rutear()
+    assert estrategia.hash32_array(keys).tolist() == estrategia.hash32_many(keys)
+    monkeypatch.setattr("shard_router.np", None)
+    assert rutear() == vectorizado
+
+
+def test_hash_desconocido():
+    with pytest.raises(ValueError):
+        ConsistentHashRouter(_shards(), hash_fn="sha1")
+
+
+def _movidas(antes, despues):
+    return [(a, d) for a, d in zip(antes, despues) if a != d]
+
+
+def test_jump_hash_balance_y_movimiento_minimo():
+    keys = [f"user_{i}" for i in range(20000)]
+    router = JumpHashRouter(_shards(4))
+    antes = router.get_shard_ids(keys)
+    assert antes == [router.get_shard(k).shard_id for k in keys]
+    assert max(router.get_distribution(keys).values()) < 1.1 * len(keys) / 4
+    assert all(jump_hash(k, 1) == 0 for k in range(100))
+
+    router.add_shard(ShardConfig(5, "postgres-5", 5432, "ecomarket"))
+    movidas = _movidas(antes, router.get_shard_ids(keys))
+    assert {d for _, d in movidas} == {5} and abs(len(movidas) - len(keys) / 5) < 0.05 * len(keys)
+
+    router.remove_shard(5)  # Quitar el último vuelve exactamente a la distribución anterior
+    assert router.get_shard_ids(keys) == antes
+    router.remove_shard(2)  # Swap-remove: el 4 ocupa el bucket del 2
+    assert {a for a, _ in _movidas(antes, router.get_shard_ids(keys))} == {2, 4}
+
+
+def test_rendezvous_movimiento_minimo_y_pesos():
+    keys = [f"user_{i}" for i in range(20000)]
+    router = RendezvousHashRouter(_shards(4))
+    antes = router.get_shard_ids(keys)
+    assert antes == [router.get_shard(k).shard_id for k in keys]
+
+    router.add_shard(ShardConfig(5, "postgres-5", 5432, "ecomarket"))
+    assert {d for _, d in _movidas(antes, router.get_shard_ids(keys))} == {5}
+    router.remove_shard(5)
+    router.remove_shard(2)
+    assert {a for a, _ in _movidas(antes, router.get_shard_ids(keys))} == {2}
+
+    pesado = RendezvousHashRouter(_shards(2), weights={1: 3.0})
+    assert pesado.get_shard_ids(keys) == [pesado.get_shard(k).shard_id for k in keys]
+    assert abs(pesado.get_distribution(keys)[1] / len(keys) - 0.75) < 0.02
+    with pytest.raises(ValueError):
+        pesado.set_weight(2, 0)
+
+
+def test_comparacion_de_las_cuatro_estrategias():
+    filas = comparar_estrategias((3, 8), num_keys=4000, vnodes_per_shard=50, muestra=200)
+    assert [(f["estrategia"], f["shards"]) for f in filas] == [
+        (e, n) for n in (3, 8) for e in ("simple", "consistente", "jump", "rendezvous")
+    ]
+    por_clave = {(f["estrategia"], f["shards"]): f for f in filas}
+    assert por_clave[("simple", 8)]["movidas_agregar"] > 80
+    for estrategia in ("consistente", "jump", "rendezvous"):
+        assert por_clave[(estrategia, 8)]["movidas_agregar"] < 20
+    assert por_clave[("jump", 8)]["memoria_kb"] < por_clave[("consistente", 8)]["memoria_kb"]
+    assert all(f["keys_seg"] > 0 and f["desviacion"] >= 0 for f in filas)
+
+
+def test_peso_escala_los_vnodes_y_la_porcion_del_ring():
+    shards = _shards(3) + [ShardConfig(4, "postgres-4", 5432, "ecomarket", weight=3.0)]
+    router = ConsistentHashRouter(shards, vnodes_per_shard=200)
+    keys = [f"user_{i}" for i in range(30000)]
+    reporte = router.load_report(keys)
+    assert [reporte[i]["vnodes"] for i in (1, 2, 3, 4)] == [200, 200, 200, 600]
+    assert reporte[4]["objetivo"] == 0.5 and abs(sum(f["ring"] for f in reporte.values()) - 1) < 1e-9
+    assert all(abs(f["desvio"]) < 0.2 for f in reporte.values())
+    assert abs(reporte[4]["keys"] - 0.5) < 0.05
+    with pytest.raises(ValueError):
+        ShardConfig(5, "postgres-5", 5432, "ecomarket", weight=0)
+
+
+def test_set_weight_mueve_solo_las_keys_del_shard():
+    router = ConsistentHashRouter(_shards(4), vnodes_per_shard=50)
+    keys = [f"user_{i}" for i in range(20000)]
+    antes = router.get_shard_ids(keys)
+
+    router.set_weight(2, 2.0)
+    subida = router.get_shard_ids(keys)
+    assert {d for _, d in _movidas(antes, subida)} == {2}
+    assert router.get_distribution(keys)[2] > 1.5 * antes.count(2)
+
+    router.set_weight(2, 0.5)
+    assert {a for a, _ in _movidas(subida, router.get_shard_ids(keys))} == {2}
+    reconstruido = ConsistentHashRouter(
+        [router.shards[i] for i in (1, 2, 3, 4)], vnodes_per_shard=50
+    )
+    assert router.shards[2].weight == 0.5 and len(router._vnodes[2]) == 25
+    assert router.sorted_keys == reconstruido.sorted_keys and router._owners == reconstruido._owners
+
+    router.set_weight(2, 1.0)
+    assert router.get_shard_ids(keys) == antes
+
+
+def _trafico_zipf(n=60000, universo=5000, semilla=3):
+    """Keys con frecuencia ~1/rango: unas pocas concentran buena parte del tráfico"""
+    azar = random.Random(semilla)
+    pesos = [1 / rango for rango in range(1, universo + 1)]
+    return [f"product_{i}" for i in azar.choices(range(universo), weights=pesos, k=n)]
+
+
+def test_sketch_y_detector_encuentran_las_keys_calientes():
+    trafico = _trafico_zipf()
+    exacto = Counter(trafico)
+    sketch = CountMinSketch(ancho=1024, profundidad=4)
+    for key in trafico:
+        sketch.agregar(key)
+    errores = [sketch.estimar(k) - c for k, c in exacto.items()]
+    assert min(errores) >= 0  # Nunca subestima
+    assert sum(e > len(trafico) * 2.72 / 1024 for e in errores) < len(exacto) * 0.02
+
+    detector = DetectorHotKeys(capacidad=32)
+    for key in trafico:
+        detector.registrar(key, 1)
+    assert [h["key"] for h in detector.hot_keys(5)] == [k for k, _ in exacto.most_common(5)]
+    assert detector.hot_keys(1)[0]["fraccion"] == pytest.approx(exacto["product_0"] / len(trafico), rel=0.01)
+
+    detector.decaer(0.5)
+    assert detector.sketch.total == len(trafico) // 2
+    assert detector.hot_keys(1)[0]["estimado"] == pytest.approx(exacto["product_0"] / 2, rel=0.01)
+
+
+def test_key_poco_vista_no_desplaza_a_una_caliente():
+    detector = DetectorHotKeys(capacidad=2)
+    detector.registrar("A", 1)
+    detector.registrar("B", 2)  # Tabla llena con estimado 1 cada una
+    detector.registrar("A", 1, 50)
+    detector.registrar("B", 2, 50)  # Ambas crecieron: el mínimo ya no es 1
+    detector.registrar("C", 3, 2)
+    assert {h["key"] for h in detector.hot_keys()} == {"A", "B"}
+    detector.registrar("B", 2, 5)
+    detector.registrar("C", 3, 60)  # Supera al mínimo real (A): lo reemplaza
+    assert {h["key"] for h in detector.hot_keys()} == {"B", "C"}
+
+
+def test_reporte_tras_decaer_hasta_cero():
+    detector = DetectorHotKeys(capacidad=2)
+    detector.registrar("a", 1)
+    detector.registrar("b", 2, 10)
+    detector.decaer(0.5)
+    assert detector.por_shard[1] == 0
+    assert [h["key"] for h in detector.hot_keys()] == ["b"]  # "a" quedó en 0 y salió de la tabla
+    assert detector.hot_keys_por_shard() == {2: [{"key": "b", "shard_id": 2, "estimado": 5, "fraccion": 1.0}]}
+    detector.registrar("c", 1)  # El lugar libre se ocupa sin desalojar a nadie
+    assert {h["key"] for h in detector.hot_keys()} == {"b", "c"}
+
+    hot = HotKeyRouter(ConsistentHashRouter(_shards(3)))
+    hot.get_shard("product_1")
+    hot.detector.decaer(0.5)
+    assert all(f["hot_keys"] == [] and f["trafico"] == 0 for f in hot.distribution_report().values())
+
+
+def test_hot_keys_por_shard_junto_a_la_distribucion():
+    trafico = _trafico_zipf(20000) + ["product_flash"] * 5000
+    router = ConsistentHashRouter(_shards(4))
+    hot = HotKeyRouter(router)
+    reporte = hot.distribution_report(trafico, n=3)
+    assert {i: f["keys"] for i, f in reporte.items()} == router.get_distribution(trafico)
+
+    dueno = router.get_shard("product_flash").shard_id
+    assert reporte[dueno]["hot_keys"][0]["key"] == "product_flash"
+    assert reporte[dueno]["hot_keys"][0]["fraccion"] == pytest.approx(5000 / reporte[dueno]["keys"], rel=0.01)
+    assert all(h["shard_id"] == i for i, f in reporte.items() for h in f["hot_keys"])
+    assert sum(f["trafico"] for f in reporte.values()) == len(trafico)
+
+    # De a una o por lotes, el detector cuenta lo mismo
+    uno_a_uno = HotKeyRouter(router)
+    for key in trafico:
+        uno_a_uno.get_shard(key)
+    assert uno_a_uno.detector.hot_keys(5) == hot.detector.hot_keys(5)
+
+
+def test_overrides_reparten_lecturas_y_escrituras():
+    router = ConsistentHashRouter(_shards(4))
+    hot = HotKeyRouter(router)
+    dueno = router.get_shard("product_flash")
+    replicas = [ShardConfig(11, "postgres-1-replica", 5432, "ecomarket"),
+                ShardConfig(12, "postgres-1-replica-2", 5432, "ecomarket")]
+    assert hot.get_shard_lectura("product_flash") == dueno
+
+    hot.marcar_hot_key("product_flash", replicas=replicas)
+    lecturas = Counter(hot.get_shard_lectura("product_flash").shard_id for _ in range(300))
+    assert lecturas == {dueno.shard_id: 100, 11: 100, 12: 100}
+    assert hot.get_shard_escritura("product_flash") == ("product_flash", dueno)
+
+    hot.marcar_hot_key("product_flash", sub_keys=8)
+    escrituras = [hot.get_shard_escritura("product_flash") for _ in range(800)]
+    assert Counter(k for k, _ in escrituras) == {f"product_flash#{i}": 100 for i in range(8)}
+    assert all(router.get_shard(k) == s for k, s in escrituras)
+    assert len({s.shard_id for _, s in escrituras}) > 1
+    assert hot.claves_lectura("product_flash") == [f"product_flash#{i}" for i in range(8)]
+    assert hot.detector.hot_keys(1)[0]["key"] == "product_flash"  # Cuenta la key base, no las sub-keys
+
+    hot.quitar_override("product_flash")
+    assert hot.claves_lectura("product_flash") == ["product_flash"]
+    with pytest.raises(ValueError):
+        hot.marcar_hot_key("x", sub_keys=0)
+
+
+def test_range_router_rutea_y_planifica_scans_por_intervalo():
+    router = RangeShardRouter(_shards(4), limites=[1000, 2000, 3000])
+    assert [router.get_shard(k).shard_id for k in (-5, 999, 1000, 2500, 10 ** 9)] == [1, 1, 2, 3, 4]
+    keys = list(range(4000))
+    assert router.get_shard_ids(keys) == [router.get_shard(k).shard_id for k in keys]
+    assert router.get_distribution(keys) == {1: 1000, 2: 1000, 3: 1000, 4: 1000}
+
+    # [1500, 2500) solo toca los shards 2 y 3, con el intervalo recortado a cada uno
+    assert router.scan_plan(1500, 2500) == [(2, 1500, 2000), (3, 2000, 2500)]
+    assert router.get_shard_ids_for_range(1500, 2000) == [2]  # hasta es excluido
+    assert router.get_shard_ids_for_range(2000, 2001) == [3]
+    assert router.get_shard_ids_for_range(None, 10) == [1]
+    assert router.get_shard_ids_for_range(2500, None) == [3, 4]
+    assert router.scan_plan(5, 5) == []
+    for desde, hasta in ((0, 4000), (123, 2877), (1999, 3001)):
+        cubiertas = [k for shard_id, i, f in router.scan_plan(desde, hasta) for k in range(i, f)
+                     if router.get_shard(k).shard_id == shard_id]
+        assert cubiertas == list(range(desde, hasta))
+
+    # Keys no numéricas: created_at como texto ISO
+    fechas = RangeShardRouter(_shards(2), limites=["2025-07-01"])
+    assert fechas.get_shard("2025-03-15 10:00:00").shard_id == 1
+    assert fechas.get_shard_ids_for_range("2025-06-30", "2025-07-02") == [1, 2]
+    with pytest.raises(ValueError):
+        RangeShardRouter(_shards(3), limites=[10, 5])
+    with pytest.raises(ValueError):
+        RangeShardRouter(_shards(3), limites=[10])
+
+
+def test_range_split_merge_y_move_informan_lo_que_se_mueve():
+    router = RangeShardRouter(_shards(2), limites=[1000])
+    router.add_shard(ShardConfig(3, "postgres-3", 5432, "ecomarket"))
+
+    # El último rango (las órdenes nuevas) se parte hacia el shard 3
+    assert router.split_range(1500, 3) == [MovimientoRango(1500, None, 2, 3)]
+    assert router.rangos() == [(None, 1000, 1), (1000, 1500, 2), (1500, None, 3)]
+    assert router.split_range(1200) == []  # Misma dueña: solo prepara un move
+    assert router.move_range(1300, 1) == [MovimientoRango(1200, 1500, 2, 1)]
+    assert router.get_shard_ids_for_range(900, 1400) == [1, 2]
+    with pytest.raises(ValueError):
+        router.split_range(1500)
+
+    assert router.merge_range(1200, 1) == [MovimientoRango(1000, 1200, 2, 1)]
+    assert router.rangos() == [(None, 1000, 1), (1000, 1500, 1), (1500, None, 3)]
+    assert router.merge_range(1000) == []
+    assert router.scan_plan(None, None) == [(1, None, 1500), (3, 1500, None)]
+    with pytest.raises(ValueError):
+        router.merge_range(1234)
+    with pytest.raises(ValueError):
+        router.remove_shard(3)
+    router.remove_shard(2)
+    assert 2 not in router.shards
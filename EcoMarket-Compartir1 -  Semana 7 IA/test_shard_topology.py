@@ -0,0 +1,124 @@
+"""
+Pruebas de la topología versionada y el ring precalculado (shard_topology.py)
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from shard_router import ConsistentHashRouter, ShardConfig
+from shard_topology import (
+    RouterVersionado, Topologia, TopologiaInvalidaError, cargar_ring, exportar_ring, leer, publicar,
+)
+
+
+def _shards(n, pesos=None):
+    pesos = pesos or {}
+    return [ShardConfig(i, f"postgres-{i}", 5432, "ecomarket", pesos.get(i, 1.0)) for i in range(1, n + 1)]
+
+
+KEYS = [f"user_{i}" for i in range(5000)]
+
+
+def test_documento_y_ring_precalculado_rutean_igual():
+    topologia = Topologia(3, _shards(8, {2: 2.0, 5: 0.5}), vnodes_per_shard=100, hash_fn="fnv1a",
+                          metadata={"autor": "ops"})
+    assert Topologia.desde_json(topologia.a_json()) == topologia
+
+    cargada, router = cargar_ring(exportar_ring(topologia))
+    fresco = topologia.crear_router()
+    assert cargada == topologia and router.hash_fn.nombre == "fnv1a"
+    assert router.get_shard_ids(KEYS) == fresco.get_shard_ids(KEYS)
+
+    # Los vnodes conservan su orden: los cambios incrementales dan el mismo ring
+    for r in (router, fresco):
+        r.set_weight(2, 1.0)
+        r.remove_shard(7)
+        r.add_shard(ShardConfig(9, "postgres-9", 5432, "ecomarket"))
+    assert router.sorted_keys == fresco.sorted_keys and router._owners == fresco._owners
+
+
+def test_cargar_ring_es_mas_rapido_que_hashear_los_vnodes():
+    topologia = Topologia(1, _shards(256))
+    datos = exportar_ring(topologia)
+    inicio = time.perf_counter()
+    topologia.crear_router()
+    t_armar = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    cargar_ring(datos)
+    t_cargar = time.perf_counter() - inicio
+    assert t_cargar < t_armar / 2
+    # 3 arreglos de 4 bytes por vnode, uno por shard, el JSON, cabecera y SHA-256
+    assert len(datos) == 256 * 150 * 12 + 256 * 4 + len(topologia.a_json()) + 16 + 32
+
+
+def test_archivo_corrupto_o_de_otra_funcion_de_hash():
+    topologia = Topologia(1, _shards(4))
+    datos = bytearray(exportar_ring(topologia))
+    datos[200] ^= 0xFF
+    with pytest.raises(TopologiaInvalidaError):
+        cargar_ring(bytes(datos))
+    with pytest.raises(TopologiaInvalidaError):
+        cargar_ring(exportar_ring(topologia)[:-40])
+    # Documento dice md5 pero el ring se calculó con crc32
+    ajeno = ConsistentHashRouter(topologia.shards, hash_fn="crc32")
+    with pytest.raises(TopologiaInvalidaError):
+        cargar_ring(exportar_ring(topologia, ajeno))
+    with pytest.raises(TopologiaInvalidaError):
+        Topologia(1, _shards(2) + _shards(1))
+
+
+def test_versiones_solo_avanzan():
+    v1 = Topologia(1, _shards(3))
+    instancia = RouterVersionado(v1)
+    v2 = v1.siguiente(shards=_shards(4))
+    assert instancia.actualizar(v2) and instancia.version == 2
+    assert not instancia.actualizar(v1) and instancia.ignoradas == 1
+    assert not instancia.actualizar(Topologia(2, _shards(4), metadata={"nota": "reenvío"}))
+    with pytest.raises(TopologiaInvalidaError):
+        instancia.actualizar(Topologia(2, _shards(5)))
+    assert instancia.get_shard_ids(KEYS) == v2.crear_router().get_shard_ids(KEYS)
+
+
+def test_recarga_en_caliente_sin_cortar_requests(tmp_path):
+    ruta = str(tmp_path / "topologia.ring")
+    v1 = Topologia(1, _shards(3))
+    v2 = v1.siguiente(shards=_shards(4))
+    dueno = {1: v1.crear_router().get_shard_ids(KEYS), 2: v2.crear_router().get_shard_ids(KEYS)}
+    publicar(ruta, v1)
+    instancia = RouterVersionado(*leer(ruta))
+    errores, vistas, fin = [], set(), threading.Event()
+
+    def requests():
+        while not fin.is_set():
+            try:
+                topologia, router = instancia.actual()
+                i = len(vistas) % len(KEYS)
+                assert router.get_shard(KEYS[i]).shard_id == dueno[topologia.version][i]
+                vistas.add(topologia.version)
+            except Exception as error:  # pragma: no cover - lo que la prueba quiere evitar
+                errores.append(error)
+
+    async def correr():
+        vigilante = asyncio.create_task(instancia.vigilar(ruta, intervalo=0.01))
+        hilos = [threading.Thread(target=requests) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        await asyncio.sleep(0.05)
+        publicar(ruta, v2)
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if instancia.version == 2:
+                break
+        with open(ruta, "wb") as f:
+            f.write(b"basura")  # Un archivo roto no tumba la instancia
+        await asyncio.sleep(0.05)
+        fin.set()
+        for hilo in hilos:
+            hilo.join()
+        vigilante.cancel()
+
+    asyncio.run(correr())
+    assert not errores and vistas == {1, 2}
+    assert instancia.version == 2 and instancia.recargas == 1